@@ -0,0 +1,27 @@
+#!/bin/bash
+
+# Starts the local stand-in providers used for offline benchmarks.
+# Run the app against them with:
+#   FAKE_PROVIDERS=true \
+#   OPENAI_BASE_URL=http://localhost:9001/v1 BASE_URL=http://localhost:9001/v1 \
+#   OPENAI_API_KEY=fake OPEN_SOURCE_API=fake \
+#   DEEPGRAM_URL=http://localhost:9002 DEEPGRAM_API_KEY=fake \
+#   bash scripts/run.sh
+
+FAKE_OPENAI_PORT=${FAKE_OPENAI_PORT:-9001}
+FAKE_DEEPGRAM_PORT=${FAKE_DEEPGRAM_PORT:-9002}
+
+cd src
+
+echo "Running fake OpenAI on port $FAKE_OPENAI_PORT"
+uvicorn fake_providers.openai_server:app --host 127.0.0.1 --port "$FAKE_OPENAI_PORT" &
+OPENAI_PID=$!
+
+echo "Running fake Deepgram on port $FAKE_DEEPGRAM_PORT"
+uvicorn fake_providers.deepgram_server:app --host 127.0.0.1 --port "$FAKE_DEEPGRAM_PORT" &
+DEEPGRAM_PID=$!
+
+trap 'kill $OPENAI_PID $DEEPGRAM_PID' INT TERM
+wait
+
+cd ..
@@ -0,0 +1,25 @@
+#!/bin/bash
+
+# Production runner: gunicorn master with WEB_CONCURRENCY uvicorn workers
+# (uvloop + httptools), see src/gunicorn.conf.py for the settings.
+
+set -a
+source .env
+set +a
+
+# Metrics of dead workers must not survive a restart
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+# Nor the warm-up marker of the previous run
+if [ -n "$WARMUP_STATE_DIR" ]; then
+    rm -rf "$WARMUP_STATE_DIR"
+    mkdir -p "$WARMUP_STATE_DIR"
+fi
+
+# Without WEB_CONCURRENCY: one worker per CPU with REDIS_HOST, one otherwise
+echo "Running server on port $PORT with ${WEB_CONCURRENCY:-the default} workers"
+
+cd src
+exec gunicorn app.main:app -c gunicorn.conf.py
@@ -5,6 +5,7 @@ in the application
 from app.auth import provider
 from app.auth.auth_service_provider import AuthServiceProvider
 from app.auth.static_provider import StaticAuthProvider
+from app.auth.jwks_provider import JWKSAuthProvider
 import os
 
 
@@ -13,3 +14,6 @@ AUTH_CURRENT_PROVIDER: str = os.environ["AUTH_CURRENT_PROVIDER"]
 auth_factory = provider.AuthFactory(AUTH_CURRENT_PROVIDER)
 auth_factory.add_provider(provider.AuthProvider.STATIC, StaticAuthProvider())
 auth_factory.add_provider(provider.AuthProvider.AUTH_SERVICE, AuthServiceProvider())
+# Loads AUTH_JWKS_FILE / AUTH_JWKS when built, only when it is the one in use
+if auth_factory.current_provider == provider.AuthProvider.JWKS:
+    auth_factory.add_provider(provider.AuthProvider.JWKS, JWKSAuthProvider())
@@ -1,5 +1,12 @@
 from app.auth.provider import AuthProviderBase
+from app.auth.token_cache import (
+    TTLCache,
+    token_expiry,
+    token_key,
+)
 from app.services.auth import TokenData
+from app.services.single_flight import SingleFlight
+from app.services import metrics
 import httpx
 import os
 
@@ -8,38 +15,92 @@ from utils import get_logger
 
 logger = get_logger("auth_middleware")
 
+# Verified tokens are trusted for at most this long, and never past their `exp`
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+AUTH_HTTP_MAX_CONNECTIONS = int(os.getenv("AUTH_HTTP_MAX_CONNECTIONS", 50))
+
 
 class AuthServiceProvider(AuthProviderBase):
+    """Verifies tokens against the auth service profile endpoint.
+
+    Requests share one pooled keep-alive client, successful verifications
+    are cached by token hash and concurrent verifications of the same token
+    are collapsed into one request.
+    """
+
     def __init__(self):
         self.auth_service_uri = os.getenv("AUTH_SERVICE_URI")
+        self._client: httpx.AsyncClient | None = None
+        self._cache: TTLCache[TokenData] = TTLCache(
+            AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES
+        )
+        self._inflight: SingleFlight[TokenData] = SingleFlight()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(
+                    max_connections=AUTH_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=AUTH_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=30,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def warmup(self):
+        if not self.auth_service_uri:
+            return
+        # Any response will do, this opens a pooled keep-alive connection
+        await self.client.get(f"{self.auth_service_uri}/")
 
     async def verify(self, token: str) -> TokenData:
-        async with httpx.AsyncClient() as client:
-            try:
-                # Use the environment-configured URL
-                url = f"{self.auth_service_uri}/api/v1/user/profile/self"
-                logger.debug(f"Auth service verification URL: {url}")
-
-                response = await client.get(
-                    url, headers={"Authorization": f"Bearer {token}"}, timeout=10
-                )
-
-                logger.debug(f"Auth response status: {response.status_code}")
-                logger.debug(f"Auth response body: {response.text}")
-
-                response.raise_for_status()
-                user_data = response.json()
-
-                return TokenData(
-                    user_id=str(user_data.get("id")),
-                    username=user_data.get("email"),  # email -> username
-                    email=user_data.get("email"),
-                )
-
-            except httpx.HTTPStatusError as exc:
-                error_msg = f"Auth service error: {exc.response.status_code} {exc.response.text}"
-                logger.error(error_msg)
-                raise RuntimeError(error_msg)
-            except Exception as exc:
-                logger.error(f"Auth verification failed: {str(exc)}", exc_info=True)
-                raise
+        key = token_key(token)
+        cached = self._cache.get(key)
+        if cached is not None:
+            metrics.AUTH_CACHE_REQUESTS.labels(result="hit").inc()
+            return cached
+        metrics.AUTH_CACHE_REQUESTS.labels(result="miss").inc()
+
+        token_data = await self._inflight.do(key, lambda: self._fetch(token))
+        self._cache.put(key, token_data, expires_at=token_expiry(token))
+        return token_data
+
+    async def _fetch(self, token: str) -> TokenData:
+        try:
+            # Use the environment-configured URL
+            url = f"{self.auth_service_uri}/api/v1/user/profile/self"
+            logger.debug(f"Auth service verification URL: {url}")
+
+            response = await self.client.get(
+                url, headers={"Authorization": f"Bearer {token}"}
+            )
+
+            logger.debug(f"Auth response status: {response.status_code}")
+            logger.debug(f"Auth response body: {response.text}")
+
+            response.raise_for_status()
+            user_data = response.json()
+
+            return TokenData(
+                user_id=str(user_data.get("id")),
+                username=user_data.get("email"),  # email -> username
+                email=user_data.get("email"),
+            )
+
+        except httpx.HTTPStatusError as exc:
+            error_msg = (
+                f"Auth service error: {exc.response.status_code} {exc.response.text}"
+            )
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+        except Exception as exc:
+            logger.error(f"Auth verification failed: {str(exc)}", exc_info=True)
+            raise
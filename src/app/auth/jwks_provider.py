@@ -0,0 +1,140 @@
+"""JWKS auth provider. Verifies JWT signatures locally against the
+signing keys of the auth service, no request is made per token
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import httpx
+from jose import jwk, jwt  # type: ignore
+from jose.backends.base import Key  # type: ignore
+
+from app.auth.provider import AuthProviderBase
+from app.services.auth import TokenData
+from app.services.single_flight import SingleFlight
+
+from utils import get_logger
+
+
+logger = get_logger("jwks_provider")
+
+AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL") or (
+    f"{os.getenv('AUTH_SERVICE_URI')}/.well-known/jwks.json"
+)
+# A JWKS document to use instead of fetching one, as a file or inline JSON
+AUTH_JWKS_FILE = os.getenv("AUTH_JWKS_FILE")
+AUTH_JWKS = os.getenv("AUTH_JWKS")
+AUTH_JWKS_REFRESH_SECONDS = float(os.getenv("AUTH_JWKS_REFRESH_SECONDS", 300))
+# Unknown `kid`s trigger a refresh (key rotation), at most this often
+AUTH_JWKS_MIN_REFRESH_SECONDS = float(os.getenv("AUTH_JWKS_MIN_REFRESH_SECONDS", 30))
+AUTH_JWT_ALGORITHMS = os.getenv("AUTH_JWT_ALGORITHMS", "RS256").split(",")
+AUTH_JWT_AUDIENCE = os.getenv("AUTH_JWT_AUDIENCE")
+AUTH_JWT_ISSUER = os.getenv("AUTH_JWT_ISSUER")
+
+
+class JWKSAuthProvider(AuthProviderBase):
+    """Keys are parsed once per JWKS fetch, verifying a token is a header
+    parse, a dict lookup and a signature check. The JWKS is refreshed in the
+    background of the first request after AUTH_JWKS_REFRESH_SECONDS, and
+    right away when a token is signed with an unknown key.
+    """
+
+    def __init__(self):
+        self._keys: dict[str | None, Key] = {}
+        self._fetched_at = 0.0
+        self._static = AUTH_JWKS_FILE is not None or AUTH_JWKS is not None
+        self._client: httpx.AsyncClient | None = None
+        self._refresh: SingleFlight[None] = SingleFlight()
+        self._refresh_task: asyncio.Task | None = None
+        if self._static:
+            self._load(self._read_static())
+
+    @staticmethod
+    def _read_static() -> dict:
+        if AUTH_JWKS_FILE is not None:
+            with open(AUTH_JWKS_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        return json.loads(AUTH_JWKS)
+
+    def _load(self, jwks: dict):
+        keys = {}
+        for key_data in jwks.get("keys", []):
+            alg = key_data.get("alg") or AUTH_JWT_ALGORITHMS[0]
+            if alg not in AUTH_JWT_ALGORITHMS:
+                continue
+            try:
+                keys[key_data.get("kid")] = jwk.construct(key_data, alg)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.warning(f"Skipping JWKS key {key_data.get('kid')}: {ex}")
+        if not keys:
+            raise RuntimeError("JWKS contains no usable signing keys")
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        logger.info(f"Loaded {len(keys)} JWKS signing keys")
+
+    async def _fetch(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        response = await self._client.get(AUTH_JWKS_URL)
+        response.raise_for_status()
+        self._load(response.json())
+
+    async def refresh(self):
+        await self._refresh.do("jwks", self._fetch)
+
+    async def warmup(self):
+        if not self._static:
+            await self.refresh()
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception as ex:  # pylint: disable=broad-except
+            # Keep verifying with the current keys
+            logger.error(f"JWKS refresh failed: {ex}")
+
+    async def _signing_key(self, kid: str | None) -> Key:
+        if not self._static:
+            age = time.monotonic() - self._fetched_at
+            if not self._keys:
+                await self.refresh()
+            elif kid not in self._keys and age >= AUTH_JWKS_MIN_REFRESH_SECONDS:
+                await self._refresh_quietly()
+            elif age >= AUTH_JWKS_REFRESH_SECONDS and (
+                self._refresh_task is None or self._refresh_task.done()
+            ):
+                self._refresh_task = asyncio.ensure_future(self._refresh_quietly())
+
+        if kid in self._keys:
+            return self._keys[kid]
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        raise RuntimeError(f"Unknown signing key `{kid}`")
+
+    async def verify(self, token: str) -> TokenData:
+        header = jwt.get_unverified_header(token)
+        key = await self._signing_key(header.get("kid"))
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=AUTH_JWT_ALGORITHMS,
+            audience=AUTH_JWT_AUDIENCE,
+            issuer=AUTH_JWT_ISSUER,
+            options={
+                "verify_aud": AUTH_JWT_AUDIENCE is not None,
+                "require_exp": True,
+                "require_sub": True,
+            },
+        )
+        return TokenData(
+            user_id=claims.get("user_id"),
+            username=claims["sub"],
+            email=claims.get("email"),
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -7,6 +7,7 @@ from app.services.auth import TokenData
 class AuthProvider(str, Enum):
     STATIC = "STATIC"
     AUTH_SERVICE = "AUTH_SERVICE"
+    JWKS = "JWKS"
 
 
 class AuthProviderBase(ABC):
@@ -14,6 +15,12 @@ class AuthProviderBase(ABC):
     async def verify(self, token: str) -> TokenData:
         pass
 
+    async def aclose(self) -> None:
+        """releases pooled connections, called on shutdown"""
+
+    async def warmup(self) -> None:
+        """opens connections and loads keys ahead of the first request"""
+
 
 class AuthFactory:
     providers: dict[AuthProvider, AuthProviderBase] = {}
@@ -33,3 +40,10 @@ class AuthFactory:
             return self.providers[self.current_provider]
 
         raise RuntimeError(f"Current provider {self.current_provider} not registered")
+
+    async def aclose(self) -> None:
+        for provider in self.providers.values():
+            await provider.aclose()
+
+    async def warmup(self) -> None:
+        await self.get_current_provider().warmup()
@@ -0,0 +1,62 @@
+"""Caching helpers shared by the auth providers
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+from jose import jwt  # type: ignore
+
+
+T = TypeVar("T")
+
+
+def token_key(token: str) -> str:
+    """cache key of a token, raw tokens are never kept in memory as keys"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def token_expiry(token: str) -> float | None:
+    """`exp` claim of a JWT as a unix timestamp, None for opaque tokens"""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except Exception:  # pylint: disable=broad-except
+        return None
+    return float(exp) if exp is not None else None
+
+
+class TTLCache(Generic[T]):
+    """Bounded LRU cache whose entries expire after `ttl_seconds`, or at
+    the expiry given when they are stored if that comes first
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[T, float]] = OrderedDict()
+
+    def get(self, key: str) -> T | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, deadline = entry
+        if deadline <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: T, expires_at: float | None = None):
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        if deadline <= time.time():
+            return
+        self._entries[key] = (value, deadline)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
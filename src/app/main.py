@@ -4,16 +4,21 @@ Returns:
     None
 """
 
+import asyncio
 import os
 from fastapi import FastAPI, APIRouter  # type: ignore
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
 from fastapi.staticfiles import StaticFiles  # type: ignore
 
 from utils import get_logger
+from async_http import close_http, get_http
 from app.routers import index
+from app.routers import metrics
+from app.routers import health
 from app.routers import thriving_minds_demo
 
 from app.routers.api import user
+from app.routers.api import chat_history
 from app.routers.api import index as api_index
 # from app.routers.api import text_2_audio as TM_text_audio
 from app.routers.api import text_2_audio_stream as TM_text_audio_stream
@@ -23,7 +28,14 @@ from app.routers.api import text_2_audio_stream as TM_text_audio_stream
 # from app.routers.api import audio_2_audio as TM_audio
 from app.routers.api import thriving_minds_chat as TM_chat
 
+from .auth.auth_factory import auth_factory
 from .services.db.mongodb_service import MongoDB
+from .services.db.redis_service import Redis
+from .services.db.chat_history_service import ChatHistoryService
+from .services.db.chat_history_buffer import get_chat_history_buffer
+from .services.db.session_store import get_session_store
+from .services.retrieval import get_retriever
+from .services.warmup import warmup
 
 # from dotenv import load_dotenv
 # load_dotenv(get_full_path("../.env"))
@@ -80,21 +92,60 @@ origins_applied = apply_origins(app)
 app.mount("/public", StaticFiles(directory="../public"), name="public")
 
 
-# @app.on_event("startup")
-# async def startup_event():
-#     mongo_uri = os.getenv("MONGODB_URI")
-#     if not mongo_uri:
-#         raise ValueError("MONGODB_URI environment variable not set")
-#     MongoDB.connect(uri=mongo_uri, database_name="TM_Chatbot")
-
-
-# @app.on_event("shutdown")
-# async def shutdown_event():
-#     MongoDB.disconnect()
+async def warm_up_http():
+    """opens pooled connections to the hosts in WARMUP_URLS"""
+    urls = [u for u in os.getenv("WARMUP_URLS", "").split(",") if u]
+    # Any response will do, only the connection matters
+    await asyncio.gather(*(get_http().client.head(url) for url in urls))
+
+
+async def warm_up_retrieval():
+    await asyncio.to_thread(get_retriever)
+
+
+warmup.register("auth", auth_factory.warmup)
+warmup.register("http", warm_up_http)
+warmup.register("retrieval", warm_up_retrieval)
+
+
+# Registered before the routers are included so the databases are connected
+# before any router startup hook runs
+@app.on_event("startup")
+async def startup_event():
+    mongo_uri = os.getenv("MONGODB_URI")
+    if mongo_uri:
+        MongoDB.connect(
+            uri=mongo_uri, database_name=os.getenv("MONGO_DATABASE", "TM_Chatbot")
+        )
+        try:
+            await ChatHistoryService.ensure_indexes()
+        except Exception as ex:  # pylint: disable=broad-except
+            # Not fatal, /ready reports the database as unavailable
+            logger.error(f"Could not create MongoDB indexes: {ex}")
+    else:
+        logger.warning("MONGODB_URI not set, chat history is disabled")
+    Redis.connect()
+    # Fails the startup on a store the workers cannot share
+    get_session_store()
+    warmup.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await warmup.stop()
+    if MongoDB.client is not None:
+        # Write the buffered chat messages before closing the pool
+        await get_chat_history_buffer().close()
+    MongoDB.disconnect()
+    await Redis.disconnect()
+    await auth_factory.aclose()
+    await close_http()
 
 
 logger.info(f"Accepting from origins {origins_applied}")
 app.include_router(index.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 app.include_router(thriving_minds_demo.chat_router)  # Chatbot frontend
 app.include_router(thriving_minds_demo.audio_router)  # Audio frontend
 app.include_router(thriving_minds_demo.text_audio_router)  # Text Audio frontend
@@ -116,6 +167,8 @@ api_v1_router.include_router(api_index.router)
 
 api_v1_router.include_router(user.router)
 
+api_v1_router.include_router(chat_history.router)
+
 api_v1_router.include_router(TM_chat.router)
 
 # app.include_router(TM_audio.router)
@@ -3,12 +3,21 @@ from fastapi import UploadFile, File  # type: ignore
 from fastapi.responses import FileResponse, StreamingResponse, JSONResponse  # type: ignore
 from pydantic import BaseModel  # type: ignore
 from typing import List
-from application_context import chain, streaming_chain, EarVosk, text_to_speech
+from application_context import (
+    chain,
+    streaming_chain,
+    EarVosk,
+    get_vosk_model,
+    text_to_speech,
+)
+from app.services import metrics
+from app.services.warmup import warmup
 import torch  # type: ignore
 from dotenv import load_dotenv  # type: ignore
 import numpy as np  # type: ignore
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect  # type: ignore
 import uvicorn  # type: ignore
+import asyncio
 import io
 import json
 import wave
@@ -30,6 +39,13 @@ device = "cuda:0" if torch.cuda.is_available() else "cpu"
 input_audio = os.getenv("INPUT_AUDIO")
 result_audio = os.getenv("RESULT_AUDIO")
 
+
+async def warm_up_vosk():
+    await asyncio.to_thread(get_vosk_model)
+
+
+warmup.register("stt.vosk", warm_up_vosk)
+
 # streaming_llm = StreamingLLM(model, tokenizer, device)
 # logging.basicConfig(level=logging.DEBUG)
 # logger = logging.getLogger(__name__)
@@ -64,14 +80,17 @@ async def startup_event():
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     recognizer = app_state.audio_transcriber.recognizer
+    metrics.ACTIVE_SOCKETS.labels(router=router.prefix).inc()
 
     try:
         while True:
             try:
                 data = await websocket.receive_bytes()
                 if recognizer.AcceptWaveform(data):
+                    metrics.STT_CALLS.labels(provider="vosk").inc()
                     result = json.loads(recognizer.Result())["text"]
                     if result.strip():
+                        turn_timer = metrics.TurnTimer(router.prefix)
                         # Process user input and generate response
                         current_sentence = ""
 
@@ -97,6 +116,7 @@ async def websocket_endpoint(websocket: WebSocket):
                                         "audio": audio_base64,
                                     }
                                     await websocket.send_json(response)
+                                    turn_timer.audio_sent()
                                 current_sentence = ""
 
                         # Handle any remaining text
@@ -109,6 +129,8 @@ async def websocket_endpoint(websocket: WebSocket):
                                     "audio": audio_base64,
                                 }
                                 await websocket.send_json(response)
+                                turn_timer.audio_sent()
+                        turn_timer.finish()
 
             except Exception as e:
                 # logger.error(f"Error in websocket handling: {e}")
@@ -121,3 +143,5 @@ async def websocket_endpoint(websocket: WebSocket):
         print("Connection Closed")
         # logger.error(f"Error in websocket connection: {e}", exc_info=True)
         await websocket.close()
+    finally:
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).dec()
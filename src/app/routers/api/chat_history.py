@@ -0,0 +1,90 @@
+"""Chat history api router module
+Lists the chat sessions of the current user and pages
+through the messages of a session
+"""
+
+from datetime import datetime
+from typing import Annotated, List, Optional
+
+from bson import ObjectId  # type: ignore
+from fastapi import APIRouter, Depends, HTTPException, Query, status  # type: ignore
+
+from utils import get_logger
+
+import app.services.user as user_service
+from app.routers.api import auth_middleware
+from app.services.db.chat_history_service import (
+    ChatHistoryService,
+    ChatMessage,
+    ChatSessionSummary,
+)
+from app.services.db.mongodb_service import MongoDB
+
+logger = get_logger("chat_history_router")
+
+router = APIRouter(
+    prefix="/chat-history",
+    tags=["chat-history"],
+    dependencies=[],
+    responses={404: {"message": "Not found", "code": 404}},
+)
+
+
+def require_database():
+    if MongoDB.db is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chat history storage is not available",
+        )
+
+
+@router.get(
+    "/sessions",
+    response_model=List[ChatSessionSummary],
+    dependencies=[Depends(require_database)],
+)
+async def list_sessions(
+    current_user: Annotated[
+        user_service.UserSchema, Depends(auth_middleware.extract_user_middleware)
+    ],
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    """Sessions of the current user, most recently updated first. Pass the
+    `updated_at` and `id` of the last session as `before` and `before_id` to
+    get the next page
+    """
+    if before_id is not None and (before is None or not ObjectId.is_valid(before_id)):
+        raise HTTPException(
+            status_code=400, detail="before_id must be a session id, with before"
+        )
+    return await ChatHistoryService.list_sessions(
+        current_user.id, before=before, before_id=before_id, limit=limit
+    )
+
+
+@router.get(
+    "/sessions/{session_id}/messages",
+    response_model=List[ChatMessage],
+    dependencies=[Depends(require_database)],
+)
+async def list_messages(
+    session_id: str,
+    current_user: Annotated[
+        user_service.UserSchema, Depends(auth_middleware.extract_user_middleware)
+    ],
+    before_seq: Optional[int] = None,
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+):
+    """Messages of a session, oldest first. Pass the `seq` of the first
+    message as `before_seq` to get the previous page
+    """
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    session = await ChatHistoryService.get_session(session_id)
+    if session is None or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await ChatHistoryService.get_messages_page(
+        session_id, before_seq=before_seq, limit=limit
+    )
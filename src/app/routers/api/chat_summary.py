@@ -3,10 +3,8 @@ from fastapi.responses import JSONResponse  # type: ignore
 from pydantic import BaseModel  # type: ignore
 from typing import List
 from application_context import chain
-import torch  # type: ignore
 from dotenv import load_dotenv  # type: ignore
-import numpy as np  # type: ignore
-import os
+import functools
 
 load_dotenv()
 
@@ -26,7 +24,10 @@ class ChatHistory(BaseModel):
     chat_history: List[ChatMessage]
 
 
-streaming_llm = chain()
+@functools.lru_cache(maxsize=None)
+def summary_chain():
+    """Built on the first summary request, not when the router is imported"""
+    return chain()
 
 
 @router.post("/tm/summaries")
@@ -39,7 +40,7 @@ async def chat_summary(chat_request: ChatHistory):
         user_input = "Summarize the above chat history."
 
         # Generate summary
-        summary = streaming_llm.predict(
+        summary = summary_chain().predict(
             chat_history=chat_history, user_input=user_input
         )
 
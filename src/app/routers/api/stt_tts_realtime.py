@@ -1,4 +1,4 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 from dotenv import load_dotenv
 import asyncio
 import json
@@ -8,10 +8,19 @@ from concurrent.futures import ThreadPoolExecutor
 import torch
 import numpy as np
 import io
+import time
+from typing import Optional
 import speech_recognition as sr
-from gtts import gTTS
+from app.services.tts_service import gTTS
+from app.services import stt_service
+from app.services import vad_service
+from app.services.db.session_store import get_session_store
+from app.services.warmup import warmup
 
 from app.services.llm_service import Chatbot_gpt
+from app.services.text_stream import SentenceSegmenter, TextDeltaCoalescer
+from app.services.tracing import SessionTracer
+from app.services import metrics
 
 load_dotenv(override=True)
 
@@ -25,17 +34,20 @@ logger.addHandler(handler)
 
 router = APIRouter(prefix="/stt-tm-text-audio", tags=["Thriving-Minds-Audio"])
 
+# Shared pool for the blocking STT and TTS calls of all connections
+executor = ThreadPoolExecutor(max_workers=8)
+metrics.track_executor("stt_tm_text_audio", executor)
 
-# =======================
-# Load Silero VAD Model
-# =======================
-def load_silero_vad():
-    """Load the Silero VAD model."""
-    model, utils = torch.hub.load(
-        repo_or_dir="snakers4/silero-vad", model="silero_vad", force_reload=False
-    )
-    get_speech_timestamps, _, _, _, _ = utils
-    return model, get_speech_timestamps
+# Speech in progress when the socket drops is kept for the resumed session,
+# up to 10 s of 16 kHz 16-bit PCM
+RESUME_AUDIO_MAX_BYTES = 10 * 16000 * 2
+
+
+async def warm_up_vad():
+    await asyncio.get_running_loop().run_in_executor(executor, vad_service.warm_up_vad)
+
+
+warmup.register("vad.silero", warm_up_vad)
 
 
 # =======================
@@ -58,7 +70,10 @@ def transcribe_audio(audio_bytes: bytes) -> str:
         )  # 16-bit PCM
 
         # Try with more specific parameters
-        text = r.recognize_google(audio_data, language="en-US", show_all=False)
+        with metrics.observe_stt("google"):
+            text = stt_service.recognize_google(
+                r, audio_data, language="en-US", show_all=False
+            )
 
         if text:
             logger.info(f"Transcription successful: '{text}'")
@@ -80,8 +95,7 @@ def transcribe_audio(audio_bytes: bytes) -> str:
 
 async def transcribe_async(audio_bytes: bytes) -> str:
     loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, transcribe_audio, audio_bytes)
+    return await loop.run_in_executor(executor, transcribe_audio, audio_bytes)
 
 
 # =======================
@@ -90,9 +104,10 @@ async def transcribe_async(audio_bytes: bytes) -> str:
 def generate_speech(text: str) -> str:
     """Convert text to speech using gTTS."""
     logger.info(f"Generating speech for text: '{text}'")
-    tts = gTTS(text=text, lang="en")
-    mp3_fp = io.BytesIO()
-    tts.write_to_fp(mp3_fp)
+    with metrics.observe_tts("gtts"):
+        tts = gTTS(text=text, lang="en")
+        mp3_fp = io.BytesIO()
+        tts.write_to_fp(mp3_fp)
     mp3_fp.seek(0)
     audio_data = mp3_fp.read()
     encoded_audio = base64.b64encode(audio_data).decode("utf-8")
@@ -102,25 +117,25 @@ def generate_speech(text: str) -> str:
 
 async def generate_speech_async(text: str) -> str:
     loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, generate_speech, text)
+    return await loop.run_in_executor(executor, generate_speech, text)
 
 
 # =======================
 # WebSocket Endpoint
 # =======================
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, resume: Optional[str] = Query(None)):
     await websocket.accept()
     logger.info("WebSocket connection established")
 
     # Initialize chatbot and Silero VAD
     chatbot = Chatbot_gpt(logger=logger)
-    vad_model, get_speech_timestamps = load_silero_vad()
+    vad_model, get_speech_timestamps = vad_service.load_silero_vad()
 
     # Configuration
     sample_rate = 16000
     silence_threshold = 1.2  # seconds
+    segmenter = SentenceSegmenter.from_spec()
 
     # State variables
     is_speaking = False
@@ -129,6 +144,64 @@ async def websocket_endpoint(websocket: WebSocket):
     audio_buffer = bytearray()  # Changed to bytearray for better byte handling
     is_listening = True
 
+    # Conversation state outlives the socket, a client reconnecting with the
+    # resume token continues where it was left
+    sessions = get_session_store()
+    session, resumed = await sessions.open(router.prefix, resume)
+    if resumed:
+        chatbot.load_history(session.messages)
+        silence_threshold = session.data.get("silence_threshold", silence_threshold)
+        segmenter = SentenceSegmenter.from_spec(session.data.get("segmenter"))
+        if session.data.get("pending_audio"):
+            # The utterance cut by the disconnect ends with the next silence
+            audio_buffer = bytearray(base64.b64decode(session.data["pending_audio"]))
+            is_speaking = True
+        logger.info(f"Resumed session {session.session_id}")
+    await websocket.send_json(sessions.greeting(session, resumed))
+
+    # Per-turn latency tracing
+    tracer = SessionTracer(router=router.prefix)
+    turn = None
+    turn_timer = None
+    last_speech_ns = 0
+    # When enabled by the client, each finished turn is echoed as a `trace`
+    # event (used by scripts/bench_turn.py)
+    echo_trace = False
+    metrics.ACTIVE_SOCKETS.labels(router=router.prefix).inc()
+
+    async def send_json(payload):
+        if turn is None:
+            await websocket.send_json(payload)
+            return
+        with turn.span("ws.send", type=payload.get("type")):
+            await websocket.send_json(payload)
+
+    async def finish_turn():
+        nonlocal turn
+        turn.finish()
+        if echo_trace:
+            await websocket.send_json({"type": "trace", "turn": turn.to_dict()})
+        turn = None
+
+    async def speak(sentence):
+        with turn.span("tts.synthesize", chars=len(sentence)):
+            audio = await generate_speech_async(sentence)
+        await send_json({"type": "audio", "text": sentence, "audio": audio})
+        turn_timer.audio_sent()
+        logger.info(f"Sent audio response for sentence: '{sentence}'")
+
+    async def save_session(disconnected=False):
+        pending_audio = None
+        if disconnected and is_speaking and len(audio_buffer) <= RESUME_AUDIO_MAX_BYTES:
+            pending_audio = base64.b64encode(audio_buffer).decode("ascii")
+        session.update(
+            chatbot.messages,
+            silence_threshold=silence_threshold,
+            segmenter=segmenter.spec,
+            pending_audio=pending_audio,
+        )
+        await sessions.save(session)
+
     try:
         while True:
             data = await websocket.receive()
@@ -164,6 +237,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         audio_buffer = bytearray()  # Reset buffer as bytearray
 
                     last_speech_time = current_time
+                    last_speech_ns = time.time_ns()
                     audio_buffer.extend(audio_bytes)  # Add chunk to buffer
                 else:
                     # Still record audio to maintain continuity
@@ -176,6 +250,15 @@ async def websocket_endpoint(websocket: WebSocket):
                                 f"Speech ended after {current_time - last_speech_time:.2f}s of silence"
                             )
                             is_speaking = False
+                            turn = tracer.start_turn(start_ns=last_speech_ns)
+                            turn.attributes["segmenter"] = segmenter.spec
+                            # The turn is only counted once there is a transcript
+                            turn_start = time.perf_counter()
+                            turn.add_span(
+                                "vad.end_of_speech",
+                                last_speech_ns,
+                                silence_threshold=silence_threshold,
+                            )
 
                             # Process the complete utterance
                             if len(audio_buffer) > 0:
@@ -193,14 +276,21 @@ async def websocket_endpoint(websocket: WebSocket):
                                         )
                                         audio_buffer = bytearray()
                                         is_listening = True
+                                        turn = None
                                         continue
 
                                     # Transcribe with proper error handling
-                                    text = await transcribe_async(audio_data)
+                                    with turn.span(
+                                        "stt.transcribe", audio_bytes=len(audio_data)
+                                    ):
+                                        text = await transcribe_async(audio_data)
                                     audio_buffer = bytearray()  # Clear the buffer
 
                                     if text:
-                                        await websocket.send_json(
+                                        turn_timer = metrics.TurnTimer(
+                                            router.prefix, start=turn_start
+                                        )
+                                        await send_json(
                                             {"type": "user_text", "text": text}
                                         )
                                         logger.info(
@@ -215,35 +305,55 @@ async def websocket_endpoint(websocket: WebSocket):
 
                                         try:
                                             # Generate and send response in chunks
-                                            response_buffer = []
-                                            for chunk in chatbot.run(text, 1):
-                                                response_buffer.append(chunk)
-                                                if chunk.strip().endswith(
-                                                    (".", "!", "?")
-                                                ):
-                                                    sentence = "".join(response_buffer)
-                                                    response_buffer = []
-                                                    audio = await generate_speech_async(
-                                                        sentence
-                                                    )
-                                                    await websocket.send_json(
-                                                        {
-                                                            "type": "audio",
-                                                            "text": sentence,
-                                                            "audio": audio,
-                                                        }
-                                                    )
-                                                    logger.info(
-                                                        f"Sent audio response for sentence: '{sentence}'"
+                                            text_deltas = TextDeltaCoalescer(send_json)
+                                            with turn.span("retrieval"):
+                                                context = await asyncio.get_running_loop().run_in_executor(
+                                                    executor,
+                                                    chatbot.retrieve_context,
+                                                    text,
+                                                )
+                                            llm_start_ns = time.time_ns()
+                                            for chunk in chatbot.run(
+                                                text, 1, context=context
+                                            ):
+                                                turn.mark_once(
+                                                    "llm.time_to_first_token",
+                                                    llm_start_ns,
+                                                )
+                                                await text_deltas.push(chunk)
+                                                sentence = segmenter.push(chunk)
+                                                if sentence is not None:
+                                                    await text_deltas.flush()
+                                                    turn.mark_once(
+                                                        "llm.first_sentence",
+                                                        llm_start_ns,
                                                     )
+                                                    await speak(sentence)
+                                            await text_deltas.flush()
+                                            # The tail held back by min_chars,
+                                            # or an answer cut off by max_tokens
+                                            remainder = segmenter.flush()
+                                            if remainder and remainder.strip():
+                                                turn.mark_once(
+                                                    "llm.first_sentence",
+                                                    llm_start_ns,
+                                                )
+                                                await speak(remainder)
+                                            turn_timer.finish()
+                                            turn_timer = None
                                         finally:
                                             # Resume listening after response
                                             is_listening = True
+                                            # Drops what is left after an error
+                                            segmenter.flush()
+                                            await finish_turn()
+                                            await save_session()
                                             logger.info(
                                                 "Response phase complete, resuming listening"
                                             )
                                     else:
                                         logger.warning("Empty transcription result")
+                                        await finish_turn()
 
                                 except Exception as e:
                                     logger.error(
@@ -252,6 +362,12 @@ async def websocket_endpoint(websocket: WebSocket):
                                     )
                                     audio_buffer = bytearray()
                                     is_listening = True
+                                    if turn is not None:
+                                        turn.attributes["error"] = str(e)
+                                        await finish_turn()
+                                    if turn_timer is not None:
+                                        turn_timer.finish(error=True)
+                                        turn_timer = None
 
             # Handle text-based control messages
             elif "text" in data:
@@ -266,6 +382,16 @@ async def websocket_endpoint(websocket: WebSocket):
                             f"Updated silence threshold to {silence_threshold}s"
                         )
 
+                    if "segmenter" in config:
+                        try:
+                            segmenter = SentenceSegmenter.from_spec(config["segmenter"])
+                            logger.info(f"Updated segmenter to {segmenter.spec}")
+                        except ValueError as e:
+                            logger.warning(f"Invalid segmenter: {e}")
+
+                    if "trace" in config:
+                        echo_trace = bool(config["trace"])
+
                     if "vad_threshold" in config:
                         # We would need to re-initialize the model with new threshold
                         # This is a simplification, as the threshold is used in get_speech_timestamps
@@ -282,4 +408,6 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         await websocket.close()
     finally:
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).dec()
+        await save_session(disconnected=True)
         logger.info("WebSocket connection closed")
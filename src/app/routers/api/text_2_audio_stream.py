@@ -1,4 +1,4 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 from app.routers.api.auth_middleware import (
     websocket_auth,
 )  # Import the decorator
@@ -9,7 +9,6 @@ from app.services.llm_service import Chatbot_gpt
 from dotenv import load_dotenv
 import os
 import base64
-import torch
 import logging
 from openai import OpenAI
 import base64
@@ -17,17 +16,25 @@ import base64
 
 from app.routers.api import auth_middleware
 from fastapi import APIRouter, Depends  # type: ignore
-from typing import Union, Annotated
+from typing import Union, Annotated, Optional
 
 from app.services import auth as auth_service
+from app.services.db.session_store import get_session_store
+from app.services.semantic_cache import (
+    CachedResponse,
+    CachedSentence,
+    get_semantic_cache,
+)
+from app.services.text_stream import SentenceSegmenter, TextDeltaCoalescer
+from app.services.tracing import SessionTracer
+from app.services import metrics
+from app.services.warmup import WARMUP_TEXT, warmup
 
 load_dotenv(override=True)
 
 # Initialize the logger
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
-# In-memory storage for chat history
-device = "cuda:0" if torch.cuda.is_available() else "cpu"
 
 
 # App state initialization
@@ -67,12 +74,13 @@ def openai_text_to_speech(text):
     """
     try:
         # Call OpenAI TTS API
-        response = client.audio.speech.create(
-            model="tts-1",  # Use tts-1 for standard quality or tts-1-hd for high quality
-            voice="alloy",  # Options: alloy, echo, fable, onyx, nova, shimmer
-            input=text,
-            response_format="mp3",  # Ensure MP3 format for compatibility
-        )
+        with metrics.observe_tts("openai"):
+            response = client.audio.speech.create(
+                model="tts-1",  # Use tts-1 for standard quality or tts-1-hd for high quality
+                voice="alloy",  # Options: alloy, echo, fable, onyx, nova, shimmer
+                input=text,
+                response_format="mp3",  # Ensure MP3 format for compatibility
+            )
 
         # Read the audio content
         audio_data = response.content
@@ -88,9 +96,11 @@ def openai_text_to_speech(text):
 
 
 import asyncio
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 executor = ThreadPoolExecutor(max_workers=4)
+metrics.track_executor("tm_text_audio", executor)
 
 
 async def openai_text_to_speech_async(text):
@@ -98,14 +108,41 @@ async def openai_text_to_speech_async(text):
     return await loop.run_in_executor(executor, openai_text_to_speech, text)
 
 
+async def warm_up_openai_tts():
+    if await openai_text_to_speech_async(WARMUP_TEXT) is None:
+        raise RuntimeError("OpenAI TTS returned no audio")
+
+
+warmup.register("tts.openai", warm_up_openai_tts)
+
+
+def log_cache_store_failure(future):
+    """the store runs in the background, nothing else would see its error"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Semantic cache store failed: {future.exception()}")
+
+
 @router.websocket("/ws_stream_response")
 async def websocket_endpoint(
     websocket: WebSocket,
+    resume: Optional[str] = Query(None),
 ):
     logger.info("PAUSE")
 
     await websocket.accept()
     chatbot = Chatbot_gpt(logger=logger)
+    # The history outlives the socket, a client reconnecting with the resume
+    # token continues the conversation
+    sessions = get_session_store()
+    session, resumed = await sessions.open(router.prefix, resume)
+    if resumed:
+        chatbot.load_history(session.messages)
+    await websocket.send_json(sessions.greeting(session, resumed))
+    semantic_cache = get_semantic_cache()
+    text_deltas = TextDeltaCoalescer(websocket.send_json)
+    tracer = SessionTracer(router=router.prefix)
+    metrics.ACTIVE_SOCKETS.labels(router=router.prefix).inc()
+    turn_timer = None
     logger.info("PAUSE")
     try:
         while True:
@@ -120,31 +157,116 @@ async def websocket_endpoint(
                 else:
                     model_type = 0
                 if text_data.strip():
-                    current_sentence = ""
-                    for chunk in chatbot.run(text_data, model_type):
-                        logger.debug(f"Processing chunk: {chunk}")
-                        current_sentence += chunk
-
-                        if any(
-                            current_sentence.endswith(punct)
-                            for punct in [".", "!", "?"]
-                        ):
+                    try:
+                        segmenter = SentenceSegmenter.from_spec(
+                            message.get("segmenter")
+                        )
+                    except ValueError as e:
+                        logger.warning(f"Invalid segmenter: {e}")
+                        segmenter = SentenceSegmenter.from_spec()
+                    turn = tracer.start_turn()
+                    turn.attributes["segmenter"] = segmenter.spec
+                    turn_timer = metrics.TurnTimer(router.prefix)
+                    loop = asyncio.get_event_loop()
+                    cache_namespace = f"{model_method}:{tts_method}"
+                    cacheable = semantic_cache is not None and (
+                        semantic_cache.is_cacheable(
+                            text_data, first_turn=len(chatbot.messages) == 1
+                        )
+                    )
+                    cached = None
+                    if cacheable:
+                        with turn.span("cache.lookup"):
+                            cached = await loop.run_in_executor(
+                                executor,
+                                semantic_cache.lookup,
+                                text_data,
+                                cache_namespace,
+                            )
+                        turn.attributes["cache_hit"] = cached is not None
+
+                    if cached is not None:
+                        await text_deltas.push(cached.text)
+                        await text_deltas.flush()
+                        # Replay the cached sentences with their pre-rendered audio
+                        for sentence in cached.sentences:
+                            await websocket.send_json(
+                                {
+                                    "type": "audio",
+                                    "text": sentence.text,
+                                    "audio": sentence.audio,
+                                    "has_more": True,
+                                }
+                            )
+                            turn_timer.audio_sent()
+                        chatbot.append_turn(text_data, cached.text)
+                    else:
+                        response_text = ""
+                        sentences = []
+                        with turn.span("retrieval"):
+                            context = await loop.run_in_executor(
+                                executor, chatbot.retrieve_context, text_data
+                            )
+
+                        async def speak(unit: str):
+                            unit = unit.strip()
+                            if not unit:
+                                return
                             # Use selected TTS method
-                            if tts_method == "openai":
-                                audio_base64 = await openai_text_to_speech_async(
-                                    current_sentence.strip()
-                                )
-                            else:
-                                audio_base64 = text_to_speech(current_sentence.strip())
+                            with turn.span(
+                                "tts.synthesize", provider=tts_method, chars=len(unit)
+                            ):
+                                if tts_method == "openai":
+                                    audio_base64 = await openai_text_to_speech_async(
+                                        unit
+                                    )
+                                else:
+                                    audio_base64 = text_to_speech(unit)
                             if audio_base64:
                                 response = {
                                     "type": "audio",
-                                    "text": current_sentence.strip(),
+                                    "text": unit,
                                     "audio": audio_base64,
                                     "has_more": True,
                                 }
                                 await websocket.send_json(response)
-                            current_sentence = ""
+                                turn_timer.audio_sent()
+                            sentences.append(
+                                CachedSentence(text=unit, audio=audio_base64)
+                            )
+
+                        llm_start_ns = time.time_ns()
+                        for chunk in chatbot.run(
+                            text_data, model_type, context=context
+                        ):
+                            logger.debug(f"Processing chunk: {chunk}")
+                            turn.mark_once("llm.time_to_first_token", llm_start_ns)
+                            response_text += chunk
+                            await text_deltas.push(chunk)
+
+                            current_sentence = segmenter.push(chunk)
+                            if current_sentence is not None:
+                                await text_deltas.flush()
+                                turn.mark_once("llm.first_sentence", llm_start_ns)
+                                await speak(current_sentence)
+                        await text_deltas.flush()
+                        # The tail held back by min_chars, or an answer cut
+                        # off by max_tokens, is spoken as the last unit
+                        remainder = segmenter.flush()
+                        if remainder is not None:
+                            turn.mark_once("llm.first_sentence", llm_start_ns)
+                            await speak(remainder)
+
+                        # Only complete renders are cached, a replay must sound
+                        # exactly like the original answer
+                        if cacheable and sentences and all(s.audio for s in sentences):
+                            loop.run_in_executor(
+                                executor,
+                                semantic_cache.store,
+                                text_data,
+                                CachedResponse(text=response_text, sentences=sentences),
+                                cache_namespace,
+                            ).add_done_callback(log_cache_store_failure)
 
                     await websocket.send_json(
                         {
@@ -154,9 +276,21 @@ async def websocket_endpoint(
                             "has_more": False,
                         }
                     )
+                    turn_timer.finish()
+                    turn_timer = None
+                    turn.finish()
+                    session.update(chatbot.messages)
+                    await sessions.save(session)
+                    # Opt-in per message, used by scripts/bench_turn.py
+                    if message.get("trace"):
+                        await websocket.send_json(
+                            {"type": "trace", "turn": turn.to_dict()}
+                        )
 
             except Exception as e:
                 logger.error(f"Error in WebSocket handling: {e}")
+                if turn_timer is not None:
+                    turn_timer.finish(error=True)
                 break
 
     except WebSocketDisconnect:
@@ -164,3 +298,5 @@ async def websocket_endpoint(
     except Exception as e:
         logger.error(f"Connection Closed: {e}")
         await websocket.close()
+    finally:
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).dec()
@@ -1,4 +1,6 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from typing import Optional
+from bson import ObjectId
 from application_context import text_to_speech
 from app.services.llm_service import Chatbot_gpt
 from dotenv import load_dotenv
@@ -7,6 +9,10 @@ import base64
 import torch
 import logging
 from app.services.db.chat_history_service import ChatHistoryService
+from app.services.db.chat_history_buffer import get_chat_history_buffer
+from app.services.db.session_cache import WINDOW as HISTORY_WINDOW
+from app.services.text_stream import TextDeltaCoalescer
+from app.services import metrics
 
 load_dotenv()
 
@@ -41,16 +47,41 @@ async def startup_event():
 
 
 @router.websocket("/ws_stream_response_v1")
-async def websocket_endpoint(websocket: WebSocket, user_id: str = Query(...)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: str = Query(...),
+    resume_session_id: Optional[str] = Query(None, alias="session_id"),
+):
     await websocket.accept()
     chatbot = Chatbot_gpt(logger=logger)
-
-    # Create a chat session for the user and send the session ID to the frontend
-    session = await ChatHistoryService.create_session(user_id=user_id)
-    session_id = session.id  # MongoDB _id
-    await websocket.send_json({"type": "session_id", "session_id": session_id})
+    text_deltas = TextDeltaCoalescer(websocket.send_json)
+    # Messages are persisted in the background, off the turn's critical path
+    chat_history = get_chat_history_buffer()
+    session_id = None
 
     try:
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).inc()
+        session = None
+        if resume_session_id and ObjectId.is_valid(resume_session_id):
+            session = await ChatHistoryService.get_session(resume_session_id)
+            if session is not None and session.user_id != user_id:
+                session = None
+        if session is not None:
+            # Resume with the recent history, served from the session cache
+            session_id = session.id
+            history = await ChatHistoryService.get_recent_messages(
+                session_id, HISTORY_WINDOW
+            )
+            chatbot.load_history(
+                [{"role": m.role, "content": m.content} for m in history]
+            )
+        else:
+            # Create a chat session for the user
+            session = await ChatHistoryService.create_session(user_id=user_id)
+            session_id = str(session.id)  # MongoDB _id
+        # Send the session ID to the frontend
+        await websocket.send_json({"type": "session_id", "session_id": session_id})
+
         while True:
             try:
                 # Receive text input and session ID from the WebSocket
@@ -62,11 +93,10 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str = Query(...)):
                     raise ValueError("Session ID and text must be provided.")
 
                 # Add the user's message to the chat history
-                await ChatHistoryService.add_message(
-                    session_id=session_id, role="user", content=text_data
-                )
+                await chat_history.append(session_id, role="user", content=text_data)
 
                 if text_data.strip():
+                    turn_timer = metrics.TurnTimer(router.prefix)
                     current_sentence = ""
                     response_text = ""
 
@@ -76,11 +106,13 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str = Query(...)):
 
                         current_sentence += chunk
                         response_text += chunk
+                        await text_deltas.push(chunk)
 
                         if any(
                             current_sentence.endswith(punct)
                             for punct in [".", "!", "?"]
                         ):
+                            await text_deltas.flush()
                             # Convert completed sentence to speech
                             audio_base64 = text_to_speech(current_sentence.strip())
                             if audio_base64:
@@ -91,11 +123,13 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str = Query(...)):
                                     "has_more": True,
                                 }
                                 await websocket.send_json(response)
+                                turn_timer.audio_sent()
                             current_sentence = ""
+                    await text_deltas.flush()
 
                     # Add assistant's response to the chat history
-                    await ChatHistoryService.add_message(
-                        session_id=session_id, role="assistant", content=response_text
+                    await chat_history.append(
+                        session_id, role="assistant", content=response_text
                     )
 
                     # Send end-of-stream signal
@@ -107,6 +141,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str = Query(...)):
                             "has_more": False,
                         }
                     )
+                    turn_timer.finish()
             except Exception as e:
                 logger.error(f"Error in WebSocket handling: {e}")
                 break
@@ -116,3 +151,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str = Query(...)):
     except Exception as e:
         logger.error(f"WebSocket connection closed with error: {e}")
         await websocket.close()
+    finally:
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).dec()
+        if session_id:
+            await chat_history.flush(session_id)
@@ -1,5 +1,10 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from deepgram import DeepgramClient, LiveTranscriptionEvents, LiveOptions
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from deepgram import (
+    DeepgramClient,
+    DeepgramClientOptions,
+    LiveTranscriptionEvents,
+    LiveOptions,
+)
 import os
 from dotenv import load_dotenv
 import asyncio
@@ -7,10 +12,16 @@ import json
 import base64
 import logging
 from concurrent.futures import ThreadPoolExecutor
-from gtts import gTTS
+from app.services.tts_service import gTTS
 import io
+import time
+from typing import Optional
 
+from app.services.db.session_store import get_session_store
 from app.services.llm_service import Chatbot_gpt
+from app.services.text_stream import SentenceSegmenter, TextDeltaCoalescer
+from app.services.tracing import SessionTracer
+from app.services import metrics
 
 # Load environment variables
 load_dotenv(override=True)
@@ -27,15 +38,22 @@ router = APIRouter(prefix="/stt-tm-text-audio", tags=["Thriving-Minds-Audio"])
 
 # Deepgram API Key
 API_KEY = os.getenv("DEEPGRAM_API_KEY")
+# Overrides the Deepgram endpoint, e.g. the local emulator in fake_providers
+DEEPGRAM_URL = os.getenv("DEEPGRAM_URL")
+
+# Shared pool for the blocking TTS calls of all connections
+executor = ThreadPoolExecutor(max_workers=8)
+metrics.track_executor("stt_tm_text_audio_deepgram", executor)
 
 
 # Text-to-Speech Functions
 def generate_speech(text: str) -> str:
     """Convert text to speech using gTTS."""
     logger.info(f"Generating speech for text: '{text}'")
-    tts = gTTS(text=text, lang="en")
-    mp3_fp = io.BytesIO()
-    tts.write_to_fp(mp3_fp)
+    with metrics.observe_tts("gtts"):
+        tts = gTTS(text=text, lang="en")
+        mp3_fp = io.BytesIO()
+        tts.write_to_fp(mp3_fp)
     mp3_fp.seek(0)
     audio_data = mp3_fp.read()
     encoded_audio = base64.b64encode(audio_data).decode("utf-8")
@@ -46,25 +64,61 @@ def generate_speech(text: str) -> str:
 async def generate_speech_async(text: str) -> str:
     """Asynchronous wrapper for generate_speech."""
     loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, generate_speech, text)
+    return await loop.run_in_executor(executor, generate_speech, text)
 
 
 # WebSocket Endpoint
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, resume: Optional[str] = Query(None)):
     await websocket.accept()
     logger.info("WebSocket connection established")
 
     # Initialize chatbot and Deepgram client
     chatbot = Chatbot_gpt(logger=logger)
-    deepgram = DeepgramClient(api_key=API_KEY)
+    if DEEPGRAM_URL:
+        deepgram = DeepgramClient(API_KEY, DeepgramClientOptions(url=DEEPGRAM_URL))
+    else:
+        deepgram = DeepgramClient(api_key=API_KEY)
     dg_connection = deepgram.listen.live.v("1")
 
     # State variables
     accumulated_text = ""  # To accumulate transcription until utterance ends
     utterances_queue = asyncio.Queue()  # Queue for processing utterances
     is_listening = True  # Control whether to process new transcriptions
+    first_segment_ns = 0  # Wall clock of the first and last final segments
+    last_segment_ns = 0
+    segmenter = SentenceSegmenter.from_spec()
+    # When enabled by the client, each finished turn is echoed as a `trace`
+    # event (used by scripts/bench_turn.py)
+    echo_trace = False
+
+    # Conversation state outlives the socket, a client reconnecting with the
+    # resume token continues where it was left
+    sessions = get_session_store()
+    session, resumed = await sessions.open(router.prefix, resume)
+    if resumed:
+        chatbot.load_history(session.messages)
+        # The transcript of an utterance cut by the disconnect is continued
+        accumulated_text = session.data.get("accumulated_text", "")
+        if accumulated_text:
+            first_segment_ns = last_segment_ns = time.time_ns()
+        logger.info(f"Resumed session {session.session_id}")
+    await websocket.send_json(sessions.greeting(session, resumed))
+
+    async def save_session():
+        session.update(chatbot.messages, accumulated_text=accumulated_text)
+        await sessions.save(session)
+
+    # Per-turn latency tracing
+    tracer = SessionTracer(router=router.prefix)
+    turn = None
+
+    async def send_json(payload):
+        if turn is None:
+            await websocket.send_json(payload)
+            return
+        with turn.span("ws.send", type=payload.get("type")):
+            await websocket.send_json(payload)
 
     # Get the current event loop
     loop = asyncio.get_event_loop()
@@ -74,10 +128,13 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.info("Deepgram connection opened")
 
     def on_message(self, result, **kwargs):
-        nonlocal accumulated_text, is_listening
+        nonlocal accumulated_text, is_listening, first_segment_ns, last_segment_ns
         if result.speech_final and is_listening:
             sentence = result.channel.alternatives[0].transcript
             if sentence:
+                if not accumulated_text:
+                    first_segment_ns = time.time_ns()
+                last_segment_ns = time.time_ns()
                 accumulated_text += " " + sentence
                 logger.info(f"Transcription segment: '{sentence}'")
 
@@ -85,9 +142,13 @@ async def websocket_endpoint(websocket: WebSocket):
         nonlocal accumulated_text, is_listening
         if accumulated_text and is_listening:
             # Safely queue the utterance using the main event loop
-            asyncio.run_coroutine_threadsafe(
-                utterances_queue.put(accumulated_text.strip()), loop
+            utterance = (
+                accumulated_text.strip(),
+                first_segment_ns,
+                last_segment_ns,
+                time.time_ns(),
             )
+            asyncio.run_coroutine_threadsafe(utterances_queue.put(utterance), loop)
             accumulated_text = ""
             logger.info("Utterance ended, queued for processing")
 
@@ -126,47 +187,114 @@ async def websocket_endpoint(websocket: WebSocket):
 
     # Task to process utterances
     async def process_utterances():
-        nonlocal is_listening
+        nonlocal is_listening, turn
         while True:
-            text = await utterances_queue.get()
+            text, first_ns, last_ns, end_ns = await utterances_queue.get()
             if text and is_listening:
+                turn = tracer.start_turn(start_ns=last_ns)
+                turn_timer = metrics.TurnTimer(router.prefix)
+                metrics.STT_CALLS.labels(provider="deepgram").inc()
+                # Deepgram transcribes while the user speaks, this span is
+                # the speech itself, from the first to the last final segment
+                turn.add_span("stt.speech", first_ns, last_ns)
+                turn.add_span("vad.end_of_speech", last_ns, end_ns)
+
                 # Send user transcription to client
-                await websocket.send_json({"type": "user_text", "text": text})
+                await send_json({"type": "user_text", "text": text})
                 logger.info(f"User text sent to client: '{text}'")
 
                 # Switch to responding state
                 is_listening = False
                 logger.info("Stopped listening, entering response phase")
 
+                # A segmenter sent during the turn applies to the next one
+                turn_segmenter = segmenter
+                turn.attributes["segmenter"] = turn_segmenter.spec
+
+                async def speak(sentence):
+                    with turn.span("tts.synthesize", chars=len(sentence)):
+                        audio = await generate_speech_async(sentence)
+                    await send_json({"type": "audio", "text": sentence, "audio": audio})
+                    turn_timer.audio_sent()
+                    logger.info(f"Sent audio response for sentence: '{sentence}'")
+
                 try:
                     # Generate and send response in chunks
-                    response_buffer = []
-                    for chunk in chatbot.run(text, 1):
-                        response_buffer.append(chunk)
-                        if chunk.strip().endswith((".", "!", "?")):
-                            sentence = "".join(response_buffer)
-                            response_buffer = []
-                            audio = await generate_speech_async(sentence)
-                            await websocket.send_json(
-                                {"type": "audio", "text": sentence, "audio": audio}
-                            )
-                            logger.info(
-                                f"Sent audio response for sentence: '{sentence}'"
-                            )
+                    text_deltas = TextDeltaCoalescer(send_json)
+                    with turn.span("retrieval"):
+                        context = await asyncio.get_running_loop().run_in_executor(
+                            executor, chatbot.retrieve_context, text
+                        )
+                    llm_start_ns = time.time_ns()
+                    for chunk in chatbot.run(text, 1, context=context):
+                        turn.mark_once("llm.time_to_first_token", llm_start_ns)
+                        await text_deltas.push(chunk)
+                        sentence = turn_segmenter.push(chunk)
+                        if sentence is not None:
+                            await text_deltas.flush()
+                            turn.mark_once("llm.first_sentence", llm_start_ns)
+                            await speak(sentence)
+                    await text_deltas.flush()
+                    # The tail held back by min_chars, or an answer cut off by
+                    # max_tokens
+                    remainder = turn_segmenter.flush()
+                    if remainder and remainder.strip():
+                        turn.mark_once("llm.first_sentence", llm_start_ns)
+                        await speak(remainder)
                 finally:
                     # Resume listening after response
                     is_listening = True
+                    # Drops what is left after an error
+                    turn_segmenter.flush()
+                    turn.finish()
+                    if echo_trace:
+                        await websocket.send_json(
+                            {"type": "trace", "turn": turn.to_dict()}
+                        )
+                    turn = None
+                    turn_timer.finish()
+                    await save_session()
                     logger.info("Response phase complete, resuming listening")
             utterances_queue.task_done()
 
-    # Task to process incoming audio
+    def apply_control(text):
+        nonlocal segmenter, echo_trace
+        try:
+            config = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning("Invalid JSON received in control message")
+            return
+        if not isinstance(config, dict):
+            logger.warning("Control message is not a JSON object")
+            return
+        logger.info(f"Received control message: {config}")
+
+        if "segmenter" in config:
+            try:
+                segmenter = SentenceSegmenter.from_spec(config["segmenter"])
+                logger.info(f"Updated segmenter to {segmenter.spec}")
+            except ValueError as e:
+                logger.warning(f"Invalid segmenter: {e}")
+
+        if "trace" in config:
+            echo_trace = bool(config["trace"])
+
+        if "silence_threshold" in config:
+            # Deepgram ends utterances after utterance_end_ms, set at start
+            logger.info("silence_threshold is not supported by this router")
+
+    # Task to process incoming audio and control messages
     async def process_audio():
         while True:
             try:
-                audio_data = await asyncio.wait_for(
-                    websocket.receive_bytes(), timeout=30.0
-                )
-                dg_connection.send(audio_data)
+                message = await asyncio.wait_for(websocket.receive(), timeout=30.0)
+                if message["type"] == "websocket.disconnect":
+                    logger.info("WebSocket disconnected")
+                    break
+                if message.get("bytes") is not None:
+                    dg_connection.send(message["bytes"])
+                elif message.get("text") is not None:
+                    apply_control(message["text"])
             except asyncio.TimeoutError:
                 logger.info("No audio data received for 30 seconds")
                 break
@@ -179,10 +307,25 @@ async def websocket_endpoint(websocket: WebSocket):
     process_audio_task = asyncio.create_task(process_audio())
 
     try:
-        await asyncio.gather(process_utterances_task, process_audio_task)
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).inc()
+        # process_utterances never returns, the connection ends with
+        # process_audio (disconnect or timeout) or with an error in either
+        done, pending = await asyncio.wait(
+            [process_utterances_task, process_audio_task],
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
     except Exception as e:
         logger.error(f"An error occurred: {e}", exc_info=True)
     finally:
+        metrics.ACTIVE_SOCKETS.labels(router=router.prefix).dec()
+        # Saved first, the partial transcript and history are what a resume
+        # continues from, whatever happens to the Deepgram connection
+        await save_session()
         dg_connection.finish()
         await websocket.close()
         logger.info("WebSocket connection closed")
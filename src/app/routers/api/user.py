@@ -68,7 +68,16 @@ async def read_users_me(
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
-    user = await auth_service.authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await auth_service.authenticate_user(
+            form_data.username, form_data.password
+        )
+    except auth_service.PasswordHashingBusy as ex:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, retry shortly",
+            headers={"Retry-After": "1"},
+        ) from ex
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
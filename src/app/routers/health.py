@@ -0,0 +1,38 @@
+"""Readiness probe /ready
+this is a non api JSON reponse router
+"""
+
+from fastapi import APIRouter  # type: ignore
+from fastapi.responses import JSONResponse  # type: ignore
+
+from app.services.db.mongodb_service import MongoDB
+from app.services.db.redis_service import Redis
+from app.services.warmup import warmup
+
+
+router = APIRouter(
+    prefix="",
+    tags=["health"],
+    dependencies=[],
+    responses={404: {"message": "Not found", "code": 404}},
+)
+
+
+@router.get("/ready", include_in_schema=False)
+async def ready():
+    """200 once the warm-up has finished and every configured dependency
+    answers, 503 otherwise"""
+    checks = {"warmup": warmup.done}
+    if MongoDB.client is not None:
+        checks["mongodb"] = await MongoDB.ping()
+    if Redis.client is not None:
+        checks["redis"] = await Redis.ping()
+    ok = all(checks.values())
+    return JSONResponse(
+        {
+            "status": "ready" if ok else "unavailable",
+            "checks": checks,
+            "warmup": warmup.results,
+        },
+        status_code=200 if ok else 503,
+    )
@@ -0,0 +1,33 @@
+"""Prometheus scrape endpoint /metrics
+this is a non api plain text reponse router
+"""
+
+import os
+
+from fastapi import APIRouter  # type: ignore
+from fastapi.responses import Response  # type: ignore
+from prometheus_client import (  # type: ignore
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+
+
+router = APIRouter(
+    prefix="",
+    tags=["metrics"],
+    dependencies=[],
+    responses={404: {"message": "Not found", "code": 404}},
+)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Aggregate the metrics of all gunicorn workers
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -2,8 +2,11 @@
 """
 
 from app.services import user as user_service
+from app.services import metrics
 from pydantic import BaseModel  # type: ignore
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 
 from jose import jwt  # type: ignore
 from passlib.context import CryptContext  # type: ignore
@@ -17,6 +20,22 @@ ACCESS_TOKEN_EXPIRE_HOURS = os.environ["AUTH_ACCESS_TOKEN_EXPIRE_HOURS"]
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt costs ~100+ ms of CPU and releases the GIL, so it runs on a small
+# dedicated pool instead of the event loop. Requests beyond the pool and its
+# queue are rejected rather than piling up behind each other.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+metrics.track_executor("password_hash", password_executor)
+_password_slots: asyncio.Semaphore | None = None
+
+
+class PasswordHashingBusy(RuntimeError):
+    """Too many password hashes are already queued"""
+
 
 class Token(BaseModel):
     access_token: str
@@ -54,6 +73,25 @@ def hash_password(password) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_password_job(fn, *args):
+    global _password_slots  # pylint: disable=global-statement
+    if _password_slots is None:
+        _password_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    if _password_slots.locked():
+        raise PasswordHashingBusy("Too many concurrent password checks")
+    async with _password_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, fn, *args)
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def hash_password_async(password) -> str:
+    return await _run_password_job(hash_password, password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -79,6 +117,6 @@ async def authenticate_user(username: str, password: str) -> user_service.UserSc
     if not user:
         raise RuntimeError(f"User with username `{username}` not found")
 
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         raise RuntimeError("Unable to verify password with stored hash")
     return user
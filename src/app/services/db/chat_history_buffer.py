@@ -0,0 +1,172 @@
+"""Write-behind buffer for chat history appends
+
+Routers queue messages with `append`, which never waits on MongoDB (it only
+writes through to the Redis session cache, when configured). A
+background task writes the queue with one `insert_many` into `chat_messages`
+every CHAT_HISTORY_FLUSH_MS, or sooner once CHAT_HISTORY_FLUSH_SIZE
+messages are waiting.
+
+Messages are only removed from the queue once MongoDB acknowledged them. A
+failed write puts them back in front of the newer messages of the session and
+is retried with exponential backoff, so the order within a session is kept.
+A message keeps the `seq` allocated by its first attempt, so retrying a write
+that did reach the server is ignored by the unique index. Routers call
+`flush(session_id)` when the client disconnects and the buffer is drained on
+shutdown with `close`. The queue is bounded by CHAT_HISTORY_MAX_PENDING,
+beyond that new messages are dropped and counted.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId  # type: ignore
+from pymongo.errors import PyMongoError  # type: ignore
+
+from utils import get_logger
+from app.services import metrics
+from .chat_history_service import ChatHistoryService, ChatMessage
+from .session_cache import SessionCache, get_session_cache
+
+
+logger = get_logger("chat_history_buffer")
+
+FLUSH_INTERVAL_MS = float(os.getenv("CHAT_HISTORY_FLUSH_MS", 250))
+FLUSH_SIZE = int(os.getenv("CHAT_HISTORY_FLUSH_SIZE", 100))
+MAX_PENDING = int(os.getenv("CHAT_HISTORY_MAX_PENDING", 10000))
+MAX_RETRY_DELAY = 10.0  # seconds
+
+
+class ChatHistoryWriteBuffer:
+    def __init__(
+        self,
+        flush_interval_ms: float = FLUSH_INTERVAL_MS,
+        flush_size: int = FLUSH_SIZE,
+        max_pending: int = MAX_PENDING,
+        cache: Optional[SessionCache] = None,
+    ):
+        self.cache = cache
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self._pending: Dict[str, List[ChatMessage]] = {}
+        self._count = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return self._count
+
+    def _add_pending(self, count: int):
+        # The gauge is updated with the count, a function gauge would always
+        # read 0 under the gunicorn multiprocess collector
+        self._count += count
+        metrics.CHAT_HISTORY_PENDING.inc(count)
+
+    async def append(self, session_id: str, role: str, content: str):
+        """queues a message for `session_id`"""
+        if not ObjectId.is_valid(session_id):
+            # Rejected here, it would otherwise be retried forever
+            raise ValueError(f"Invalid session id {session_id}")
+        if self._count >= self.max_pending:
+            logger.error(f"Write buffer full, dropping message of {session_id}")
+            metrics.CHAT_HISTORY_DROPPED.inc()
+            return
+        message = ChatMessage(role=role, content=content, timestamp=datetime.utcnow())
+        self._pending.setdefault(str(session_id), []).append(message)
+        self._add_pending(1)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if self._count >= self.flush_size:
+            self._wakeup.set()
+        if self.cache is not None:
+            await self.cache.append(session_id, [message])
+
+    async def flush(self, session_id: Optional[str] = None) -> bool:
+        """writes the queued messages of `session_id` (all sessions if None)
+        now. Returns False if the write failed, the messages then stay queued
+        for the background retries
+        """
+        async with self._flush_lock:
+            if session_id is None:
+                batches = self._take_all()
+            else:
+                batches = self._take(str(session_id))
+            return await self._write(batches)
+
+    async def close(self, attempts: int = 3):
+        """stops the background task and drains the queue"""
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+        delay = 0.5
+        for _ in range(attempts):
+            if await self.flush():
+                return
+            await asyncio.sleep(delay)
+            delay *= 2
+        logger.error(f"{self._count} chat messages could not be written on shutdown")
+
+    def _take(self, session_id: str) -> Dict[str, List[ChatMessage]]:
+        messages = self._pending.pop(session_id, [])
+        self._add_pending(-len(messages))
+        return {session_id: messages} if messages else {}
+
+    def _take_all(self) -> Dict[str, List[ChatMessage]]:
+        batches = self._pending
+        self._pending = {}
+        self._add_pending(-self._count)
+        return batches
+
+    def _requeue(self, batches: Dict[str, List[ChatMessage]]):
+        for session_id, messages in batches.items():
+            self._pending[session_id] = messages + self._pending.get(session_id, [])
+            self._add_pending(len(messages))
+
+    async def _write(self, batches: Dict[str, List[ChatMessage]]) -> bool:
+        if not batches:
+            return True
+        try:
+            failed = await ChatHistoryService.add_messages_bulk(batches)
+        except (PyMongoError, ValueError) as e:
+            logger.warning(f"Chat history write failed: {e}")
+            failed = list(batches)
+        if failed:
+            self._requeue({session_id: batches[session_id] for session_id in failed})
+            return False
+        return True
+
+    async def _run(self):
+        backoff = 0.0
+        while not self._closed:
+            if backoff:
+                # Size triggers are ignored while the database is unavailable
+                await asyncio.sleep(backoff)
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            if self._closed:
+                break
+            if await self.flush():
+                backoff = 0.0
+            else:
+                backoff = min(max(backoff * 2, 0.5), MAX_RETRY_DELAY)
+
+
+_buffer: Optional[ChatHistoryWriteBuffer] = None
+
+
+def get_chat_history_buffer() -> ChatHistoryWriteBuffer:
+    global _buffer  # pylint: disable=global-statement
+    if _buffer is None:
+        _buffer = ChatHistoryWriteBuffer(cache=get_session_cache())
+    return _buffer
@@ -1,9 +1,13 @@
 from datetime import datetime
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+import asyncio
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, TypeAdapter
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
 from .mongodb_service import MongoDB
+from .session_cache import get_session_cache
 
 
 class PydanticObjectId(ObjectId):
@@ -28,13 +32,17 @@ class ChatMessage(BaseModel):
     role: str
     content: str
     timestamp: datetime = datetime.utcnow()
+    # Position in the session, assigned when the message is stored
+    seq: Optional[int] = None
 
 
 class ChatSession(BaseModel):
     id: Optional[PydanticObjectId] = Field(None, alias="_id")
     user_id: str
     title: str
+    # Legacy sessions embed their messages, new ones use `chat_messages`
     messages: List[ChatMessage] = []
+    message_count: int = 0
     created_at: datetime = datetime.utcnow()
     updated_at: datetime = datetime.utcnow()
 
@@ -43,8 +51,52 @@ class ChatSession(BaseModel):
         json_encoders = {ObjectId: str}  # Convert ObjectId to string in JSON
 
 
+class ChatSessionSummary(BaseModel):
+    """A session without its messages, as listed for a user."""
+
+    id: str = Field(alias="_id")
+    user_id: str
+    title: str = ""
+    message_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        allow_population_by_field_name = True
+
+
+# Whole result sets are validated in one call instead of one model per document
+_messages_adapter = TypeAdapter(List[ChatMessage])
+_summaries_adapter = TypeAdapter(List[ChatSessionSummary])
+
+# Fields returned for messages, `_id` and `session_id` are never needed
+MESSAGE_PROJECTION = {"_id": 0, "session_id": 0}
+SUMMARY_PROJECTION = {
+    "user_id": 1,
+    "title": 1,
+    "message_count": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+# MongoDB duplicate key error
+DUPLICATE_KEY = 11000
+
+
 class ChatHistoryService:
+    """Chat sessions and their messages.
+
+    Sessions live in `chat_sessions`, each message is its own document in
+    `chat_messages` keyed by (session_id, seq), so a session never grows and
+    the last N messages are an indexed range read. `seq` is allocated by
+    incrementing the session's `message_count`. Sessions created before the
+    split keep their embedded `messages`, which are read before the stored
+    ones and numbered -n..-1 when paged. The recent messages of active sessions are also kept in Redis, see
+    session_cache.py.
+    """
+
     collection_name = "chat_sessions"
+    messages_collection_name = "chat_messages"
 
     @staticmethod
     def get_collection():
@@ -52,6 +104,23 @@ class ChatHistoryService:
             raise ValueError("Database connection is not initialized.")
         return MongoDB.db[ChatHistoryService.collection_name]
 
+    @staticmethod
+    def get_messages_collection():
+        if MongoDB.db is None:
+            raise ValueError("Database connection is not initialized.")
+        return MongoDB.db[ChatHistoryService.messages_collection_name]
+
+    @staticmethod
+    async def ensure_indexes():
+        """Create the indexes the queries rely on, safe to call repeatedly."""
+        await ChatHistoryService.get_messages_collection().create_index(
+            [("session_id", ASCENDING), ("seq", ASCENDING)], unique=True
+        )
+        # Serves the per-user session listing, newest activity first
+        await ChatHistoryService.get_collection().create_index(
+            [("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]
+        )
+
     @staticmethod
     async def create_session(user_id: str) -> ChatSession:
         """Create a new chat session and return the session with its MongoDB `_id`."""
@@ -62,30 +131,143 @@ class ChatHistoryService:
             session.dict(by_alias=True, exclude={"id"})
         )
         session.id = result.inserted_id  # Set the MongoDB `_id` to the session
+        cache = get_session_cache()
+        if cache is not None:
+            await cache.prime(
+                session.id, {"user_id": user_id, "title": session.title}, []
+            )
         return session
 
     @staticmethod
-    async def get_session(session_id: str) -> Optional[ChatSession]:
-        """Retrieve a session by its MongoDB `_id`."""
+    async def get_session(session_id: str) -> Optional[ChatSessionSummary]:
+        """Retrieve a session by its MongoDB `_id`, without its messages."""
         collection = ChatHistoryService.get_collection()
-        session_data = await collection.find_one({"_id": ObjectId(session_id)})
+        session_data = await collection.find_one(
+            {"_id": ObjectId(session_id)}, SUMMARY_PROJECTION
+        )
         if session_data:
-            return ChatSession(**session_data)
+            session_data["_id"] = str(session_data["_id"])
+            return ChatSessionSummary.model_validate(session_data)
         return None
 
     @staticmethod
-    async def add_message(session_id: str, role: str, content: str):
-        """Add a message to an existing session."""
+    async def list_sessions(
+        user_id: str,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[ChatSessionSummary]:
+        """List the sessions of a user, most recently updated first. Pass the
+        `updated_at` and `id` of the last session of a page to get the next
+        page, the id orders sessions updated at the same time.
+        """
+        query: dict = {"user_id": user_id}
+        if before is not None and before_id is not None:
+            query["$or"] = [
+                {"updated_at": {"$lt": before}},
+                {"updated_at": before, "_id": {"$lt": ObjectId(before_id)}},
+            ]
+        elif before is not None:
+            query["updated_at"] = {"$lt": before}
+        cursor = (
+            ChatHistoryService.get_collection()
+            .find(query, SUMMARY_PROJECTION)
+            .sort([("updated_at", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit)
+        )
+        sessions = await cursor.to_list(length=limit)
+        for session in sessions:
+            session["_id"] = str(session["_id"])
+        return _summaries_adapter.validate_python(sessions)
+
+    @staticmethod
+    async def _reserve_seq(session_id: str, count: int) -> int:
+        """Allocate `count` consecutive positions, returns the first one."""
         collection = ChatHistoryService.get_collection()
-        message = ChatMessage(role=role, content=content)
-        await collection.update_one(
+        session = await collection.find_one_and_update(
             {"_id": ObjectId(session_id)},
             {
-                "$push": {"messages": message.dict()},
+                "$inc": {"message_count": count},
                 "$set": {"updated_at": datetime.utcnow()},
             },
+            projection={"message_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if session is None:
+            raise ValueError(f"Session {session_id} not found")
+        return session["message_count"] - count
+
+    @staticmethod
+    def _message_document(session_id: str, message: ChatMessage) -> dict:
+        return {"session_id": ObjectId(session_id), **message.dict()}
+
+    @staticmethod
+    async def add_message(session_id: str, role: str, content: str):
+        """Add a message to an existing session."""
+        message = ChatMessage(role=role, content=content, timestamp=datetime.utcnow())
+        message.seq = await ChatHistoryService._reserve_seq(session_id, 1)
+        await ChatHistoryService.get_messages_collection().insert_one(
+            ChatHistoryService._message_document(session_id, message)
+        )
+        cache = get_session_cache()
+        if cache is not None:
+            await cache.append(session_id, [message])
+
+    @staticmethod
+    async def add_messages_bulk(batches: Dict[str, List[ChatMessage]]) -> List[str]:
+        """Store the messages of several sessions with a single `insert_many`.
+
+        Messages without a `seq` get one allocated first and keep it, so a
+        batch can be retried without duplicates: messages stored by an
+        earlier attempt fail on the unique (session_id, seq) index and are
+        treated as written. Returns the ids of the sessions whose messages
+        could not be stored, messages of deleted sessions are discarded.
+        """
+        failed = set()
+        deleted = set()
+
+        async def reserve(session_id: str, messages: List[ChatMessage]):
+            new = [m for m in messages if m.seq is None]
+            if not new:
+                return
+            try:
+                first = await ChatHistoryService._reserve_seq(session_id, len(new))
+            except ValueError:
+                # The session was deleted, retrying would not help
+                deleted.add(session_id)
+                return
+            for offset, message in enumerate(new):
+                message.seq = first + offset
+
+        await asyncio.gather(
+            *(reserve(session_id, messages) for session_id, messages in batches.items())
         )
 
+        owners = []
+        documents = []
+        for session_id, messages in batches.items():
+            if session_id in deleted:
+                continue
+            for message in messages:
+                owners.append(session_id)
+                documents.append(
+                    ChatHistoryService._message_document(session_id, message)
+                )
+        if not documents:
+            return []
+
+        try:
+            await ChatHistoryService.get_messages_collection().insert_many(
+                documents, ordered=False
+            )
+        except BulkWriteError as e:
+            failed.update(
+                owners[err["index"]]
+                for err in e.details["writeErrors"]
+                if err["code"] != DUPLICATE_KEY
+            )
+        return list(failed)
+
     @staticmethod
     async def add_title(session_id: str, title: str):
         """Add a title to session."""
@@ -100,14 +282,108 @@ class ChatHistoryService:
 
     @staticmethod
     async def get_chat_history(session_id: str) -> List[ChatMessage]:
-        """Get the message history for a session."""
-        session = await ChatHistoryService.get_session(session_id)
-        if session:
-            return session.messages
-        return []
+        """Get the full message history for a session."""
+        collection = ChatHistoryService.get_collection()
+        session = await collection.find_one(
+            {"_id": ObjectId(session_id)}, {"_id": 0, "messages": 1}
+        )
+        if session is None:
+            return []
+        cursor = (
+            ChatHistoryService.get_messages_collection()
+            .find({"session_id": ObjectId(session_id)}, MESSAGE_PROJECTION)
+            .sort("seq", ASCENDING)
+        )
+        stored = await cursor.to_list(length=None)
+        return _messages_adapter.validate_python(session.get("messages", []) + stored)
+
+    @staticmethod
+    async def get_recent_messages(session_id: str, limit: int) -> List[ChatMessage]:
+        """Get the last `limit` messages of a session, oldest first.
+
+        Served from the session cache when Redis is configured, a miss loads
+        the cache window from MongoDB and caches it.
+        """
+        cache = get_session_cache()
+        if cache is None:
+            return await ChatHistoryService.get_messages_page(session_id, limit=limit)
+
+        cached = await cache.get_recent(session_id, limit)
+        if cached is not None:
+            return _messages_adapter.validate_python(cached)
+        messages = await ChatHistoryService.get_messages_page(
+            session_id, limit=max(limit, cache.window)
+        )
+        if limit <= cache.window:
+            session = await ChatHistoryService.get_session(session_id)
+            if session is not None:
+                await cache.prime(
+                    session_id,
+                    {"user_id": session.user_id, "title": session.title},
+                    messages,
+                )
+        return messages[-limit:]
+
+    @staticmethod
+    async def get_messages_page(
+        session_id: str, before_seq: Optional[int] = None, limit: int = 50
+    ) -> List[ChatMessage]:
+        """Get up to `limit` messages older than `before_seq` (the newest ones
+        if None), oldest first. Pass the `seq` of the first message of a page
+        to get the previous page. The embedded messages of a legacy session
+        come before the stored ones, with a negative `seq`.
+        """
+        documents = []
+        if before_seq is None or before_seq > 0:
+            query: dict = {"session_id": ObjectId(session_id)}
+            if before_seq is not None:
+                query["seq"] = {"$lt": before_seq}
+            cursor = (
+                ChatHistoryService.get_messages_collection()
+                .find(query, MESSAGE_PROJECTION)
+                .sort("seq", DESCENDING)
+                .limit(limit)
+            )
+            documents = await cursor.to_list(length=limit)
+            documents.reverse()
+        if len(documents) < limit:
+            # The stored messages are exhausted, top up from a legacy session
+            legacy = await ChatHistoryService._legacy_page(
+                session_id, before_seq, limit - len(documents)
+            )
+            documents = legacy + documents
+        return _messages_adapter.validate_python(documents)
+
+    @staticmethod
+    async def _legacy_page(
+        session_id: str, before_seq: Optional[int], limit: int
+    ) -> List[dict]:
+        """Embedded messages of a legacy session as numbered by
+        get_messages_page, the n of them get seq -n..-1"""
+        session = await ChatHistoryService.get_collection().find_one(
+            {"_id": ObjectId(session_id), "messages.0": {"$exists": True}},
+            {"_id": 0, "messages": 1},
+        )
+        if session is None:
+            return []
+        legacy = session["messages"]
+        end = len(legacy)
+        if before_seq is not None and before_seq < 0:
+            end = max(len(legacy) + before_seq, 0)
+        start = max(end - limit, 0)
+        return [
+            {**message, "seq": position - len(legacy)}
+            for position, message in enumerate(legacy[start:end], start)
+        ]
 
     @staticmethod
     async def delete_session(session_id: str):
-        """Delete a session by its MongoDB `_id`."""
+        """Delete a session by its MongoDB `_id`, with its messages."""
         collection = ChatHistoryService.get_collection()
         await collection.delete_one({"_id": ObjectId(session_id)})
+        await ChatHistoryService.get_messages_collection().delete_many(
+            {"session_id": ObjectId(session_id)}
+        )
+        cache = get_session_cache()
+        if cache is not None:
+            await cache.invalidate(session_id)
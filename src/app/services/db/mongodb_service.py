@@ -1,5 +1,106 @@
+"""MongoDB client shared by the application
+
+The client is created once at startup (see `app.main`) and closed on
+shutdown. Pool size, timeouts and read/write concerns come from the
+environment:
+
+    MONGO_MAX_POOL_SIZE                 connections per server (100)
+    MONGO_MIN_POOL_SIZE                 connections kept open when idle (0)
+    MONGO_MAX_IDLE_TIME_MS              close connections idle for longer
+    MONGO_WAIT_QUEUE_TIMEOUT_MS         max wait for a free connection
+    MONGO_CONNECT_TIMEOUT_MS            TCP connect timeout (10000)
+    MONGO_SOCKET_TIMEOUT_MS             per operation socket timeout
+    MONGO_SERVER_SELECTION_TIMEOUT_MS   fail fast if no server is reachable (5000)
+    MONGO_WRITE_CONCERN                 `w` option, e.g. 1 or majority
+    MONGO_READ_CONCERN                  read concern level, e.g. local or majority
+    MONGO_READ_PREFERENCE               e.g. primary or primaryPreferred
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+from pymongo import monitoring  # type: ignore
+
+from app.services import metrics
+
+
+# Environment variable -> MongoClient option, integer valued
+_INT_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": "maxPoolSize",
+    "MONGO_MIN_POOL_SIZE": "minPoolSize",
+    "MONGO_MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+    "MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "MONGO_SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+}
+_STR_OPTIONS = {
+    "MONGO_READ_CONCERN": "readConcernLevel",
+    "MONGO_READ_PREFERENCE": "readPreference",
+}
+
+
+def client_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "maxPoolSize": 100,
+        "serverSelectionTimeoutMS": 5000,
+        "appname": "audio-2-audio",
+    }
+    for env, option in _INT_OPTIONS.items():
+        if os.getenv(env):
+            options[option] = int(os.environ[env])
+    for env, option in _STR_OPTIONS.items():
+        if os.getenv(env):
+            options[option] = os.environ[env]
+    write_concern = os.getenv("MONGO_WRITE_CONCERN")
+    if write_concern:
+        options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+    return options
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Feeds the driver's connection pool events into Prometheus. Called
+    from the driver's threads, the metric updates are thread safe
+    """
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.MONGO_POOL_CLEARED.inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        metrics.MONGO_POOL_CONNECTIONS.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        metrics.MONGO_POOL_CONNECTIONS.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        metrics.MONGO_POOL_CHECKOUT_FAILURES.labels(reason=str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        metrics.MONGO_POOL_CHECKED_OUT.inc()
+        # Time spent waiting for a connection, reported by pymongo >= 4.7
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            metrics.MONGO_POOL_CHECKOUT_WAIT.observe(duration)
+
+    def connection_checked_in(self, event):
+        metrics.MONGO_POOL_CHECKED_OUT.dec()
 
 
 class MongoDB:
@@ -9,9 +110,22 @@ class MongoDB:
     @staticmethod
     def connect(uri: str, database_name: str):
         if MongoDB.client is None:
-            MongoDB.client = AsyncIOMotorClient(uri)
+            MongoDB.client = AsyncIOMotorClient(
+                uri, event_listeners=[PoolMetricsListener()], **client_options()
+            )
             MongoDB.db = MongoDB.client[database_name]
 
+    @staticmethod
+    async def ping(timeout: float = 2.0) -> bool:
+        """True if the server answers, used by the readiness probe"""
+        if MongoDB.client is None:
+            return False
+        try:
+            await asyncio.wait_for(MongoDB.client.admin.command("ping"), timeout)
+            return True
+        except Exception:  # pylint: disable=broad-except
+            return False
+
     @staticmethod
     def disconnect():
         if MongoDB.client:
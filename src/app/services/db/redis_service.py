@@ -0,0 +1,54 @@
+import asyncio
+from typing import Optional
+
+from redis import asyncio as aioredis  # type: ignore
+
+from config import Config
+from fake_providers import fake_providers_enabled
+
+
+class Redis:
+    client: Optional[aioredis.Redis] = None
+
+    @staticmethod
+    def connect():
+        """Creates the client from REDIS_HOST/PORT/PASSWORD. Without a host
+        Redis stays disabled, with FAKE_PROVIDERS=true an in-memory fake is
+        used instead
+        """
+        if Redis.client is not None:
+            return
+        if fake_providers_enabled():
+            from fake_providers.fake_redis import (  # pylint: disable=import-outside-toplevel
+                FakeRedis,
+            )
+
+            Redis.client = FakeRedis()
+        elif Config.REDIS_HOST:
+            Redis.client = aioredis.Redis(
+                host=Config.REDIS_HOST,
+                port=int(Config.REDIS_PORT or 6379),
+                password=Config.REDIS_PASSWORD,
+                decode_responses=True,
+            )
+
+    @staticmethod
+    def use(client):
+        """Uses an existing client, e.g. a FakeRedis in tests"""
+        Redis.client = client
+
+    @staticmethod
+    async def ping(timeout: float = 2.0) -> bool:
+        """True if the server answers, used by the readiness probe"""
+        if Redis.client is None:
+            return False
+        try:
+            return bool(await asyncio.wait_for(Redis.client.ping(), timeout))
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+    @staticmethod
+    async def disconnect():
+        if Redis.client is not None:
+            await Redis.client.aclose()
+            Redis.client = None
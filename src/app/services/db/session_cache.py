@@ -0,0 +1,118 @@
+"""Redis cache of the hot part of active chat sessions
+
+For every active session Redis holds the last SESSION_CACHE_WINDOW messages
+(a list of JSON documents) and the session metadata (a hash), both expiring
+SESSION_CACHE_TTL seconds after the last access. Appends are written through
+to the cache, MongoDB stays the source of truth and is read only to fill the
+cache of a session that is not in it.
+
+A session is cached only if its metadata hash exists. An append to a session
+that is not cached would leave an incomplete window, so it is discarded and
+the next read loads the window from MongoDB. Redis errors are logged and
+treated as cache misses.
+"""
+
+import json
+import os
+from typing import Any, List, Optional
+
+from redis.exceptions import RedisError  # type: ignore
+
+from utils import get_logger
+from .redis_service import Redis
+
+
+logger = get_logger("session_cache")
+
+WINDOW = int(os.getenv("SESSION_CACHE_WINDOW", 20))
+TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL", 1800))
+
+
+class SessionCache:
+    def __init__(self, client, window: int = WINDOW, ttl_seconds: int = TTL_SECONDS):
+        self.client = client
+        self.window = window
+        self.ttl = ttl_seconds
+
+    @staticmethod
+    def _keys(session_id: str) -> tuple[str, str]:
+        return f"chat:{session_id}:meta", f"chat:{session_id}:messages"
+
+    async def prime(self, session_id: str, meta: dict, messages: List[Any]):
+        """caches a session loaded from (or just created in) MongoDB,
+        `messages` are ChatMessage models
+        """
+        meta_key, messages_key = self._keys(str(session_id))
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(messages_key)
+                pipe.hset(meta_key, mapping={k: str(v) for k, v in meta.items()})
+                if messages:
+                    pipe.rpush(
+                        messages_key, *(m.json() for m in messages[-self.window :])
+                    )
+                pipe.expire(meta_key, self.ttl)
+                pipe.expire(messages_key, self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Session cache prime failed: {e}")
+
+    async def append(self, session_id: str, messages: List[Any]):
+        """adds ChatMessage models to the window of a cached session"""
+        meta_key, messages_key = self._keys(str(session_id))
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.exists(meta_key)
+                pipe.rpush(messages_key, *(m.json() for m in messages))
+                pipe.ltrim(messages_key, -self.window, -1)
+                pipe.expire(meta_key, self.ttl)
+                pipe.expire(messages_key, self.ttl)
+                cached, *_ = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Session cache append failed: {e}")
+            cached = False
+        if not cached:
+            await self.invalidate(session_id)
+
+    async def get_recent(self, session_id: str, limit: int) -> Optional[List[dict]]:
+        """last `limit` message documents, None if the session is not cached
+        or the window is too small to answer
+        """
+        if limit > self.window:
+            return None
+        meta_key, messages_key = self._keys(str(session_id))
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.exists(meta_key)
+                pipe.lrange(messages_key, -limit, -1)
+                pipe.expire(meta_key, self.ttl)
+                pipe.expire(messages_key, self.ttl)
+                cached, documents, *_ = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Session cache read failed: {e}")
+            return None
+        if not cached:
+            return None
+        return [json.loads(d) for d in documents]
+
+    async def get_meta(self, session_id: str) -> Optional[dict]:
+        meta_key, _ = self._keys(str(session_id))
+        try:
+            return await self.client.hgetall(meta_key) or None
+        except RedisError as e:
+            logger.warning(f"Session cache read failed: {e}")
+            return None
+
+    async def invalidate(self, session_id: str):
+        try:
+            await self.client.delete(*self._keys(str(session_id)))
+        except RedisError as e:
+            logger.error(f"Session cache invalidation of {session_id} failed: {e}")
+
+
+def get_session_cache() -> Optional[SessionCache]:
+    """the cache if Redis is configured, None otherwise"""
+    Redis.connect()
+    if Redis.client is None:
+        return None
+    return SessionCache(Redis.client)
@@ -0,0 +1,289 @@
+"""Conversation state of the realtime websockets, kept outside the worker
+
+A websocket used to hold its whole conversation (the chatbot history, the
+partial transcript, the VAD state of an utterance in progress) in local
+variables, lost when the socket dropped or the worker restarted. The routers
+now save that state in a session store after every turn and on disconnect,
+and greet every connection with a `session` event carrying a resume token:
+
+    {"type": "session", "session_id": "...", "resume_token": "...", "resumed": false}
+
+A client reconnecting with `?resume=<token>`, to any worker or node sharing
+the store, continues the conversation where it was left without replaying
+the history. An unknown, expired or tampered token starts a new session.
+
+SESSION_STORE selects the backend: `redis` (shared by all nodes, needs
+REDIS_HOST), `memory` (this process only, for development and single
+worker deployments) or `auto`, Redis when configured and memory otherwise.
+With several workers (WEB_CONCURRENCY > 1) the secret must be shared, and
+so must the store unless SESSION_STORE=memory explicitly asks for per worker
+sessions: startup fails instead of falling back to them. The in-process
+FakeRedis of FAKE_PROVIDERS is per worker as well.
+States expire SESSION_STATE_TTL seconds after their last save. Tokens are
+signed with HMAC-SHA256 using SESSION_RESUME_SECRET (AUTH_SECRET_KEY by
+default), which must be the same on all nodes. Concurrent connections to the
+same session are not coordinated, the last save wins.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from redis.exceptions import RedisError  # type: ignore
+
+from app.services import metrics
+from fake_providers import fake_providers_enabled
+from utils import get_logger
+from .redis_service import Redis
+
+
+logger = get_logger("session_store")
+
+SESSION_STORE = os.getenv("SESSION_STORE", "auto").lower()
+SESSION_STATE_TTL = int(os.getenv("SESSION_STATE_TTL", 1800))
+# Tokens outlive a single state TTL, the state expiry is refreshed on every save
+SESSION_RESUME_TOKEN_TTL = int(os.getenv("SESSION_RESUME_TOKEN_TTL", 24 * 60 * 60))
+SESSION_STATE_MAX_MESSAGES = int(os.getenv("SESSION_STATE_MAX_MESSAGES", 100))
+SESSION_STORE_MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX_SESSIONS", 10000))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+
+@dataclass
+class SessionState:
+    session_id: str
+    router: str
+    # Chat history without the system prompt, role/content dicts
+    messages: list[dict] = field(default_factory=list)
+    # Router specific state, e.g. the partial transcript or VAD settings
+    data: dict = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    @classmethod
+    def new(cls, router: str) -> "SessionState":
+        return cls(session_id=uuid.uuid4().hex, router=router)
+
+    def update(self, messages: list[dict], **data):
+        """records the chatbot history (system prompt first) and router state"""
+        self.messages = list(messages[1:])[-SESSION_STATE_MAX_MESSAGES:]
+        self.data.update(data)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, document: str) -> "SessionState":
+        return cls(**json.loads(document))
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class ResumeTokens:
+    """`<payload>.<signature>` tokens naming a session of one router"""
+
+    def __init__(self, secret: bytes, ttl_seconds: int = SESSION_RESUME_TOKEN_TTL):
+        self.secret = secret
+        self.ttl = ttl_seconds
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self.secret, payload.encode("ascii"), hashlib.sha256)
+        return _b64encode(digest.digest())
+
+    def issue(self, session_id: str, router: str) -> str:
+        claims = {"sid": session_id, "r": router, "exp": int(time.time()) + self.ttl}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{payload}.{self._sign(payload)}"
+
+    def read(self, token: str, router: str) -> Optional[str]:
+        """session id of a valid token issued for `router`, None otherwise"""
+        if not token.isascii():
+            return None
+        payload, _, signature = token.partition(".")
+        if not hmac.compare_digest(self._sign(payload), signature):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        if claims.get("r") != router or claims.get("exp", 0) < time.time():
+            return None
+        return claims.get("sid")
+
+
+class SessionStore(ABC):
+    """Base class of the backends, they only store serialized states"""
+
+    def __init__(self, tokens: ResumeTokens, ttl_seconds: int = SESSION_STATE_TTL):
+        self.tokens = tokens
+        self.ttl = ttl_seconds
+
+    @abstractmethod
+    async def _get(self, session_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def _set(self, session_id: str, document: str):
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        pass
+
+    async def load(self, session_id: str) -> Optional[SessionState]:
+        document = await self._get(session_id)
+        return None if document is None else SessionState.from_json(document)
+
+    async def save(self, state: SessionState):
+        state.updated_at = time.time()
+        await self._set(state.session_id, state.to_json())
+
+    async def open(
+        self, router: str, resume_token: Optional[str]
+    ) -> tuple[SessionState, bool]:
+        """the state `resume_token` refers to, or a new session
+
+        Returns:
+            tuple: the state, and True if an existing session was resumed
+        """
+        if not resume_token:
+            metrics.SESSION_RESUMES.labels(router=router, result="new").inc()
+            return SessionState.new(router), False
+        session_id = self.tokens.read(resume_token, router)
+        state = None if session_id is None else await self.load(session_id)
+        if state is None:
+            result = "invalid" if session_id is None else "expired"
+            logger.info(f"Resume token of {router} is {result}, new session")
+            metrics.SESSION_RESUMES.labels(router=router, result=result).inc()
+            return SessionState.new(router), False
+        metrics.SESSION_RESUMES.labels(router=router, result="resumed").inc()
+        return state, True
+
+    def greeting(self, state: SessionState, resumed: bool) -> dict:
+        """the `session` event sent to the client when it connects"""
+        return {
+            "type": "session",
+            "session_id": state.session_id,
+            "resume_token": self.tokens.issue(state.session_id, state.router),
+            "resumed": resumed,
+        }
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(
+        self,
+        tokens: ResumeTokens,
+        ttl_seconds: int = SESSION_STATE_TTL,
+        max_sessions: int = SESSION_STORE_MAX_SESSIONS,
+    ):
+        super().__init__(tokens, ttl_seconds)
+        self.max_sessions = max_sessions
+        self._states: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def _get(self, session_id: str) -> Optional[str]:
+        entry = self._states.get(session_id)
+        if entry is None:
+            return None
+        expires_at, document = entry
+        if expires_at <= time.monotonic():
+            del self._states[session_id]
+            return None
+        return document
+
+    async def _set(self, session_id: str, document: str):
+        self._states[session_id] = (time.monotonic() + self.ttl, document)
+        self._states.move_to_end(session_id)
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+
+    async def delete(self, session_id: str):
+        self._states.pop(session_id, None)
+
+
+class RedisSessionStore(SessionStore):
+    """States as JSON strings, errors are logged and the session is lost,
+    as if it had expired"""
+
+    def __init__(self, client, tokens: ResumeTokens, ttl_seconds=SESSION_STATE_TTL):
+        super().__init__(tokens, ttl_seconds)
+        self.client = client
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}:state"
+
+    async def _get(self, session_id: str) -> Optional[str]:
+        try:
+            return await self.client.get(self._key(session_id))
+        except RedisError as e:
+            logger.warning(f"Session store read failed: {e}")
+            return None
+
+    async def _set(self, session_id: str, document: str):
+        try:
+            await self.client.set(self._key(session_id), document, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"Session store write failed: {e}")
+
+    async def delete(self, session_id: str):
+        try:
+            await self.client.delete(self._key(session_id))
+        except RedisError as e:
+            logger.error(f"Session store delete of {session_id} failed: {e}")
+
+
+def _resume_secret() -> bytes:
+    secret = os.getenv("SESSION_RESUME_SECRET") or os.getenv("AUTH_SECRET_KEY")
+    if not secret:
+        if WEB_CONCURRENCY > 1:
+            raise RuntimeError(
+                "SESSION_RESUME_SECRET or AUTH_SECRET_KEY is needed with "
+                f"WEB_CONCURRENCY={WEB_CONCURRENCY}"
+            )
+        logger.warning(
+            "No SESSION_RESUME_SECRET, resume tokens are only valid on this worker"
+        )
+        return secrets.token_bytes(32)
+    return secret.encode("utf-8")
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """returns the process wide store selected by SESSION_STORE"""
+    global _store  # pylint: disable=global-statement
+
+    if _store is None:
+        tokens = ResumeTokens(_resume_secret())
+        if SESSION_STORE in ("redis", "auto"):
+            Redis.connect()
+        if SESSION_STORE == "redis" and Redis.client is None:
+            raise RuntimeError("SESSION_STORE=redis needs REDIS_HOST")
+        shared = Redis.client is not None and not fake_providers_enabled()
+        if SESSION_STORE != "memory" and not shared and WEB_CONCURRENCY > 1:
+            raise RuntimeError(
+                f"SESSION_STORE={SESSION_STORE} keeps sessions per worker with "
+                f"WEB_CONCURRENCY={WEB_CONCURRENCY}, set REDIS_HOST, or "
+                "SESSION_STORE=memory to accept it"
+            )
+        if SESSION_STORE != "memory" and Redis.client is not None:
+            _store = RedisSessionStore(Redis.client, tokens)
+        else:
+            if SESSION_STORE == "auto" or WEB_CONCURRENCY > 1:
+                logger.warning("Redis is not configured, sessions are per worker")
+            _store = InMemorySessionStore(tokens)
+    return _store
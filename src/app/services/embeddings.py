@@ -0,0 +1,47 @@
+"""Text embedding helpers shared by the caching and retrieval services
+"""
+
+import os
+
+import numpy as np  # type: ignore
+from dotenv import load_dotenv
+from openai import OpenAI
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """scales each row to unit length so a dot product is a cosine similarity
+
+    Args:
+        vectors(np.ndarray): array of shape (N, D)
+
+    Returns:
+        np.ndarray: float32 array of shape (N, D)
+
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str | None = None, api_key: str = ""):
+        load_dotenv()
+
+        if api_key == "":
+            api_key = os.getenv("OPENAI_API_KEY")
+        if model is None:
+            model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+        self.model = model
+        self.client = OpenAI(api_key=api_key)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """embeds a list of texts in a single api call
+
+        Returns:
+            np.ndarray: unit-normalized float32 array of shape (len(texts), D)
+        """
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        vectors = [item.embedding for item in response.data]
+        return normalize_vectors(np.asarray(vectors, dtype=np.float32))
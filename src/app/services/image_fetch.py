@@ -0,0 +1,175 @@
+"""Async bulk fetching of images as resized base64 PNGs
+
+Fetches run concurrently, at most IMAGE_FETCH_CONCURRENCY at a time, over
+the shared pooled client of `async_http`. Results are cached per URL and
+size in an LRU of IMAGE_CACHE_MAX_ENTRIES. Entries are used as is for
+IMAGE_CACHE_FRESH_SECONDS (or the response's max-age), then revalidated
+with If-None-Match / If-Modified-Since, a 304 reuses the cached result.
+
+The resized images themselves are stored by a hash of the downloaded bytes,
+so mirrors of the same image and changed URLs with unchanged content are
+only resized and encoded once.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from io import BytesIO
+
+from async_http import get_http
+from utils import get_logger, image_to_base64
+
+from app.services import metrics
+from app.services.single_flight import SingleFlight
+
+logger = get_logger("image_fetch")
+
+IMAGE_FETCH_CONCURRENCY = int(os.getenv("IMAGE_FETCH_CONCURRENCY", 16))
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", 1024))
+IMAGE_CACHE_FRESH_SECONDS = float(os.getenv("IMAGE_CACHE_FRESH_SECONDS", 300))
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+@dataclass
+class _Entry:
+    content_key: tuple[str, tuple[int, int]]
+    etag: str | None
+    last_modified: str | None
+    fresh_until: float
+
+
+def _fresh_until(headers) -> float:
+    cache_control = headers.get("Cache-Control", "")
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0.0
+    match = MAX_AGE.search(cache_control)
+    fresh_seconds = int(match.group(1)) if match else IMAGE_CACHE_FRESH_SECONDS
+    return time.monotonic() + fresh_seconds
+
+
+class ImageFetcher:
+    def __init__(
+        self,
+        concurrency: int = IMAGE_FETCH_CONCURRENCY,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+        timeout: timedelta = timedelta(seconds=10),
+    ):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._entries: OrderedDict[tuple[str, tuple[int, int]], _Entry] = OrderedDict()
+        # content key -> [base64 image, number of entries referring to it]
+        self._contents: dict[tuple[str, tuple[int, int]], list] = {}
+        self._inflight: SingleFlight[str] = SingleFlight()
+
+    async def fetch(self, url: str, image_size: tuple[int, int]) -> str | None:
+        """the image at `url` resized to [IMAGE_WIDTH, IMAGE_HEIGHT] as a
+        base64 PNG, None if it could not be fetched or decoded
+        """
+        key = (url, tuple(image_size))
+        entry = self._entries.get(key)
+        if entry is not None and entry.fresh_until > time.monotonic():
+            self._entries.move_to_end(key)
+            metrics.IMAGE_CACHE_REQUESTS.labels(result="hit").inc()
+            return self._contents[entry.content_key][0]
+
+        try:
+            return await self._inflight.do(f"{url} {key[1]}", lambda: self._load(key))
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.error(f"Error while fetching {url}: {ex}")
+            return None
+
+    async def fetch_many(
+        self, urls: list[str], image_size: tuple[int, int]
+    ) -> list[str | None]:
+        """fetches all urls concurrently, results are in the order of `urls`"""
+        return await asyncio.gather(*(self.fetch(url, image_size) for url in urls))
+
+    async def _load(self, key: tuple[str, tuple[int, int]]) -> str:
+        url, image_size = key
+        entry = self._entries.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        async with self._slots:
+            response = await get_http().request(
+                "GET",
+                url,
+                max_retry=1,
+                wait=0.5,
+                timeout=self.timeout,
+                headers=headers,
+                accept=(304,),
+            )
+
+        if response.status_code == 304:
+            entry = self._entries.get(key)
+            if entry is None:
+                if not headers:
+                    raise RuntimeError("304 response to an unconditional request")
+                # Evicted while the request was in flight, fetch it again
+                return await self._load(key)
+            entry.fresh_until = _fresh_until(response.headers)
+            self._entries.move_to_end(key)
+            metrics.IMAGE_CACHE_REQUESTS.labels(result="revalidated").inc()
+            return self._contents[entry.content_key][0]
+        metrics.IMAGE_CACHE_REQUESTS.labels(result="miss").inc()
+
+        content = response.content
+        content_key = (hashlib.sha256(content).hexdigest(), image_size)
+        stored = self._contents.get(content_key)
+        if stored is None:
+            # PIL work is CPU bound, keep it off the event loop
+            image = await asyncio.to_thread(
+                image_to_base64, BytesIO(content), image_size
+            )
+            stored = self._contents.setdefault(content_key, [image, 0])
+        self._put(
+            key,
+            _Entry(
+                content_key=content_key,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                fresh_until=_fresh_until(response.headers),
+            ),
+        )
+        return stored[0]
+
+    def _release(self, entry: _Entry):
+        stored = self._contents[entry.content_key]
+        stored[1] -= 1
+        if stored[1] <= 0:
+            del self._contents[entry.content_key]
+
+    def _put(self, key: tuple[str, tuple[int, int]], entry: _Entry):
+        self._contents[entry.content_key][1] += 1
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._release(previous)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._release(evicted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_fetcher: ImageFetcher | None = None
+
+
+def get_image_fetcher() -> ImageFetcher:
+    global _fetcher  # pylint: disable=global-statement
+    if _fetcher is None:
+        _fetcher = ImageFetcher()
+    return _fetcher
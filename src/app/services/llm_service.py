@@ -3,6 +3,8 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import logging
 
+from app.services.retrieval import ResourceRetriever, get_retriever
+
 
 class BaseChatbot:
     def __init__(self, logger=None):
@@ -47,8 +49,34 @@ class Chatbot_gpt(BaseChatbot):
         self.messages = [{"role": "system", "content": sys_prompt}]
         self.max_tokens = max_tokens
 
-    def run(self, input_text, client):
+    def retrieve_context(self, input_text) -> str:
+        """Resources relevant to the user turn as a system message, empty when
+        retrieval is disabled or fails. Blocking, call it from an executor."""
+        # Resolved here rather than per connection, opening the index (or
+        # retrying a missing one) must not run on the event loop
+        retriever = get_retriever()
+        if retriever is None:
+            return ""
+        try:
+            return ResourceRetriever.format_context(retriever.retrieve(input_text))
+        except Exception as ex:  # pylint: disable=broad-except
+            if self.logger != None:
+                self.logger.error(f"Retrieval failed: {ex}")
+            return ""
+
+    def run(self, input_text, client, context=None):
+        """Streams the response, `context` is the output of retrieve_context,
+        retrieved here when not given. It is sent with this turn only and
+        not kept in the history."""
+        if context is None:
+            context = self.retrieve_context(input_text)
         self.messages.append({"role": "user", "content": input_text})
+        messages = self.messages
+        if context:
+            messages = self.messages[:-1] + [
+                {"role": "system", "content": context},
+                self.messages[-1],
+            ]
         finished = False
         response = ""
 
@@ -56,14 +84,14 @@ class Chatbot_gpt(BaseChatbot):
             if client == 0:
                 stream = self.client.chat.completions.create(
                     model=self.MODEL,
-                    messages=self.messages,
+                    messages=messages,
                     stream=True,
                     max_tokens=self.max_tokens,
                 )
             else:
                 stream = self.client2.chat.completions.create(
                     model="gpt-4o-mini-2024-07-18",
-                    messages=self.messages,
+                    messages=messages,
                     stream=True,
                     max_tokens=self.max_tokens,
                 )
@@ -83,6 +111,15 @@ class Chatbot_gpt(BaseChatbot):
 
         self.messages.append({"role": "assistant", "content": response})
 
+    def append_turn(self, input_text, response):
+        """Records a turn answered without calling the LLM (e.g. from a cache)."""
+        self.messages.append({"role": "user", "content": input_text})
+        self.messages.append({"role": "assistant", "content": response})
+
+    def load_history(self, messages):
+        """Continues an earlier conversation, `messages` are role/content dicts."""
+        self.messages = self.messages[:1] + list(messages)
+
     def generate_title(self) -> str:
         title = ""
         messages = [
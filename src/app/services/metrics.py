@@ -0,0 +1,163 @@
+"""Prometheus metrics for the voice pipeline
+
+Metric updates are in-process counter increments and histogram observations;
+gauges that need to look at other objects (executor queues) are computed
+lazily with `set_function`, only when `/metrics` is scraped.
+
+Under gunicorn every worker writes its metrics to PROMETHEUS_MULTIPROC_DIR
+and `/metrics` aggregates them (see gunicorn.conf.py). Gauges say how their
+per-worker values combine with `multiprocess_mode`. Function gauges are not
+supported in that mode and are left out.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram  # type: ignore
+
+# Latency buckets in seconds, tuned for conversational turn latencies
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 21)
+
+ACTIVE_SOCKETS = Gauge(
+    "voice_active_websockets",
+    "Currently open websocket connections",
+    ["router"],
+    multiprocess_mode="livesum",
+)
+TURNS = Counter("voice_turns_total", "Conversational turns started", ["router"])
+TURN_ERRORS = Counter(
+    "voice_turn_errors_total", "Conversational turns that failed", ["router"]
+)
+TIME_TO_FIRST_AUDIO = Histogram(
+    "voice_time_to_first_audio_seconds",
+    "Time from the end of the user turn to the first audio event sent",
+    ["router"],
+    buckets=LATENCY_BUCKETS,
+)
+TURN_LATENCY = Histogram(
+    "voice_turn_latency_seconds",
+    "Time from the end of the user turn to the last event of the response",
+    ["router"],
+    buckets=LATENCY_BUCKETS,
+)
+TTS_CALLS = Counter("voice_tts_calls_total", "Text-to-speech calls", ["provider"])
+TTS_LATENCY = Histogram(
+    "voice_tts_seconds",
+    "Text-to-speech call latency",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+STT_CALLS = Counter("voice_stt_calls_total", "Speech-to-text calls", ["provider"])
+STT_LATENCY = Histogram(
+    "voice_stt_seconds",
+    "Speech-to-text call latency",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "semantic_cache_requests_total", "Semantic cache lookups", ["result"]
+)
+CHAT_HISTORY_PENDING = Gauge(
+    "chat_history_pending_messages",
+    "Chat messages waiting to be written",
+    multiprocess_mode="livesum",
+)
+CHAT_HISTORY_DROPPED = Counter(
+    "chat_history_dropped_messages_total",
+    "Chat messages dropped because the write buffer was full",
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections",
+    "Open connections in the MongoDB pool",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_checked_out_connections",
+    "MongoDB connections currently in use",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a MongoDB connection",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "MongoDB connection checkouts that failed",
+    ["reason"],
+)
+MONGO_POOL_CLEARED = Counter(
+    "mongo_pool_cleared_total", "MongoDB pool resets after server errors"
+)
+AUTH_CACHE_REQUESTS = Counter(
+    "auth_cache_requests_total", "Token verification cache lookups", ["result"]
+)
+IMAGE_CACHE_REQUESTS = Counter(
+    "image_cache_requests_total",
+    "Image fetches by cache result (hit, revalidated, miss)",
+    ["result"],
+)
+SESSION_RESUMES = Counter(
+    "session_resumes_total",
+    "Websocket session starts by result (new, resumed, expired, invalid)",
+    ["router", "result"],
+)
+WARMUP_STEP_SECONDS = Gauge(
+    "warmup_step_seconds",
+    "Duration of the startup warm-up steps",
+    ["step"],
+    multiprocess_mode="livemax",
+)
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "executor_queue_depth", "Work items waiting for an executor thread", ["executor"]
+)
+
+
+def track_executor(name: str, executor: ThreadPoolExecutor):
+    """exposes the pending work queue of a thread pool as a gauge, not in
+    multiprocess mode where it would always read 0"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        return
+    queue = executor._work_queue  # pylint: disable=protected-access
+    EXECUTOR_QUEUE_DEPTH.labels(executor=name).set_function(queue.qsize)
+
+
+@contextmanager
+def observe_tts(provider: str):
+    TTS_CALLS.labels(provider=provider).inc()
+    with TTS_LATENCY.labels(provider=provider).time():
+        yield
+
+
+@contextmanager
+def observe_stt(provider: str):
+    STT_CALLS.labels(provider=provider).inc()
+    with STT_LATENCY.labels(provider=provider).time():
+        yield
+
+
+class TurnTimer:
+    """Measures time to first audio and end-to-end latency of one turn"""
+
+    def __init__(self, router: str, start: float | None = None):
+        self.router = router
+        self.start = start if start is not None else time.perf_counter()
+        self._first_audio = False
+        TURNS.labels(router=router).inc()
+
+    def audio_sent(self):
+        if self._first_audio:
+            return
+        self._first_audio = True
+        TIME_TO_FIRST_AUDIO.labels(router=self.router).observe(
+            time.perf_counter() - self.start
+        )
+
+    def finish(self, error: bool = False):
+        if error:
+            TURN_ERRORS.labels(router=self.router).inc()
+        TURN_LATENCY.labels(router=self.router).observe(
+            time.perf_counter() - self.start
+        )
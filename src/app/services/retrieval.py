@@ -0,0 +1,134 @@
+"""Retrieval of coaching resources for the chatbot
+
+The user turn is embedded and the CLOSEST_TOP_K nearest snippets of the
+resources index (built by scripts/build_resource_index.py) are given to the
+LLM as a short system message for that turn only, so it can ground its
+answer in them instead of generating resources from scratch.
+
+Query embeddings are cached by normalized text, and embedding several
+queries costs one API call for all the uncached ones.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np  # type: ignore
+
+from app.services.embeddings import OpenAIEmbedder
+from app.services.semantic_cache import normalize_utterance
+from app.services.vector_index import SearchHit, VectorIndex, index_path, open_index
+from config import Config
+from utils import get_logger
+
+
+logger = get_logger("retrieval")
+
+RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX", "resources")
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", 0.35))
+# Snippets are cut to this many characters, the LLM only needs the gist
+RETRIEVAL_SNIPPET_CHARS = int(os.getenv("RETRIEVAL_SNIPPET_CHARS", 280))
+RETRIEVAL_EMBEDDING_CACHE_SIZE = int(os.getenv("RETRIEVAL_EMBEDDING_CACHE_SIZE", 1024))
+# A missing or unreadable index is opened again at most this often
+RETRIEVAL_RETRY_SECONDS = float(os.getenv("RETRIEVAL_RETRY_SECONDS", 60))
+
+
+class ResourceRetriever:
+    def __init__(
+        self,
+        index: VectorIndex,
+        embedder,
+        top_k: int,
+        min_score: float = RETRIEVAL_MIN_SCORE,
+        cache_size: int = RETRIEVAL_EMBEDDING_CACHE_SIZE,
+    ):
+        self.index = index
+        self.embedder = embedder
+        self.top_k = top_k
+        self.min_score = min_score
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def embed_queries(self, texts: list[str]) -> np.ndarray:
+        """embeddings of `texts`, uncached ones are embedded in one batch"""
+        normalized = [normalize_utterance(t) for t in texts]
+        with self._lock:
+            cached = {t: self._embeddings.get(t) for t in normalized}
+        missing = list(dict.fromkeys(t for t, v in cached.items() if v is None))
+        if missing:
+            for text, vector in zip(missing, self.embedder.embed(missing)):
+                cached[text] = vector
+            with self._lock:
+                for text in missing:
+                    self._embeddings[text] = cached[text]
+                while len(self._embeddings) > self.cache_size:
+                    self._embeddings.popitem(last=False)
+        return np.stack([cached[t] for t in normalized])
+
+    def retrieve(self, text: str) -> list[SearchHit]:
+        if not normalize_utterance(text):
+            return []
+        query = self.embed_queries([text])[0]
+        return self.index.search(query, self.top_k, min_score=self.min_score)
+
+    @staticmethod
+    def format_context(hits: list[SearchHit]) -> str:
+        """compact system message listing the snippets, empty without hits"""
+        if not hits:
+            return ""
+        lines = [
+            "Resources that may help with this message, "
+            "use them only if relevant and keep the answer short:"
+        ]
+        for hit in hits:
+            text = " ".join(hit.payload.get("text", "").split())
+            if len(text) > RETRIEVAL_SNIPPET_CHARS:
+                text = text[:RETRIEVAL_SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+            title = hit.payload.get("title")
+            lines.append(f"- {title}: {text}" if title else f"- {text}")
+        return "\n".join(lines)
+
+
+_retriever: ResourceRetriever | None = None
+_retriever_retry_at = 0.0
+_retriever_lock = threading.Lock()
+
+
+def _load_retriever() -> ResourceRetriever | None:
+    directory = index_path(RETRIEVAL_INDEX)
+    try:
+        index = open_index(directory)
+    except (OSError, ValueError) as ex:
+        # e.g. read while VectorIndex.build swaps the directory in
+        logger.error(f"Opening the index at {directory} failed: {ex}")
+        return None
+    if index is None:
+        logger.warning(f"No index at {directory}, retrieval is disabled")
+        return None
+    embedder = OpenAIEmbedder()
+    if index.meta.get("model", embedder.model) != embedder.model:
+        logger.warning(
+            f"Index {directory} was built with {index.meta['model']}, "
+            f"queries are embedded with {embedder.model}"
+        )
+    logger.info(f"Retrieving from {len(index)} resources at {directory}")
+    return ResourceRetriever(index, embedder, Config.CLOSEST_TOP_K)
+
+
+def get_retriever() -> ResourceRetriever | None:
+    """returns the process wide retriever, or None unless CLOSEST_TOP_K is
+    set and the resources index has been built. A missing or unreadable
+    index is looked for again after RETRIEVAL_RETRY_SECONDS.
+    """
+    global _retriever, _retriever_retry_at  # pylint: disable=global-statement
+
+    if Config.CLOSEST_TOP_K <= 0:
+        return None
+    with _retriever_lock:
+        if _retriever is None and time.monotonic() >= _retriever_retry_at:
+            _retriever = _load_retriever()
+            if _retriever is None:
+                _retriever_retry_at = time.monotonic() + RETRIEVAL_RETRY_SECONDS
+    return _retriever
@@ -0,0 +1,242 @@
+"""Opt-in semantic cache of assistant responses
+
+Recurring coaching questions ("what should I focus on today?") are answered
+from memory instead of going through the LLM and TTS again. A user turn is
+normalized and embedded, then compared against the cached turns with a cosine
+similarity threshold. Entries expire after a TTL and the cache is bounded in
+size, evicting the oldest entries first.
+"""
+
+import os
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np  # type: ignore
+
+from app.services.embeddings import OpenAIEmbedder
+from app.services.metrics import CACHE_REQUESTS
+from utils import get_logger
+
+
+logger = get_logger("semantic_cache")
+
+# Words that usually point back to earlier turns. A question containing them
+# can only be answered from the cache when it is the first turn of a session.
+CONTEXT_WORDS = {
+    "it",
+    "its",
+    "that",
+    "this",
+    "these",
+    "those",
+    "they",
+    "them",
+    "he",
+    "she",
+    "him",
+    "her",
+    "again",
+    "more",
+    "else",
+    "above",
+    "before",
+    "previous",
+    "last",
+}
+
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def normalize_utterance(text: str) -> str:
+    """lower cases, strips punctuation and collapses whitespace of a user turn"""
+    text = text.lower().translate(_PUNCTUATION)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def is_context_independent(text: str) -> bool:
+    """returns True if the normalized turn does not refer back to earlier turns"""
+    return not any(word in CONTEXT_WORDS for word in text.split(" "))
+
+
+@dataclass
+class CachedSentence:
+    text: str
+    audio: str | None
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    sentences: list[CachedSentence] = field(default_factory=list)
+
+
+@dataclass
+class _CacheEntry:
+    normalized: str
+    namespace: str
+    vector: np.ndarray
+    response: CachedResponse
+    expires_at: float
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        embedder,
+        threshold: float = 0.93,
+        ttl_seconds: float = 24 * 60 * 60,
+        max_entries: int = 1024,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], _CacheEntry] = OrderedDict()
+        self._matrix: np.ndarray | None = None
+        self._matrix_keys: list[tuple[str, str]] = []
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def is_cacheable(self, text: str, first_turn: bool) -> bool:
+        """a turn may be served from (and stored in) the cache only if its
+        answer does not depend on the conversation so far
+        """
+        normalized = normalize_utterance(text)
+        if not normalized:
+            return False
+        return first_turn or is_context_independent(normalized)
+
+    def lookup(self, text: str, namespace: str = "") -> CachedResponse | None:
+        """finds a cached response for a near-duplicate turn
+
+        Args:
+            text(str): the raw user turn
+            namespace(str): separates responses rendered with different
+                models or voices
+
+        Returns:
+            CachedResponse: the cached response or None on a miss. A failed
+                embedding is logged and counted as a miss, the cache is
+                optional and must not fail the turn
+
+        """
+        normalized = normalize_utterance(text)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get((namespace, normalized))
+            if entry is not None:
+                self.hits += 1
+                CACHE_REQUESTS.labels(result="hit").inc()
+                return entry.response
+
+        try:
+            vector = self._embed(normalized)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.error(f"Semantic cache lookup failed: {ex}")
+            self.misses += 1
+            CACHE_REQUESTS.labels(result="miss").inc()
+            return None
+
+        with self._lock:
+            best_key, best_score = self._nearest(vector, namespace)
+            if best_key is not None and best_score >= self.threshold:
+                self.hits += 1
+                CACHE_REQUESTS.labels(result="hit").inc()
+                logger.info(f"Semantic cache hit ({best_score:.3f}) for '{text}'")
+                return self._entries[best_key].response
+
+            self.misses += 1
+            CACHE_REQUESTS.labels(result="miss").inc()
+            return None
+
+    def store(self, text: str, response: CachedResponse, namespace: str = ""):
+        """adds a response to the cache, evicting the oldest entry when full.
+        A failed embedding is logged and the response is not cached"""
+        normalized = normalize_utterance(text)
+        try:
+            vector = self._embed(normalized)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.error(f"Semantic cache store failed: {ex}")
+            return
+        key = (namespace, normalized)
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = _CacheEntry(
+                normalized=normalized,
+                namespace=namespace,
+                vector=vector,
+                response=response,
+                expires_at=time.monotonic() + self.ttl_seconds,
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        with self._lock:
+            vector = self._embeddings.get(normalized)
+        if vector is not None:
+            return vector
+
+        vector = self.embedder.embed([normalized])[0]
+        with self._lock:
+            self._embeddings[normalized] = vector
+            while len(self._embeddings) > self.max_entries:
+                self._embeddings.popitem(last=False)
+        return vector
+
+    def _evict_expired(self, now: float):
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _nearest(self, vector: np.ndarray, namespace: str):
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            if self._matrix_keys:
+                self._matrix = np.stack([e.vector for e in self._entries.values()])
+            else:
+                self._matrix = np.zeros((0, vector.shape[0]), dtype=np.float32)
+
+        if len(self._matrix_keys) == 0:
+            return None, 0.0
+
+        scores = self._matrix @ vector
+        for idx in np.argsort(-scores):
+            key = self._matrix_keys[idx]
+            if key[0] == namespace:
+                return key, float(scores[idx])
+        return None, 0.0
+
+
+_semantic_cache: SemanticResponseCache | None = None
+
+
+def get_semantic_cache() -> SemanticResponseCache | None:
+    """returns the process wide cache, or None unless SEMANTIC_CACHE_ENABLED is set"""
+    global _semantic_cache  # pylint: disable=global-statement
+
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() not in ("1", "true"):
+        return None
+
+    if _semantic_cache is None:
+        _semantic_cache = SemanticResponseCache(
+            OpenAIEmbedder(),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.93)),
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 24 * 60 * 60)),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1024)),
+        )
+    return _semantic_cache
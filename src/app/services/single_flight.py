@@ -0,0 +1,27 @@
+"""Request coalescing for asyncio code, used by the auth providers and the
+image fetcher
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Runs one call per key at a time, concurrent callers with the same key
+    share its result (or exception)
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled caller must not cancel the call the others wait on
+        return await asyncio.shield(call)
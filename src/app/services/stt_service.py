@@ -0,0 +1,23 @@
+"""Speech-to-text provider selection
+
+FAKE_PROVIDERS=true replaces the Google speech recognition call with the
+local stand-in for offline benchmarks.
+"""
+
+from fake_providers import fake_providers_enabled
+from fake_providers import stubs
+
+
+def recognize_google(recognizer, audio_data, language="en-US", show_all=False):
+    """transcribes `audio_data` with Google speech recognition
+
+    Args:
+        recognizer(speech_recognition.Recognizer):
+        audio_data(speech_recognition.AudioData):
+
+    Returns:
+        str: the transcript
+    """
+    if fake_providers_enabled():
+        return stubs.recognize_google(audio_data, language=language, show_all=show_all)
+    return recognizer.recognize_google(audio_data, language=language, show_all=show_all)
@@ -0,0 +1,124 @@
+"""Helpers for streaming assistant text to websocket clients
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+
+SENTENCE_ENDINGS = (".", "!", "?")
+CLAUSE_ENDINGS = SENTENCE_ENDINGS + (",", ";", ":")
+
+# Segmenter used when the client does not pick one, see SentenceSegmenter
+DEFAULT_SEGMENTER = os.getenv("TTS_SEGMENTER", "punctuation")
+
+
+class TextDeltaCoalescer:
+    """Forwards LLM tokens to the client as `assistant_text_delta` events.
+
+    Tokens are coalesced into windows of `window_ms` so a fast token stream
+    does not turn into one websocket frame per token. The deltas are sent
+    independently of the audio events, the client can render text as soon as
+    the first token arrives instead of waiting for the sentence to be spoken.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict[str, Any]], Awaitable[None]],
+        window_ms: float = 50,
+    ):
+        self.send = send
+        self.window = window_ms / 1000
+        self._buffer: list[str] = []
+        self._last_flush = 0.0
+        self._pending: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def push(self, delta: str):
+        if not delta:
+            return
+        self._buffer.append(delta)
+
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.window:
+            await self.flush()
+        elif self._pending is None:
+            self._pending = asyncio.create_task(
+                self._flush_later(self.window - elapsed)
+            )
+
+    async def flush(self):
+        """sends whatever is buffered. call before blocking work such as TTS
+        and once the response is complete
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+        async with self._lock:
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer = []
+            self._last_flush = time.monotonic()
+            await self.send({"type": "assistant_text_delta", "text": text})
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._pending = None
+        await self.flush()
+
+
+class SentenceSegmenter:
+    """Groups LLM tokens into the text units sent to TTS.
+
+    Policies:
+    - punctuation: a unit ends with `.`, `!` or `?`
+    - clause: a unit also ends with `,`, `;` or `:`, the first audio starts
+      earlier at the cost of more TTS calls
+
+    A boundary is ignored until the pending text is at least `min_chars`
+    long, so short fragments are merged into the next unit. Segmenters are
+    configured as `<policy>[:<min_chars>]`, e.g. `clause:40`.
+    """
+
+    POLICIES = {"punctuation": SENTENCE_ENDINGS, "clause": CLAUSE_ENDINGS}
+
+    def __init__(self, policy: str = "punctuation", min_chars: int = 0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown segmenter policy `{policy}`")
+        self.policy = policy
+        self.min_chars = min_chars
+        self._endings = self.POLICIES[policy]
+        self._buffer: list[str] = []
+        self._length = 0
+
+    @classmethod
+    def from_spec(cls, spec: str | None = None) -> "SentenceSegmenter":
+        policy, _, min_chars = (spec or DEFAULT_SEGMENTER).partition(":")
+        return cls(policy or "punctuation", int(min_chars or 0))
+
+    @property
+    def spec(self) -> str:
+        return f"{self.policy}:{self.min_chars}"
+
+    def push(self, token: str) -> str | None:
+        """adds a token, returns the completed unit if `token` ends one"""
+        self._buffer.append(token)
+        self._length += len(token)
+        if self._length < self.min_chars or not token.rstrip().endswith(self._endings):
+            return None
+        return self._take()
+
+    def flush(self) -> str | None:
+        """returns the trailing text that did not end on a boundary"""
+        if not self._buffer:
+            return None
+        return self._take()
+
+    def _take(self) -> str:
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._length = 0
+        return text
@@ -0,0 +1,266 @@
+"""Lightweight per-turn latency tracing for the voice pipeline
+
+A `SessionTracer` lives for one websocket connection and hands out a
+`TurnTrace` per conversational turn. Spans are plain timestamps collected in
+memory; nothing leaves the process until the turn is finished, then the whole
+turn is handed to the configured exporter on a background thread.
+
+Exporters are selected with TRACE_EXPORTER:
+- none (default): spans are dropped
+- json: one JSON line per turn, appended to TRACE_JSON_PATH or logged
+- otlp: OTLP/HTTP JSON posted to OTLP_ENDPOINT (a local collector)
+"""
+
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import httpx
+
+from utils import get_logger
+
+
+logger = get_logger("tracing")
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "audio-2-audio")
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    start_ns: int
+    end_ns: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class TurnTrace:
+    def __init__(
+        self,
+        session_id: str,
+        turn_id: int,
+        exporter=None,
+        start_ns: int | None = None,
+    ):
+        self.session_id = session_id
+        self.turn_id = turn_id
+        self.trace_id = secrets.token_hex(16)
+        self.root_span_id = secrets.token_hex(8)
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: int | None = None
+        self.spans: list[Span] = []
+        self.attributes: dict[str, Any] = {}
+        self.exporter = exporter
+        self._marks: set[str] = set()
+
+    def add_span(self, name: str, start_ns: int, end_ns: int | None = None, **attrs):
+        """records a span from explicit wall clock timestamps (time.time_ns)"""
+        if end_ns is None:
+            end_ns = time.time_ns()
+        span = Span(
+            name=name,
+            span_id=secrets.token_hex(8),
+            start_ns=start_ns,
+            end_ns=end_ns,
+            attributes=attrs,
+        )
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """times the enclosed block, works across awaits"""
+        start_ns = time.time_ns()
+        try:
+            yield
+        finally:
+            self.add_span(name, start_ns, **attrs)
+
+    def mark_once(self, name: str, start_ns: int, **attrs):
+        """records `name` from `start_ns` until now, only the first time it
+        is called. Used for milestones such as the first token of a response
+        """
+        if name in self._marks:
+            return
+        self._marks.add(name)
+        self.add_span(name, start_ns, **attrs)
+
+    def finish(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.exporter is not None:
+            self.exporter.export(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "turn_id": self.turn_id,
+            "trace_id": self.trace_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "attributes": self.attributes,
+            "spans": [
+                dict(asdict(span), duration_ms=round(span.duration_ms, 3))
+                for span in self.spans
+            ],
+        }
+
+
+class SessionTracer:
+    def __init__(self, session_id: str | None = None, exporter=None, **attrs):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.exporter = exporter if exporter is not None else get_exporter()
+        self.attributes = attrs
+        self._turns = 0
+
+    def start_turn(self, start_ns: int | None = None) -> TurnTrace:
+        """starts a new turn. `start_ns` backdates the turn, e.g. to the
+        moment the user stopped speaking
+        """
+        self._turns += 1
+        turn = TurnTrace(
+            self.session_id, self._turns, exporter=self.exporter, start_ns=start_ns
+        )
+        turn.attributes.update(self.attributes)
+        return turn
+
+
+class _BackgroundExporter(ABC):
+    """Runs the actual export on a daemon thread so the event loop never
+    waits on disk or network. Turns are dropped when the queue is full.
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def export(self, turn: TurnTrace):
+        try:
+            self._queue.put_nowait(turn)
+        except queue.Full:
+            logger.warning("Trace export queue full, dropping turn")
+
+    def _run(self):
+        while True:
+            turn = self._queue.get()
+            try:
+                self._export(turn)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.error(f"Trace export failed: {ex}")
+
+    @abstractmethod
+    def _export(self, turn: TurnTrace):
+        pass
+
+
+class JsonExporter(_BackgroundExporter):
+    def __init__(self, path: str | None = None):
+        self.path = path
+        super().__init__()
+
+    def _export(self, turn: TurnTrace):
+        line = json.dumps(turn.to_dict())
+        if self.path is None:
+            logger.info(line)
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _otlp_attributes(attrs: dict[str, Any]) -> list[dict[str, Any]]:
+    values = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            values.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            values.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            values.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            values.append({"key": key, "value": {"stringValue": str(value)}})
+    return values
+
+
+class OtlpExporter(_BackgroundExporter):
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.client = httpx.Client(timeout=5)
+        super().__init__()
+
+    def to_otlp(self, turn: TurnTrace) -> dict[str, Any]:
+        common = {"session.id": turn.session_id, "turn.id": turn.turn_id}
+        root = {
+            "traceId": turn.trace_id,
+            "spanId": turn.root_span_id,
+            "name": "turn",
+            "kind": 1,
+            "startTimeUnixNano": str(turn.start_ns),
+            "endTimeUnixNano": str(turn.end_ns),
+            "attributes": _otlp_attributes({**common, **turn.attributes}),
+        }
+        spans = [root] + [
+            {
+                "traceId": turn.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": turn.root_span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": _otlp_attributes({**common, **span.attributes}),
+            }
+            for span in turn.spans
+        ]
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes({"service.name": SERVICE_NAME})
+                    },
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def _export(self, turn: TurnTrace):
+        response = self.client.post(self.endpoint, json=self.to_otlp(turn))
+        response.raise_for_status()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """returns the process wide exporter configured with TRACE_EXPORTER"""
+    global _exporter  # pylint: disable=global-statement
+
+    kind = os.getenv("TRACE_EXPORTER", "none").lower()
+    if kind == "none":
+        return None
+
+    with _exporter_lock:
+        if _exporter is None:
+            if kind == "json":
+                _exporter = JsonExporter(os.getenv("TRACE_JSON_PATH"))
+            elif kind == "otlp":
+                _exporter = OtlpExporter(
+                    os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+                )
+            else:
+                raise ValueError(f"Unknown TRACE_EXPORTER `{kind}`")
+    return _exporter
@@ -0,0 +1,28 @@
+"""Text-to-speech provider selection
+
+The routers import `gTTS` from here rather than from the gtts package, so
+FAKE_PROVIDERS=true swaps in the local stand-in for offline benchmarks.
+The gTTS warm-up step is registered here, once for all the routers using it.
+"""
+
+import asyncio
+import io
+
+from app.services.warmup import WARMUP_TEXT, warmup
+from fake_providers import fake_providers_enabled
+
+if fake_providers_enabled():
+    from fake_providers.stubs import FakeGTTS as gTTS  # pylint: disable=unused-import
+else:
+    from gtts import gTTS  # type: ignore # pylint: disable=unused-import
+
+
+def _synthesize_gtts(text: str):
+    gTTS(text=text, lang="en").write_to_fp(io.BytesIO())
+
+
+async def warm_up_gtts():
+    await asyncio.to_thread(_synthesize_gtts, WARMUP_TEXT)
+
+
+warmup.register("tts.gtts", warm_up_gtts)
@@ -0,0 +1,36 @@
+"""Silero voice activity detection model, loaded once per process
+
+`torch.hub.load` downloads the model on the first call in a fresh container
+and builds a TorchScript module, both far too slow to do per connection.
+The model is shared by the connections of a worker, this is safe because
+the routers run VAD on the event loop, one call at a time.
+"""
+
+import functools
+
+import numpy as np  # type: ignore
+
+SAMPLE_RATE = 16000
+
+
+@functools.lru_cache(maxsize=None)
+def load_silero_vad():
+    """Load the Silero VAD model."""
+    import torch  # type: ignore # pylint: disable=import-outside-toplevel
+
+    model, utils = torch.hub.load(
+        repo_or_dir="snakers4/silero-vad", model="silero_vad", force_reload=False
+    )
+    get_speech_timestamps, _, _, _, _ = utils
+    return model, get_speech_timestamps
+
+
+def warm_up_vad():
+    """loads the model and runs it once on silence, the first inference of a
+    TorchScript module pays for its optimization passes
+    """
+    import torch  # type: ignore # pylint: disable=import-outside-toplevel
+
+    model, get_speech_timestamps = load_silero_vad()
+    silence = torch.from_numpy(np.zeros(SAMPLE_RATE // 2, dtype=np.float32))
+    get_speech_timestamps(silence, model, sampling_rate=SAMPLE_RATE)
@@ -0,0 +1,263 @@
+"""On-disk, memory-mapped embedding index with approximate top-K search
+
+An index is a directory of plain files:
+
+    meta.json           dimension, counts and build parameters
+    vectors.npy         (N, D) float32 unit vectors, grouped by inverted list
+    centroids.npy       (L, D) float32 unit centroids of the inverted lists
+    offsets.npy         (L + 1,) int64 start of each list in vectors.npy
+    payloads.jsonl      one JSON document per vector, in the same order
+    payload_offsets.npy (N + 1,) int64 byte offset of each payload line
+
+Everything is opened with mmap, so loading an index is instant whatever its
+size and the pages are shared through the OS page cache by every worker
+process that opens it, instead of being unpickled into each worker's heap.
+
+Search is an IVF (inverted file) scan: the query is compared to the L
+centroids and only the `nprobe` closest lists are scored exactly. Each list
+is one contiguous slice of vectors.npy, so a probe reads sequential pages.
+With nprobe >= L the search is exact.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np  # type: ignore
+
+from app.services.embeddings import normalize_vectors
+from config import Config
+from utils import get_logger
+
+
+logger = get_logger("vector_index")
+
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 8))
+# Below this many vectors an exact scan is as fast as probing lists
+EXACT_SEARCH_MAX_VECTORS = 4096
+KMEANS_ITERATIONS = 20
+
+
+@dataclass
+class SearchHit:
+    row: int
+    score: float
+    payload: dict[str, Any]
+
+
+def _spherical_kmeans(
+    vectors: np.ndarray, nlist: int, iterations: int, seed: int = 0
+) -> np.ndarray:
+    """centroids of unit vectors, clustered by cosine similarity"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty lists with random vectors instead of dropping them
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_vectors(sums)
+    return centroids
+
+
+def _write_npy(path: str, array: np.ndarray):
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+class VectorIndex:
+    """Read-only view of an index directory, see `VectorIndex.build`"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.dimension = int(self.meta["dimension"])
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        self.vectors = load("vectors.npy")
+        self.centroids = np.asarray(load("centroids.npy"))
+        self.offsets = np.asarray(load("offsets.npy"))
+        self._payload_offsets = load("payload_offsets.npy")
+        with open(os.path.join(directory, "payloads.jsonl"), "rb") as f:
+            # mmap of an empty file is not allowed
+            self._payloads = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(f.fileno()).st_size
+                else b""
+            )
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def payload(self, row: int) -> dict[str, Any]:
+        start, end = self._payload_offsets[row], self._payload_offsets[row + 1]
+        return json.loads(self._payloads[start:end])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        nprobe: int = VECTOR_INDEX_NPROBE,
+        min_score: float = -1.0,
+    ) -> list[SearchHit]:
+        """top-k vectors by cosine similarity to `query`
+
+        Args:
+            query(np.ndarray): vector of shape (D,), need not be normalized
+            k(int): number of hits to return at most
+            nprobe(int): number of inverted lists to scan, clamped to [1, nlist]
+            min_score(float): hits scoring lower are dropped
+
+        Returns:
+            list[SearchHit]: best first
+
+        """
+        query = normalize_vectors(np.asarray(query).reshape(1, -1))[0]
+        if query.shape[0] != self.dimension:
+            raise ValueError(
+                f"query dimension {query.shape[0]} != index dimension {self.dimension}"
+            )
+        if k <= 0 or len(self) == 0:
+            return []
+
+        nprobe = min(max(nprobe, 1), self.nlist)
+        if nprobe == self.nlist:
+            rows = np.arange(len(self))
+            scores = self.vectors @ query
+        else:
+            probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            slices = [np.arange(self.offsets[i], self.offsets[i + 1]) for i in probed]
+            rows = np.concatenate(slices)
+            scores = np.concatenate(
+                [
+                    self.vectors[self.offsets[i] : self.offsets[i + 1]] @ query
+                    for i in probed
+                ]
+            )
+
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return [
+            SearchHit(int(rows[i]), float(scores[i]), self.payload(int(rows[i])))
+            for i in order
+            if scores[i] >= min_score
+        ]
+
+    @classmethod
+    def build(
+        cls,
+        directory: str,
+        vectors: np.ndarray,
+        payloads: list[dict[str, Any]],
+        nlist: int | None = None,
+        meta: dict[str, Any] | None = None,
+    ) -> "VectorIndex":
+        """writes an index to `directory`, replacing any index already there
+
+        Args:
+            vectors(np.ndarray): (N, D) embeddings, normalized on write
+            payloads(list[dict]): JSON serializable document of each vector
+            nlist(int): number of inverted lists, by default 1 (exact
+                search) up to EXACT_SEARCH_MAX_VECTORS vectors, then about
+                sqrt(N)
+            meta(dict): extra fields for meta.json, e.g. the embedding model
+
+        Returns:
+            VectorIndex: the new index
+
+        """
+        vectors = normalize_vectors(vectors)
+        if len(vectors) != len(payloads):
+            raise ValueError("vectors and payloads differ in length")
+        n, dimension = vectors.shape
+        if nlist is None:
+            nlist = 1 if n <= EXACT_SEARCH_MAX_VECTORS else int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        start = time.perf_counter()
+        if nlist == 1:
+            centroids = normalize_vectors(vectors.sum(axis=0, keepdims=True))
+            assignment = np.zeros(n, dtype=np.int64)
+        else:
+            centroids = _spherical_kmeans(vectors, nlist, KMEANS_ITERATIONS)
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+
+        # Written next to the target and swapped in, so workers that have
+        # the old index open keep a consistent (unlinked) copy
+        tmp = f"{directory.rstrip(os.sep)}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        _write_npy(os.path.join(tmp, "vectors.npy"), vectors[order])
+        _write_npy(os.path.join(tmp, "centroids.npy"), centroids)
+        _write_npy(os.path.join(tmp, "offsets.npy"), offsets)
+
+        payload_offsets = np.zeros(n + 1, dtype=np.int64)
+        with open(os.path.join(tmp, "payloads.jsonl"), "wb") as f:
+            for i, row in enumerate(order):
+                line = json.dumps(payloads[row], ensure_ascii=False).encode("utf-8")
+                f.write(line + b"\n")
+                payload_offsets[i + 1] = payload_offsets[i] + len(line) + 1
+        _write_npy(os.path.join(tmp, "payload_offsets.npy"), payload_offsets)
+
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    **(meta or {}),
+                    "dimension": dimension,
+                    "count": n,
+                    "nlist": nlist,
+                    "built_at": time.time(),
+                },
+                f,
+            )
+
+        old = f"{directory.rstrip(os.sep)}.old-{os.getpid()}"
+        if os.path.isdir(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(
+            f"Built index of {n} vectors in {nlist} lists at {directory} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return cls(directory)
+
+
+def index_path(name: str) -> str:
+    """directory of the index `name` under Config.INDEX_DIR"""
+    return os.path.join(Config.INDEX_DIR, "index", name)
+
+
+def open_index(directory: str) -> VectorIndex | None:
+    """opens the index in `directory`, None if there is none
+
+    Raises:
+        ValueError: when Config.EMBEDDING_SIZE is set and does not match
+    """
+    if not os.path.isfile(os.path.join(directory, "meta.json")):
+        return None
+    index = VectorIndex(directory)
+    if Config.EMBEDDING_SIZE and index.dimension != Config.EMBEDDING_SIZE:
+        raise ValueError(
+            f"index {directory} has dimension {index.dimension}, "
+            f"EMBEDDING_SIZE is {Config.EMBEDDING_SIZE}"
+        )
+    return index
@@ -0,0 +1,108 @@
+"""Worker warm-up, run in the background at startup
+
+Routers and services register the slow first-use work of their providers
+(model downloads and loads, first inference, TLS handshakes to provider
+APIs) as named steps. Startup runs the steps concurrently, and /ready
+answers 503 until all of them have finished, so load balancers only route
+to workers that no longer pay any of these costs on a user's request.
+
+WARMUP_STEPS selects steps by name (comma separated, `*` for all), each
+step is given WARMUP_STEP_TIMEOUT_SECONDS. A failed or timed out step is
+logged and reported by /ready but does not keep the worker out of rotation,
+the work is then simply done on first use as before.
+
+WARMUP_STATE_DIR (set per instance by gunicorn.conf.py) is shared by the
+workers of an instance. The first worker to warm up without a failure
+leaves a marker there, and workers started later, e.g. to replace a
+crashed or recycled one, skip the warm-up and are ready at once instead of
+paying for the TTS calls again and flapping /ready.
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from app.services import metrics
+from utils import get_logger
+
+
+logger = get_logger("warmup")
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true")
+WARMUP_STEPS = {s.strip() for s in os.getenv("WARMUP_STEPS", "*").split(",")}
+WARMUP_STEP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_STEP_TIMEOUT_SECONDS", 300))
+WARMUP_STATE_DIR = os.getenv("WARMUP_STATE_DIR")
+# Short text synthesized by the TTS warm-up steps
+WARMUP_TEXT = "Hello."
+
+
+class Warmup:
+    def __init__(self):
+        self._steps: dict[str, Callable[[], Awaitable]] = {}
+        self._task: asyncio.Task | None = None
+        self.results: dict[str, dict] = {}
+        self.done = False
+
+    def register(self, name: str, step: Callable[[], Awaitable]):
+        """adds a step, a coroutine function without arguments. The first
+        registration of a name wins, routers sharing a provider can all
+        register it
+        """
+        self._steps.setdefault(name, step)
+
+    @staticmethod
+    def _marker() -> str | None:
+        return os.path.join(WARMUP_STATE_DIR, "warm") if WARMUP_STATE_DIR else None
+
+    def start(self):
+        if not WARMUP_ENABLED:
+            self.done = True
+            return
+        marker = self._marker()
+        if marker is not None and os.path.exists(marker):
+            logger.info("This instance is already warm, skipping the warm-up")
+            self.done = True
+            return
+        self._task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        start = time.perf_counter()
+        steps = {
+            name: step
+            for name, step in self._steps.items()
+            if "*" in WARMUP_STEPS or name in WARMUP_STEPS
+        }
+        await asyncio.gather(*(self._run_step(n, s) for n, s in steps.items()))
+        self.done = True
+        marker = self._marker()
+        if marker is not None and all(r["ok"] for r in self.results.values()):
+            try:
+                with open(marker, "w", encoding="utf-8"):
+                    pass
+            except OSError as ex:
+                logger.warning(f"Could not mark the instance as warm: {ex}")
+        logger.info(
+            f"Warm-up of {len(steps)} steps finished in "
+            f"{time.perf_counter() - start:.2f}s, ready"
+        )
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        result: dict = {"ok": True}
+        try:
+            await asyncio.wait_for(step(), WARMUP_STEP_TIMEOUT_SECONDS)
+        except Exception as ex:  # pylint: disable=broad-except
+            result = {"ok": False, "error": str(ex) or type(ex).__name__}
+            logger.error(f"Warm-up step {name} failed: {result['error']}")
+        seconds = time.perf_counter() - start
+        result["seconds"] = round(seconds, 3)
+        self.results[name] = result
+        metrics.WARMUP_STEP_SECONDS.labels(step=name).set(seconds)
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+warmup = Warmup()
@@ -0,0 +1,11 @@
+"""Gunicorn worker class running the app on uvicorn with uvloop and httptools
+
+uvicorn's own worker picks them only when they happen to be installed and
+silently falls back to asyncio and h11, this one fails to boot instead.
+"""
+
+from uvicorn.workers import UvicornWorker  # type: ignore
+
+
+class UvloopWorker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "ws": "websockets"}
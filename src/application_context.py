@@ -7,25 +7,21 @@ import os
 import json
 import wave
 import base64
+import functools
 import threading
 from io import BytesIO
 
-from vosk import Model, KaldiRecognizer  # type: ignore
+from app.services.tts_service import gTTS
 
-from gtts import gTTS  # type: ignore
-
-from langchain.prompts import PromptTemplate  # type: ignore
-from langchain.chains import LLMChain  # type: ignore
-from langchain.memory import ConversationBufferMemory  # type: ignore
-from langchain_together import Together  # type: ignore
-from langchain_together import Together, ChatTogether  # type: ignore
-from langchain_core.output_parsers import StrOutputParser  # type: ignore
-from langchain_core.prompts import ChatPromptTemplate  # type: ignore
-
-from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer  # type: ignore
+# vosk, langchain and transformers take seconds to import and are only used
+# by some routers, so they are imported by the functions that need them.
+# Run scripts/profile_startup.py to see what booting app.main costs.
+# pylint: disable=import-outside-toplevel
 
 from dotenv import load_dotenv  # type: ignore
 
+from app.services import metrics
+
 load_dotenv()  # type: ignore
 
 model_names = str(os.getenv("MODEL_NAME"))
@@ -49,6 +45,8 @@ sys_prompt = """You are a Personal Development Coach, helping users on their jou
 
 class StreamingLLM:
     def __init__(self, model, tokenizer, device):
+        from transformers import TextIteratorStreamer  # type: ignore
+
         self.model = model
         self.tokenizer = tokenizer
         self.device = device
@@ -112,6 +110,7 @@ def together_Ai(model_name=model_names, temperature=temperatures, max_token=256)
     Returns:
     - llm (Together): The initialized Together AI language model.
     """
+    from langchain_together import Together  # type: ignore
 
     llm = Together(
         model=model_name,
@@ -163,6 +162,8 @@ def prompt_template():
     - prompt (PromptTemplate): A template for LLM prompts, including conversation variables.
     - memory (ConversationBufferMemory): A memory buffer for storing chat history.
     """
+    from langchain.prompts import PromptTemplate  # type: ignore
+    from langchain.memory import ConversationBufferMemory  # type: ignore
 
     ## Prompt Format
     template = get_prompt()
@@ -177,6 +178,8 @@ def prompt_template():
 
 
 def streaming_prompt():
+    from langchain_core.prompts import ChatPromptTemplate  # type: ignore
+
     system_prompt = sys_prompt
     instruction_prompt = "Chat History:\n\n{chat_history} \n\nUser: {user_input}"
     template = (
@@ -197,6 +200,8 @@ def chain():
     Output:
     - llm_chain (LLMChain): A text generation chain with the specified components.
     """
+    from langchain.chains import LLMChain  # type: ignore
+
     # Load LLM
     prompt, memory = prompt_template()
 
@@ -207,16 +212,28 @@ def chain():
 
 
 def streaming_chain():
+    from langchain_core.output_parsers import StrOutputParser  # type: ignore
+
     parser = StrOutputParser()
     prompt = streaming_prompt()
     llm = together_Ai()
     return prompt | llm | parser
 
 
+@functools.lru_cache(maxsize=None)
+def get_vosk_model():
+    """Loads (and on first use downloads) the Vosk model once per process."""
+    from vosk import Model  # type: ignore
+
+    # return Model("/app/vosk-model-en-us-0.22")
+    return Model(lang="en")
+
+
 class EarVosk:
     def __init__(self, model_path="/app/vosk-model-en-us-0.22"):
-        # self.model = Model(model_path)
-        self.model = Model(lang="en")
+        from vosk import KaldiRecognizer  # type: ignore
+
+        self.model = get_vosk_model()
         self.recognizer = KaldiRecognizer(self.model, 16000)
         self.recognizer.SetWords(True)
         self.recognizer.SetPartialWords(True)
@@ -225,9 +242,10 @@ class EarVosk:
 def text_to_speech(text):
     """Convert text to speech and return base64 encoded audio."""
     try:
-        tts = gTTS(text=text, lang="en")
-        audio_fp = BytesIO()
-        tts.write_to_fp(audio_fp)
+        with metrics.observe_tts("gtts"):
+            tts = gTTS(text=text, lang="en")
+            audio_fp = BytesIO()
+            tts.write_to_fp(audio_fp)
         audio_fp.seek(0)
         audio_data = audio_fp.read()
         audio_base64 = base64.b64encode(audio_data).decode("utf-8")
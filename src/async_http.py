@@ -0,0 +1,292 @@
+"""Async HTTP helpers shared application wide
+
+All requests go through one pooled keep-alive `httpx.AsyncClient`. Failed
+requests are retried with exponential backoff and full jitter, requests to
+the same host are limited to HTTP_MAX_PER_HOST at a time, and retries are
+drawn from a retry budget so a failing upstream is not hit with a multiple
+of the normal traffic.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import traceback
+import weakref
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Container
+
+import httpx
+
+from utils import get_logger
+
+logger = get_logger("async_http")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 10))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", 30))
+# Each request earns this fraction of a retry ...
+HTTP_RETRY_BUDGET_RATIO = float(os.getenv("HTTP_RETRY_BUDGET_RATIO", 0.2))
+# ... on top of this many retries per second that are always allowed
+HTTP_RETRY_BUDGET_MIN_PER_SECOND = float(
+    os.getenv("HTTP_RETRY_BUDGET_MIN_PER_SECOND", 1)
+)
+HTTP_BACKOFF_CAP_SECONDS = float(os.getenv("HTTP_BACKOFF_CAP_SECONDS", 30))
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_1)"
+    "AppleWebKit/602.2.14 (KHTML, like Gecko) Version/10.0.1 Safari/602.2.14"
+)
+
+# Responses worth retrying, anything else is final
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int, base: float, cap: float = HTTP_BACKOFF_CAP_SECONDS):
+    """full jitter backoff, a random delay in [0, min(cap, base * 2**attempt)]
+
+    Args:
+        attempt(int): 0 for the first retry
+        base(float): delay of the first retry in seconds
+
+    Returns:
+        float: seconds to wait
+
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class RetryBudget:
+    """Token bucket of retries. Requests deposit `ratio` tokens, a retry
+    withdraws one, and `min_per_second` tokens trickle in regardless so
+    low traffic services can still retry
+    """
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        # Bursts of retries are allowed up to about ten seconds worth
+        self.capacity = max(10 * min_per_second, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.min_per_second,
+        )
+        self._updated_at = now
+
+    def deposit(self):
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class AsyncHTTP:
+    """Pooled client with per host concurrency limits and budgeted retries.
+
+    The client and semaphores are bound to the event loop they are first
+    used on, use `get_http()` for the shared instance of the running loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_per_host: int = HTTP_MAX_PER_HOST,
+    ):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.retry_budget = RetryBudget(
+            HTTP_RETRY_BUDGET_RATIO, HTTP_RETRY_BUDGET_MIN_PER_SECOND
+        )
+        self._client: httpx.AsyncClient | None = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                ),
+            )
+        return self._client
+
+    def _host_slots(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        slots = self._hosts.get(host)
+        if slots is None:
+            slots = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return slots
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        max_retry: int = 0,
+        wait: float = 2,
+        timeout: timedelta = timedelta(seconds=10),
+        debug: bool = False,
+        accept: Container[int] = (),
+        **kwargs,
+    ) -> httpx.Response:
+        """sends a request, retrying transport errors and retryable status
+        codes up to `max_retry` times while the retry budget allows
+
+        Args:
+            max_retry(int): retries after the first attempt
+            wait(float): base delay of the exponential backoff in seconds
+            accept(Container[int]): other status codes returned as is,
+                e.g. 304 for conditional requests
+            **kwargs: passed on to `httpx.AsyncClient.request`
+
+        Returns:
+            httpx.Response: a 2xx response or one with an `accept` status
+
+        """
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with self._host_slots(url):
+                    response = await self.client.request(
+                        method, url, timeout=timeout.total_seconds(), **kwargs
+                    )
+                if response.is_success or response.status_code in accept:
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise RuntimeError(response.text)
+                retry_after = response.headers.get("Retry-After")
+                error: Exception = RuntimeError(response.text)
+            except httpx.TransportError as ex:
+                error = ex
+
+            msg = str(error)
+            logger.error(f"{method} {url} failed: {msg[:200]}")
+            if debug is True:
+                print("".join(traceback.format_exception(error)))
+
+            if attempt >= max_retry:
+                raise RuntimeError(
+                    "failed to complete request in the given retries"
+                ) from error
+            if not self.retry_budget.try_withdraw():
+                raise RuntimeError("retry budget exhausted") from error
+
+            delay = backoff_delay(attempt, wait)
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHTTP]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_http() -> AsyncHTTP:
+    """the shared instance of the running event loop"""
+    loop = asyncio.get_running_loop()
+    http = _instances.get(loop)
+    if http is None:
+        http = _instances[loop] = AsyncHTTP()
+    return http
+
+
+async def close_http():
+    http = _instances.pop(asyncio.get_running_loop(), None)
+    if http is not None:
+        await http.aclose()
+
+
+async def async_post(
+    url: str,
+    data: dict,
+    headers_: dict[str, str] | None = None,
+    max_retry: int = 0,
+    wait: float = 2,
+    json: bool = True,
+    debug: bool = False,
+    timeout: timedelta = timedelta(seconds=10),
+) -> str:
+    """async counterpart of `utils.post`, returns the response text"""
+    body = {"json": data} if json is True else {"data": data}
+    response = await get_http().request(
+        "POST",
+        url,
+        max_retry=max_retry,
+        wait=wait,
+        timeout=timeout,
+        debug=debug,
+        headers=headers_,
+        **body,
+    )
+    return response.text
+
+
+async def async_get(
+    url: str,
+    data: dict | None = None,
+    headers_: dict[str, str] | None = None,
+    max_retry: int = 2,
+    wait: float = 2,
+    debug: bool = False,
+    timeout: timedelta = timedelta(seconds=10),
+) -> str:
+    """async counterpart of `utils.get`, returns the response text"""
+    response = await get_http().request(
+        "GET",
+        url,
+        max_retry=max_retry,
+        wait=wait,
+        timeout=timeout,
+        debug=debug,
+        headers=headers_,
+        params=data,
+    )
+    return response.text
+
+
+# Sync callers share one client running on a background event loop, so
+# they get connection reuse too and work from inside a running loop
+_sync_loop: asyncio.AbstractEventLoop | None = None
+_sync_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop  # pylint: disable=global-statement
+    with _sync_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_sync_loop.run_forever, name="async-http", daemon=True
+            ).start()
+    return _sync_loop
+
+
+def run_sync(coro) -> str:
+    """runs a coroutine of this module on the background loop and waits
+    for its result. Blocks the calling thread, never call it from a route
+    """
+    future: Future = asyncio.run_coroutine_threadsafe(coro, _background_loop())
+    return future.result()
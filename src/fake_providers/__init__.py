@@ -0,0 +1,23 @@
+"""Local stand-ins for the external providers used by the voice routers
+
+Lets the realtime paths run offline and deterministically for benchmarks:
+
+- openai_server: OpenAI compatible chat completions (streaming), speech and
+  embeddings endpoints. Point the app at it with
+  OPENAI_BASE_URL=http://localhost:9001/v1 and BASE_URL=http://localhost:9001/v1
+- deepgram_server: Deepgram live transcription websocket emulator. Point the
+  app at it with DEEPGRAM_URL=http://localhost:9002
+- stubs: in-process gTTS and Google speech recognition replacements, used by
+  the routers when FAKE_PROVIDERS=true
+- fake_redis: in-memory Redis used for the session cache when
+  FAKE_PROVIDERS=true
+
+Latencies are drawn from distributions configured with FAKE_*_MS variables
+(see latency.py) using a seeded generator (FAKE_SEED), so runs are repeatable.
+"""
+
+import os
+
+
+def fake_providers_enabled() -> bool:
+    return os.getenv("FAKE_PROVIDERS", "false").lower() in ("1", "true")
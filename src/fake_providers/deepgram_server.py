@@ -0,0 +1,156 @@
+"""Deepgram live transcription emulator
+
+Accepts the same websocket the Deepgram SDK opens (/v1/listen with linear16
+audio) and answers with `Results` and `UtteranceEnd` messages. Speech is
+detected with a simple energy threshold on the received PCM, the transcript
+text is taken from FAKE_TRANSCRIPTS (see stubs.py).
+
+Run with:
+    cd src && uvicorn fake_providers.deepgram_server:app --port 9002
+
+Tunables:
+    FAKE_DEEPGRAM_MS            delay between end of speech and the final result
+    FAKE_ENERGY_THRESHOLD       RMS (int16 units) above which a chunk is speech
+"""
+
+import asyncio
+import json
+import os
+import uuid
+
+import numpy as np  # type: ignore
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect  # type: ignore
+
+from fake_providers.latency import LatencyModel
+from fake_providers.stubs import next_transcript
+
+
+final_latency = LatencyModel.from_env("FAKE_DEEPGRAM_MS", "lognormal:150:0.3")
+energy_threshold = float(os.getenv("FAKE_ENERGY_THRESHOLD", 500))
+
+app = FastAPI(title="Fake Deepgram")
+
+
+def metadata(request_id: str) -> dict:
+    return {
+        "request_id": request_id,
+        "model_info": {"name": "fake", "version": "0", "arch": "fake"},
+        "model_uuid": str(uuid.UUID(int=0)),
+    }
+
+
+def results_message(request_id: str, transcript: str, start: float, duration: float):
+    words = [
+        {
+            "word": word.strip(".,!?").lower(),
+            "start": start,
+            "end": start + duration,
+            "confidence": 0.99,
+            "punctuated_word": word,
+        }
+        for word in transcript.split()
+    ]
+    return {
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": duration,
+        "start": start,
+        "is_final": True,
+        "speech_final": True,
+        "from_finalize": False,
+        "channel": {
+            "alternatives": [
+                {"transcript": transcript, "confidence": 0.99, "words": words}
+            ]
+        },
+        "metadata": metadata(request_id),
+    }
+
+
+@app.websocket("/v1/listen")
+async def listen(websocket: WebSocket):
+    await websocket.accept()
+    params = websocket.query_params
+    sample_rate = int(params.get("sample_rate", 16000))
+    endpointing = float(params.get("endpointing", 300)) / 1000
+    utterance_end = float(params.get("utterance_end_ms", 1000)) / 1000
+    request_id = str(uuid.uuid4())
+
+    stream_time = 0.0  # seconds of audio received
+    speech_start = None
+    last_speech = None
+    finalized = False
+    pending = None
+
+    async def finalize(start: float, end: float):
+        await final_latency.asleep()
+        message = results_message(request_id, next_transcript(), start, end - start)
+        await websocket.send_text(json.dumps(message))
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                if json.loads(message["text"]).get("type") == "CloseStream":
+                    break
+                continue  # KeepAlive and other control messages
+
+            pcm = np.frombuffer(message["bytes"], dtype=np.int16)
+            stream_time += len(pcm) / sample_rate
+            rms = (
+                float(np.sqrt(np.mean(pcm.astype(np.float32) ** 2))) if len(pcm) else 0
+            )
+
+            if rms >= energy_threshold:
+                if speech_start is None:
+                    speech_start = stream_time
+                last_speech = stream_time
+                finalized = False
+                continue
+
+            if last_speech is None:
+                continue
+            silence = stream_time - last_speech
+            if not finalized and silence >= endpointing:
+                finalized = True
+                pending = asyncio.create_task(finalize(speech_start, last_speech))
+            if silence >= utterance_end:
+                # Like Deepgram, the final result always precedes UtteranceEnd
+                if pending is not None:
+                    await pending
+                    pending = None
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "UtteranceEnd",
+                            "channel": [0, 1],
+                            "last_word_end": last_speech,
+                        }
+                    )
+                )
+                speech_start = None
+                last_speech = None
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            await websocket.send_text(
+                json.dumps(
+                    {
+                        "type": "Metadata",
+                        "transaction_key": "deprecated",
+                        "request_id": request_id,
+                        "sha256": "",
+                        "created": "",
+                        "duration": stream_time,
+                        "channels": 1,
+                        "models": [],
+                        "model_info": {},
+                    }
+                )
+            )
+            await websocket.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
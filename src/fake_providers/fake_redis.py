@@ -0,0 +1,188 @@
+"""In-memory stand-in for `redis.asyncio.Redis`
+
+Implements the subset of commands used by the app (strings, lists, hashes,
+expiry and transactional pipelines) with `decode_responses=True` semantics.
+Used instead of a Redis server when FAKE_PROVIDERS=true, or injected with
+`Redis.use(FakeRedis())` in tests.
+"""
+
+import time
+from typing import Any, Optional
+
+
+class _Store:
+    def __init__(self):
+        self.data: dict[str, Any] = {}
+        self.expires: dict[str, float] = {}
+
+    def _get(self, key: str, kind: type):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise TypeError(
+                "WRONGTYPE Operation against a key holding the wrong kind of value"
+            )
+        return value
+
+    @staticmethod
+    def _range(length: int, start: int, end: int) -> tuple[int, int]:
+        if start < 0:
+            start = max(length + start, 0)
+        if end < 0:
+            end = length + end
+        return start, min(end, length - 1)
+
+    def ping(self) -> bool:
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        return self._get(key, str)
+
+    def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False):
+        if nx and self._get(key, object) is not None:
+            return None
+        self.data[key] = str(value)
+        self.expires.pop(key, None)
+        if ex is not None:
+            self.expire(key, ex)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._get(key, object) is not None:
+                deleted += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return deleted
+
+    def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._get(key, object) is not None)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        if self._get(key, object) is None:
+            return False
+        self.expires[key] = time.monotonic() + seconds
+        return True
+
+    def ttl(self, key: str) -> int:
+        if self._get(key, object) is None:
+            return -2
+        deadline = self.expires.get(key)
+        if deadline is None:
+            return -1
+        return int(deadline - time.monotonic())
+
+    def rpush(self, key: str, *values) -> int:
+        items = self._get(key, list)
+        if items is None:
+            items = self.data[key] = []
+        items.extend(str(v) for v in values)
+        return len(items)
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        items = self._get(key, list) or []
+        start, end = self._range(len(items), start, end)
+        return items[start : end + 1] if start <= end else []
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        items = self._get(key, list)
+        if items is None:
+            return True
+        start, end = self._range(len(items), start, end)
+        items[:] = items[start : end + 1] if start <= end else []
+        if not items:
+            self.delete(key)
+        return True
+
+    def hset(self, key: str, field=None, value=None, mapping=None) -> int:
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        hash_ = self._get(key, dict)
+        if hash_ is None:
+            hash_ = self.data[key] = {}
+        added = sum(1 for f in fields if f not in hash_)
+        hash_.update({str(f): str(v) for f, v in fields.items()})
+        return added
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return (self._get(key, dict) or {}).get(field)
+
+    def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self._get(key, dict) or {})
+
+    def hexists(self, key: str, field: str) -> bool:
+        return field in (self._get(key, dict) or {})
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        hash_ = self._get(key, dict)
+        if hash_ is None:
+            hash_ = self.data[key] = {}
+        value = int(hash_.get(field, 0)) + amount
+        hash_[field] = str(value)
+        return value
+
+
+COMMANDS = {
+    name
+    for name in vars(_Store)
+    if not name.startswith("_") and callable(getattr(_Store, name))
+}
+
+
+class FakePipeline:
+    """Buffers commands and runs them back to back on `execute`, which is
+    atomic since the store is only touched from the event loop
+    """
+
+    def __init__(self, store: _Store):
+        self._store = store
+        self._commands: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name not in COMMANDS:
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return command
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [
+            getattr(self._store, name)(*args, **kwargs)
+            for name, args, kwargs in commands
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
+
+
+class FakeRedis:
+    def __init__(self):
+        self._store = _Store()
+
+    def __getattr__(self, name: str):
+        if name not in COMMANDS:
+            raise AttributeError(name)
+        method = getattr(self._store, name)
+
+        async def command(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return command
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self._store)
+
+    async def aclose(self):
+        pass
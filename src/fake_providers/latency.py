@@ -0,0 +1,58 @@
+"""Injectable latency distributions for the fake providers
+
+A distribution is configured as a string `<kind>:<arg>[:<arg>]` in
+milliseconds:
+
+- fixed:200            always 200 ms
+- uniform:100:300      uniformly between 100 and 300 ms
+- normal:250:50        mean 250 ms, standard deviation 50 ms (clipped at 0)
+- lognormal:250:0.4    median 250 ms, sigma 0.4 (long tail, closest to real APIs)
+"""
+
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+
+
+_rng = random.Random(int(os.getenv("FAKE_SEED", 42)))
+_rng_lock = threading.Lock()
+
+
+class LatencyModel:
+    def __init__(self, spec: str):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(":") if a]
+        self.spec = spec
+
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(self.args) != expected[kind]:
+            raise ValueError(f"Invalid latency distribution `{spec}`")
+
+    @classmethod
+    def from_env(cls, name: str, default: str) -> "LatencyModel":
+        return cls(os.getenv(name, default))
+
+    def sample_ms(self) -> float:
+        with _rng_lock:
+            if self.kind == "fixed":
+                value = self.args[0]
+            elif self.kind == "uniform":
+                value = _rng.uniform(self.args[0], self.args[1])
+            elif self.kind == "normal":
+                value = _rng.gauss(self.args[0], self.args[1])
+            else:
+                value = _rng.lognormvariate(math.log(self.args[0]), self.args[1])
+        return max(value, 0.0)
+
+    def sleep(self):
+        time.sleep(self.sample_ms() / 1000)
+
+    async def asleep(self):
+        await asyncio.sleep(self.sample_ms() / 1000)
+
+    def __repr__(self):
+        return f"LatencyModel({self.spec})"
@@ -0,0 +1,164 @@
+"""OpenAI compatible fake server
+
+Serves the subset of the OpenAI API used by the app:
+- POST /v1/chat/completions (streaming and non streaming)
+- POST /v1/audio/speech
+- POST /v1/embeddings
+
+Run with:
+    cd src && uvicorn fake_providers.openai_server:app --port 9001
+
+Tunables:
+    FAKE_TTFT_MS                time to first token distribution
+    FAKE_TOKENS_PER_SECOND      token rate after the first token
+    FAKE_SPEECH_MS              /audio/speech latency distribution
+    FAKE_EMBEDDING_MS           /embeddings latency distribution
+    FAKE_EMBEDDING_SIZE         embedding dimension
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+import zlib
+
+import numpy as np  # type: ignore
+from fastapi import FastAPI, Request  # type: ignore
+from fastapi.responses import JSONResponse, Response, StreamingResponse  # type: ignore
+
+from fake_providers.latency import LatencyModel
+from fake_providers.stubs import fake_mp3
+
+
+DEFAULT_RESPONSES = [
+    "Start by picking the one task that would make today a success. "
+    "Do it first, before checking messages. "
+    "Then give yourself a short break!",
+    "It is normal to feel low on energy sometimes. "
+    "Try a five minute walk and write down one small win from yesterday. "
+    "Small steps build momentum.",
+    "Reflecting on your emotions is a strength. "
+    "What do you think triggered that feeling? "
+    "Naming it often makes it lighter.",
+]
+
+ttft = LatencyModel.from_env("FAKE_TTFT_MS", "lognormal:350:0.3")
+speech_latency = LatencyModel.from_env("FAKE_SPEECH_MS", "lognormal:400:0.3")
+embedding_latency = LatencyModel.from_env("FAKE_EMBEDDING_MS", "lognormal:60:0.3")
+tokens_per_second = float(os.getenv("FAKE_TOKENS_PER_SECOND", 40))
+embedding_size = int(os.getenv("FAKE_EMBEDDING_SIZE", 256))
+
+app = FastAPI(title="Fake OpenAI")
+
+
+def pick_response(messages: list[dict]) -> str:
+    """deterministic canned answer for a conversation"""
+    last = messages[-1]["content"] if messages else ""
+    return DEFAULT_RESPONSES[zlib.crc32(last.encode("utf-8")) % len(DEFAULT_RESPONSES)]
+
+
+def tokenize(text: str) -> list[str]:
+    """splits into word-sized tokens keeping the leading whitespace"""
+    return re.findall(r"\s*\S+", text)
+
+
+def fake_embedding(text: str) -> list[float]:
+    """hashed bag-of-words embedding, similar texts get similar vectors"""
+    vector = np.zeros(embedding_size, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % embedding_size
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+
+def chunk_payload(completion_id: str, model: str, content, finish_reason=None):
+    delta = {} if content is None else {"role": "assistant", "content": content}
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake-model")
+    text = pick_response(body.get("messages", []))
+    tokens = tokenize(text)
+    max_tokens = body.get("max_tokens")
+    if max_tokens:
+        tokens = tokens[:max_tokens]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        await ttft.asleep()
+        return JSONResponse(
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(tokens),
+                },
+            }
+        )
+
+    async def stream():
+        await ttft.asleep()
+        for i, token in enumerate(tokens):
+            if i > 0:
+                await asyncio.sleep(1 / tokens_per_second)
+            payload = chunk_payload(completion_id, model, token)
+            yield f"data: {json.dumps(payload)}\n\n"
+        payload = chunk_payload(completion_id, model, None, finish_reason="stop")
+        yield f"data: {json.dumps(payload)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    body = await request.json()
+    await speech_latency.asleep()
+    return Response(content=fake_mp3(body.get("input", "")), media_type="audio/mpeg")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    await embedding_latency.asleep()
+    return JSONResponse(
+        {
+            "object": "list",
+            "model": body.get("model", "fake-embedding"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+    )
@@ -0,0 +1,62 @@
+"""In-process replacements for gTTS and Google speech recognition
+
+Both block for a latency drawn from FAKE_TTS_MS / FAKE_STT_MS, like the real
+libraries do while waiting on the network.
+"""
+
+import itertools
+import os
+import threading
+
+from fake_providers.latency import LatencyModel
+
+
+DEFAULT_TRANSCRIPTS = [
+    "How should I set my priorities for today?",
+    "I feel unmotivated this morning, any advice?",
+    "What is a good habit to build for personal growth?",
+]
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, ~26 ms of audio)
+SILENT_MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+# Rough speaking rate used to size the fake audio, in characters per second
+CHARS_PER_SECOND = 15
+
+tts_latency = LatencyModel.from_env("FAKE_TTS_MS", "lognormal:250:0.3")
+stt_latency = LatencyModel.from_env("FAKE_STT_MS", "lognormal:400:0.3")
+
+_transcripts = itertools.cycle(
+    [t for t in os.getenv("FAKE_TRANSCRIPTS", "").split("|") if t]
+    or DEFAULT_TRANSCRIPTS
+)
+_transcripts_lock = threading.Lock()
+
+
+def fake_mp3(text: str) -> bytes:
+    """silent mp3 whose duration roughly matches speaking `text` aloud"""
+    seconds = max(len(text) / CHARS_PER_SECOND, 0.1)
+    return SILENT_MP3_FRAME * int(seconds / 0.026)
+
+
+def next_transcript() -> str:
+    with _transcripts_lock:
+        return next(_transcripts)
+
+
+class FakeGTTS:
+    """Drop-in for gtts.gTTS supporting the calls made by the routers"""
+
+    def __init__(self, text: str, lang: str = "en", **kwargs):
+        self.text = text
+        self.lang = lang
+
+    def write_to_fp(self, fp):
+        tts_latency.sleep()
+        fp.write(fake_mp3(self.text))
+
+
+def recognize_google(audio_data, language: str = "en-US", show_all: bool = False):
+    """Drop-in for speech_recognition.Recognizer.recognize_google"""
+    stt_latency.sleep()
+    return next_transcript()
@@ -0,0 +1,97 @@
+"""Gunicorn settings of the production runner, see scripts/run-prod.sh
+
+The app is imported once in the master process (`preload_app`) together
+with the models listed in PRELOAD_MODELS, then the workers are forked and
+share those pages copy-on-write instead of each loading its own copy. The
+objects loaded so far are moved out of reach of the garbage collector
+(`gc.freeze`) so collections in the workers do not write to, and thereby
+copy, the shared pages.
+
+Worker recycling is off by default (GUNICORN_MAX_REQUESTS=0). A recycled
+worker stops accepting connections and gets GUNICORN_GRACEFUL_TIMEOUT
+seconds to finish the open ones, after which its websockets, i.e. voice
+conversations in progress, are cut; clients then reconnect with their
+resume token. Only enable it, with a graceful timeout longer than a typical
+conversation, to contain a leak. Replacement workers skip the warm-up once
+a worker of the instance has warmed up (see app/services/warmup.py).
+"""
+
+import gc
+import multiprocessing
+import os
+import tempfile
+
+# Must be set before prometheus_client is imported by the app
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+# Shared by the workers of this instance, read when the app is imported
+if "WARMUP_STATE_DIR" not in os.environ:
+    os.environ["WARMUP_STATE_DIR"] = tempfile.mkdtemp(prefix="warmup-")
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+# One worker per CPU needs a session store shared by the workers (Redis, not
+# the FakeRedis of FAKE_PROVIDERS), see app/services/db/session_store.py
+SHARED_SESSION_STORE = (
+    os.getenv("SESSION_STORE", "auto").lower() != "memory"
+    and bool(os.getenv("REDIS_HOST"))
+    and os.getenv("FAKE_PROVIDERS", "false").lower() not in ("1", "true")
+)
+workers = int(
+    os.getenv("WEB_CONCURRENCY")
+    or (multiprocessing.cpu_count() if SHARED_SESSION_STORE else 1)
+)
+# The session store refuses per worker sessions when there are several
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "app.uvicorn_worker.UvloopWorker"
+preload_app = True
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+accesslog = "-"
+
+# Comma separated: silero, vosk, retrieval
+PRELOAD_MODELS = [m for m in os.getenv("PRELOAD_MODELS", "").split(",") if m]
+
+
+def preload_models(log):
+    # pylint: disable=import-outside-toplevel
+    loaders = {}
+    if "silero" in PRELOAD_MODELS:
+        from app.services.vad_service import load_silero_vad
+
+        # Only loaded, running it here would start thread pools that do
+        # not survive the fork. The workers' warm-up runs it once.
+        loaders["silero"] = load_silero_vad
+    if "vosk" in PRELOAD_MODELS:
+        from application_context import get_vosk_model
+
+        loaders["vosk"] = get_vosk_model
+    if "retrieval" in PRELOAD_MODELS:
+        from app.services.retrieval import get_retriever
+
+        loaders["retrieval"] = get_retriever
+
+    for name, load in loaders.items():
+        try:
+            load()
+            log.info(f"Preloaded {name} in the master process")
+        except Exception as ex:  # pylint: disable=broad-except
+            # Each worker loads it on first use instead
+            log.error(f"Could not preload {name}: {ex}")
+
+
+def when_ready(server):
+    """runs in the master after the app is imported, before any fork"""
+    preload_models(server.log)
+    gc.collect()
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess  # type: ignore # pylint: disable=import-outside-toplevel
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,197 @@
+"""Batch decoding of base64 images into a single preallocated array
+
+Small batches are decoded in the calling process. Large batches are split
+into chunks decoded by a pool of worker processes, each writing its images
+straight into a shared memory mapping of the (N, H, W, C) result, so only
+the base64 strings are sent to the workers and nothing is copied back.
+
+Images are converted to one PIL mode, or keep their own mode when all of
+them share the mode of the first image and it has 8 bits per band.
+"""
+
+import base64
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from multiprocessing import get_context
+
+import numpy as np  # type: ignore
+from PIL import Image
+
+IMAGE_DECODE_WORKERS = int(os.getenv("IMAGE_DECODE_WORKERS", os.cpu_count() or 1))
+# Below this many images the pool round trip costs more than it saves
+IMAGE_DECODE_PARALLEL_MIN = int(os.getenv("IMAGE_DECODE_PARALLEL_MIN", 32))
+# Chunks per worker, more chunks balance uneven image sizes better
+CHUNKS_PER_WORKER = 4
+
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# Modes stored as one uint8 per band, the only ones kept without a conversion
+BATCH_MODES = {"L", "P", "LA", "PA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr"}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class UnbatchableImagesError(ValueError):
+    """the images do not share a mode that can be kept in one array"""
+
+
+@dataclass
+class DecodedBatch:
+    images: np.ndarray  # (N, H, W, C)
+    seconds: np.ndarray  # (N,) decode and resize time of each image
+
+    @property
+    def total_seconds(self) -> float:
+        return float(self.seconds.sum())
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool  # pylint: disable=global-statement
+    if _pool is None:
+        # spawn, forking a process that runs torch and uvicorn threads is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_DECODE_WORKERS, mp_context=get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool  # pylint: disable=global-statement
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _image_mode(b64_image: str) -> str:
+    """mode of an image, only its header is parsed"""
+    with Image.open(BytesIO(base64.b64decode(b64_image))) as img:
+        return img.mode
+
+
+def _decode_into(
+    out: np.ndarray,
+    offset: int,
+    b64_images: list[str],
+    image_size: tuple[int, int],
+    mode: str,
+    convert: bool = True,
+) -> list[float]:
+    seconds = []
+    for i, b64_image in enumerate(b64_images):
+        start = time.perf_counter()
+        try:
+            with Image.open(BytesIO(base64.b64decode(b64_image))) as img:
+                if img.mode != mode and not convert:
+                    raise UnbatchableImagesError(
+                        f"image {offset + i} has mode {img.mode}, not {mode}"
+                    )
+                if img.mode != mode:
+                    img = img.convert(mode)
+                img = img.resize(image_size)
+                # Casts in place, no intermediate float array per image
+                out[offset + i] = np.asarray(img).reshape(out.shape[1:])
+        except UnbatchableImagesError:
+            raise
+        except Exception as ex:
+            raise ValueError(f"image {offset + i}: {ex}") from ex
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _decode_chunk(
+    path: str,
+    shape: tuple[int, ...],
+    dtype: str,
+    offset: int,
+    b64_images: list[str],
+    image_size: tuple[int, int],
+    mode: str,
+    convert: bool,
+) -> list[float]:
+    """worker side, maps the shared result array and fills its chunk"""
+    out = np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+    try:
+        return _decode_into(out, offset, b64_images, image_size, mode, convert)
+    finally:
+        del out
+
+
+def decode_base64_batch(
+    b64_images: list[str],
+    image_size: tuple[int, int],
+    mode: str | None = "RGB",
+    dtype: np.dtype | str = np.uint8,
+    parallel: bool | None = None,
+) -> DecodedBatch:
+    """decodes and resizes base64 images into one (N, H, W, C) array
+
+    Args:
+        b64_images(list[str]): base64 encoded images of any format PIL reads
+        image_size(tuple[int, int]): [IMAGE_WIDTH, IMAGE_HEIGHT]
+        mode(str): PIL mode every image is converted to, sets C. None
+            keeps the mode of the first image, see UnbatchableImagesError
+        dtype: dtype of the result, e.g. float32 for model input
+        parallel(bool): use the process pool, by default only for
+            batches of at least IMAGE_DECODE_PARALLEL_MIN images
+
+    Returns:
+        DecodedBatch: the images and the decode time of each
+
+    Raises:
+        UnbatchableImagesError: with mode None, when the first image does
+            not have 8 bits per band or another image has another mode
+        ValueError: when an image cannot be decoded
+
+    """
+    n = len(b64_images)
+    width, height = image_size
+    convert = mode is not None
+    if mode is None:
+        try:
+            mode = _image_mode(b64_images[0]) if n else "RGB"
+        except Exception as ex:
+            raise ValueError(f"image 0: {ex}") from ex
+        if mode not in BATCH_MODES:
+            raise UnbatchableImagesError(f"mode {mode} is not kept in a batch")
+    channels = len(Image.new(mode, (1, 1)).getbands())
+    shape = (n, height, width, channels)
+    dtype = np.dtype(dtype)
+    if parallel is None:
+        parallel = n >= IMAGE_DECODE_PARALLEL_MIN and IMAGE_DECODE_WORKERS > 1
+
+    if not parallel or n == 0:
+        images = np.empty(shape, dtype=dtype)
+        seconds = _decode_into(images, 0, b64_images, image_size, mode, convert)
+        return DecodedBatch(images, np.asarray(seconds))
+
+    fd, path = tempfile.mkstemp(prefix="image-batch-", dir=SHARED_DIR)
+    os.close(fd)
+    try:
+        shared = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+        chunk = -(-n // (IMAGE_DECODE_WORKERS * CHUNKS_PER_WORKER))
+        starts = range(0, n, chunk)
+        futures = [
+            get_pool().submit(
+                _decode_chunk,
+                path,
+                shape,
+                dtype.str,
+                start,
+                b64_images[start : start + chunk],
+                image_size,
+                mode,
+                convert,
+            )
+            for start in starts
+        ]
+        seconds = np.empty(n)
+        for start, future in zip(starts, futures):
+            chunk_seconds = future.result()
+            seconds[start : start + len(chunk_seconds)] = chunk_seconds
+    finally:
+        # The mapping stays valid after the file is gone
+        os.unlink(path)
+    return DecodedBatch(shared.view(np.ndarray), seconds)
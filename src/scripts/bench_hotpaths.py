@@ -0,0 +1,235 @@
+"""Micro-benchmarks for the per-chunk and per-sentence work of the realtime routers
+
+Covers the int16 -> float32 conversion, tensor wrapping and VAD call done for
+every received audio chunk, and the base64 encoding, JSON serialization and
+sentence detection done for every response sentence. Each case reports the
+time per operation and the peak memory allocated per operation.
+
+    cd src && python scripts/bench_hotpaths.py
+    cd src && python scripts/bench_hotpaths.py --vad --json bench.json
+    cd src && python scripts/bench_hotpaths.py --compare bench.json
+
+--compare exits with status 1 if any case got slower than --tolerance.
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np  # type: ignore
+
+SAMPLE_RATE = 16000
+# Browser ScriptProcessor buffer, 100 ms, and the Silero VAD window
+CHUNK_SIZES = [4096, 1600, 512]
+
+SENTENCE_ENDINGS = (".", "!", "?")
+INT16_SCALE = np.float32(1 / 32768.0)
+
+RESPONSE = (
+    "Start by picking the one task that would make today a success. "
+    "Do it first, before checking messages, and protect that time! "
+    "Once it is done, review your list and choose two smaller tasks. "
+    "How does that sound for a plan? "
+) * 4
+
+
+def make_pcm(samples: int) -> bytes:
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(samples) * 3000).astype(np.int16).tobytes()
+
+
+def tokens_of(text: str) -> list[str]:
+    words = text.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def bench(fn, min_time: float = 0.3) -> tuple[float, int, int]:
+    """returns (ns per op, iterations, peak bytes allocated per op)"""
+    fn()  # warm up
+    iterations = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        iterations *= 2
+
+    tracemalloc.start()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / iterations, iterations, max(peak - current, 0)
+
+
+def audio_cases(with_torch: bool, with_vad: bool):
+    cases = {}
+    for samples in CHUNK_SIZES:
+        pcm = make_pcm(samples)
+        out = np.empty(samples, dtype=np.float32)
+
+        # What the stt router does today
+        cases[f"int16_to_float32/{samples}"] = lambda pcm=pcm: (
+            np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        )
+        # Single pass into a reused buffer
+        cases[f"int16_to_float32_inplace/{samples}"] = lambda pcm=pcm, out=out: (
+            np.multiply(
+                np.frombuffer(pcm, dtype=np.int16),
+                INT16_SCALE,
+                out=out,
+                dtype=np.float32,
+            )
+        )
+
+        if with_torch:
+            import torch  # type: ignore # pylint: disable=import-outside-toplevel
+
+            audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+            cases[f"torch.tensor/{samples}"] = lambda audio=audio: torch.tensor(audio)
+            cases[f"torch.from_numpy/{samples}"] = lambda audio=audio: (
+                torch.from_numpy(audio)
+            )
+
+    if with_vad:
+        import torch  # type: ignore # pylint: disable=import-outside-toplevel
+
+        model, utils = torch.hub.load(
+            repo_or_dir="snakers4/silero-vad", model="silero_vad", force_reload=False
+        )
+        get_speech_timestamps = utils[0]
+        for samples in CHUNK_SIZES:
+            audio = torch.from_numpy(
+                np.frombuffer(make_pcm(samples), dtype=np.int16).astype(np.float32)
+                / 32768.0
+            )
+            cases[f"vad.get_speech_timestamps/{samples}"] = lambda audio=audio: (
+                get_speech_timestamps(
+                    audio,
+                    model,
+                    sampling_rate=SAMPLE_RATE,
+                    return_seconds=True,
+                    min_speech_duration_ms=100,
+                    min_silence_duration_ms=100,
+                    threshold=0.5,
+                )
+            )
+    return cases
+
+
+def protocol_cases():
+    cases = {}
+    # gTTS produces roughly 4 KB of mp3 per second of speech
+    for size_kb in [16, 64]:
+        audio = bytes(
+            np.random.default_rng(0).integers(0, 255, size_kb * 1024, np.uint8)
+        )
+        encoded = base64.b64encode(audio).decode("utf-8")
+        payload = {
+            "type": "audio",
+            "text": RESPONSE[:64],
+            "audio": encoded,
+            "has_more": True,
+        }
+
+        cases[f"base64_encode/{size_kb}KB"] = lambda audio=audio: (
+            base64.b64encode(audio).decode("utf-8")
+        )
+        # Starlette's WebSocket.send_json serialization
+        cases[f"send_json.dumps/{size_kb}KB"] = lambda payload=payload: json.dumps(
+            payload, separators=(",", ":"), ensure_ascii=False
+        )
+        try:
+            import orjson  # type: ignore # pylint: disable=import-outside-toplevel
+
+            cases[f"orjson.dumps/{size_kb}KB"] = lambda payload=payload: (
+                orjson.dumps(payload)
+            )
+        except ImportError:
+            pass
+    return cases
+
+
+def sentence_cases():
+    tokens = tokens_of(RESPONSE)
+
+    def any_endswith():
+        # What the text-audio routers do for every token
+        sentences, current = [], ""
+        for token in tokens:
+            current += token
+            if any(current.endswith(punct) for punct in [".", "!", "?"]):
+                sentences.append(current.strip())
+                current = ""
+        return sentences
+
+    def tuple_endswith():
+        sentences, current = [], []
+        for token in tokens:
+            current.append(token)
+            if token.endswith(SENTENCE_ENDINGS):
+                sentences.append("".join(current).strip())
+                current = []
+        return sentences
+
+    return {
+        f"sentences.any_endswith/{len(tokens)}tok": any_endswith,
+        f"sentences.tuple_endswith/{len(tokens)}tok": tuple_endswith,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--vad", action="store_true", help="include Silero VAD calls")
+    parser.add_argument("--no-torch", action="store_true", help="skip torch cases")
+    parser.add_argument("--filter", default="", help="only run cases containing this")
+    parser.add_argument("--min-time", type=float, default=0.3, help="seconds per case")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results file")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    cases = {}
+    cases.update(audio_cases(not args.no_torch, args.vad))
+    cases.update(protocol_cases())
+    cases.update(sentence_cases())
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f"{'case':<42}{'ns/op':>14}{'iters':>10}{'peak B/op':>12}{'vs base':>10}")
+    for name, fn in cases.items():
+        if args.filter not in name:
+            continue
+        ns, iterations, peak = bench(fn, args.min_time)
+        results[name] = {"ns_per_op": ns, "peak_bytes_per_op": peak}
+
+        delta = ""
+        if name in baseline:
+            change = ns / baseline[name]["ns_per_op"] - 1
+            delta = f"{change:+.1%}"
+            if change > args.tolerance:
+                regressions.append(name)
+        print(f"{name:<42}{ns:>14,.0f}{iterations:>10}{peak:>12,}{delta:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f"\nRegressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Login throughput benchmark and event loop stall check
+
+In-process (default) it runs bursts of bcrypt verifications the way the
+login handler does, once directly on the event loop and once through the
+password hashing pool, while a ticker measures how late the loop wakes up.
+That lag is what every live audio socket on the worker would see.
+
+    cd src && python -m scripts.bench_login --logins 64 --concurrency 16
+
+With --url it sends concurrent logins to a running server instead, and
+probes a cheap endpoint meanwhile to see how the server's other requests
+are affected:
+
+    cd src && python -m scripts.bench_login --url http://localhost:8000 \\
+        --username ai --password secret --probe-path /metrics
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+# app.services.auth reads these at import time
+os.environ.setdefault("AUTH_SECRET_KEY", "bench")
+os.environ.setdefault("AUTH_ALGORITHM", "HS256")
+os.environ.setdefault("AUTH_ACCESS_TOKEN_EXPIRE_HOURS", "1")
+
+import httpx  # pylint: disable=wrong-import-position
+
+TICK_SECONDS = 0.005
+LOGIN_PATH = "/api/v1/user/token"
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+async def ticker(lags: list[float], stop: asyncio.Event):
+    """records how late each wake up of the loop is"""
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(max(time.perf_counter() - expected, 0.0))
+
+
+async def run_burst(login, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await login()
+            except Exception:  # pylint: disable=broad-except
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    duration = time.perf_counter() - start
+    stop.set()
+    await tick
+    return {
+        "logins_per_s": len(latencies) / duration,
+        "errors": errors,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p95_ms": percentile(latencies, 0.95) * 1000,
+        "loop_lag_p99_ms": percentile(lags, 0.99) * 1000,
+        "loop_lag_max_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+def print_results(results: dict[str, dict]):
+    columns = list(next(iter(results.values())))
+    print(f"{'':<10}" + "".join(f"{c:>18}" for c in columns))
+    for name, row in results.items():
+        print(f"{name:<10}" + "".join(f"{row[c]:>18.1f}" for c in columns))
+
+
+async def in_process(args):
+    # pylint: disable=import-outside-toplevel
+    from app.services import auth as auth_service
+
+    hashed = auth_service.hash_password(args.password)
+
+    async def inline():
+        # What authenticate_user used to do, bcrypt on the event loop
+        auth_service.verify_password(args.password, hashed)
+
+    async def pooled():
+        await auth_service.verify_password_async(args.password, hashed)
+
+    results = {}
+    for name, login in (("inline", inline), ("pool", pooled)):
+        results[name] = await run_burst(login, args.logins, args.concurrency)
+    print(
+        f"bcrypt rounds={auth_service.pwd_context.handler('bcrypt').default_rounds}"
+        f" workers={auth_service.PASSWORD_HASH_WORKERS}"
+        f" max_pending={auth_service.PASSWORD_HASH_MAX_PENDING}\n"
+    )
+    print_results(results)
+
+
+async def against_server(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=60
+    ) as client:
+
+        async def login():
+            response = await client.post(
+                LOGIN_PATH,
+                data={"username": args.username, "password": args.password},
+            )
+            response.raise_for_status()
+
+        probes: list[float] = []
+        stop = asyncio.Event()
+
+        async def probe():
+            while not stop.is_set():
+                start = time.perf_counter()
+                await client.get(args.probe_path)
+                probes.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe())
+        result = await run_burst(login, args.logins, args.concurrency)
+        stop.set()
+        await probe_task
+
+    # The client's own loop lag is not interesting here
+    del result["loop_lag_p99_ms"], result["loop_lag_max_ms"]
+    result["probe_p50_ms"] = percentile(probes, 0.5) * 1000
+    result["probe_max_ms"] = max(probes, default=0.0) * 1000
+    print_results({"server": result})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--username", default="ai")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--probe-path", default="/metrics")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    cli_args = parse_args()
+    asyncio.run(against_server(cli_args) if cli_args.url else in_process(cli_args))
@@ -0,0 +1,206 @@
+"""Throughput and memory of the single process and the production runner
+
+Boots the server once with a single uvicorn process (what scripts/run.sh
+runs) and once with gunicorn and uvicorn workers (scripts/run-prod.sh),
+drives each with concurrent HTTP requests and reports requests per second,
+latency percentiles, the time until /ready and the memory of the process
+tree. PSS (proportional set size) splits pages shared copy-on-write between
+the processes, so it shows what preloading in the master saves.
+
+    cd src && python -m scripts.bench_runners --path / --duration 20
+    cd src && python -m scripts.bench_runners --workers 4 --concurrency 128 \\
+        --runners uvicorn,gunicorn --json runners.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import httpx
+
+RUNNERS = {
+    "uvicorn": lambda port: [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+    ],
+    "gunicorn": lambda port: [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "app.main:app",
+        "-c",
+        "gunicorn.conf.py",
+    ],
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid: int) -> list[int]:
+    pids, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        pids.append(current)
+        try:
+            with open(
+                f"/proc/{current}/task/{current}/children", encoding="utf-8"
+            ) as f:
+                todo.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory_mb(pid: int) -> dict[str, float]:
+    """RSS and PSS summed over the process tree, Linux only"""
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0}
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup", encoding="utf-8") as f:
+                for line in f:
+                    field, value = line.split(":", 1)
+                    if field in ("Rss", "Pss"):
+                        totals[f"{field.lower()}_mb"] += int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return totals
+
+
+def wait_ready(server: subprocess.Popen, port: int, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            sys.exit("server exited during startup")
+        try:
+            with urllib.request.urlopen(
+                f"http://127.0.0.1:{port}/ready", timeout=1
+            ) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.1)
+    sys.exit(f"server not ready after {timeout}s")
+
+
+async def drive(url: str, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def client_process(args: tuple[str, int, float]) -> dict:
+    return asyncio.run(drive(*args))
+
+
+def bench_runner(name: str, args) -> dict:
+    port = free_port()
+    env = {**os.environ, "HOST": "127.0.0.1", "PORT": str(port)}
+    # uvicorn reads it too, and the session store needs Redis above one worker
+    env["WEB_CONCURRENCY"] = "1" if name == "uvicorn" else str(args.workers)
+    # Only plain HTTP is benchmarked, per worker sessions are fine
+    env.setdefault("SESSION_STORE", "memory")
+    server = subprocess.Popen(
+        RUNNERS[name](port),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready_seconds = wait_ready(server, port, args.ready_timeout)
+        idle = memory_mb(server.pid)
+
+        url = f"http://127.0.0.1:{port}{args.path}"
+        per_client = max(args.concurrency // args.client_processes, 1)
+        with multiprocessing.Pool(args.client_processes) as pool:
+            results = pool.map(
+                client_process,
+                [(url, per_client, args.duration)] * args.client_processes,
+            )
+        loaded = memory_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for r in results for latency in r["latencies"]]
+    return {
+        "runner": name,
+        "workers": 1 if name == "uvicorn" else args.workers,
+        "requests_per_s": len(latencies) / args.duration,
+        "errors": sum(r["errors"] for r in results),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "ready_s": ready_seconds,
+        "idle_pss_mb": idle["pss_mb"],
+        "loaded_pss_mb": loaded["pss_mb"],
+        "loaded_rss_mb": loaded["rss_mb"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runners", default="uvicorn,gunicorn")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--ready-timeout", type=float, default=180)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = [bench_runner(name, args) for name in args.runners.split(",")]
+
+    columns = [c for c in results[0] if c != "runner"]
+    print(f"{'runner':<10}" + "".join(f"{c:>15}" for c in columns))
+    for row in results:
+        print(f"{row['runner']:<10}" + "".join(f"{row[c]:>15.1f}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Stage-by-stage latency of single conversational turns
+
+Drives one conversation per configuration through the text or the audio
+router and reports, for every combination of segmenter and silence threshold
+given on the command line, how long each stage of a turn took:
+
+    end_of_speech   last speech -> end of speech detected (server VAD)
+    transcript      user stopped speaking -> user_text received
+    first_token     user stopped speaking -> first assistant_text_delta
+    first_sentence  user stopped speaking -> first TTS unit complete (server)
+    first_audio     user stopped speaking -> first audio event received
+    last_audio      user stopped speaking -> last audio event received
+
+In audio mode "user stopped speaking" is the moment the last voiced chunk of
+the WAV fixture was sent (found with an energy threshold), in text mode it is
+the moment the prompt was sent. end_of_speech and first_sentence come from the
+`trace` event the routers echo back when asked to, measured from the server's
+own start of turn.
+
+Segmenters are `<policy>[:<min_chars>]` as accepted by the routers, see
+SentenceSegmenter. The routes are those of load_test.py, --path overrides
+them. The mounted audio router (Deepgram) ends an utterance after 2 s without
+words and ignores silence_threshold, silence thresholds can only be swept
+against the Silero router (stt_tts_realtime) when it is mounted.
+
+Run the server against the fake providers (scripts/run-fake-providers.sh)
+to tune the service itself, e.g.
+
+    python src/scripts/bench_turn.py --mode audio --wav a.wav b.wav \\
+        --segmenters punctuation,clause:40
+    python src/scripts/bench_turn.py --mode audio --wav a.wav \\
+        --path /stt-tm-text-audio/ws --silence-thresholds 0.6,0.9,1.2
+    python src/scripts/bench_turn.py --mode text --segmenters punctuation,clause
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+
+import numpy as np  # type: ignore
+import websockets  # type: ignore
+
+from load_test import (
+    AUDIO_PATH,
+    CHUNK_SAMPLES,
+    DEFAULT_PROMPTS,
+    SAMPLE_RATE,
+    TEXT_PATH,
+    load_wav,
+    percentile,
+)
+
+
+STAGES = [
+    "end_of_speech",
+    "transcript",
+    "first_token",
+    "first_sentence",
+    "first_audio",
+    "last_audio",
+]
+
+# 20 ms analysis frames for locating the end of speech in a fixture
+FRAME_SAMPLES = SAMPLE_RATE // 50
+
+
+@dataclass
+class Config:
+    segmenter: str
+    silence_threshold: float | None = None
+
+    @property
+    def label(self) -> str:
+        if self.silence_threshold is None:
+            return self.segmenter
+        return f"{self.segmenter} silence={self.silence_threshold:g}s"
+
+
+@dataclass
+class TurnResult:
+    fixture: str
+    stages: dict[str, float] = field(default_factory=dict)
+    spans: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+
+def speech_end_offset(pcm: bytes, energy_threshold: float) -> int:
+    """byte offset just after the last frame whose RMS reaches the threshold"""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    frames = len(samples) // FRAME_SAMPLES
+    rms = np.sqrt(
+        np.mean(samples[: frames * FRAME_SAMPLES].reshape(frames, -1) ** 2, axis=1)
+    )
+    voiced = np.nonzero(rms >= energy_threshold)[0]
+    if not len(voiced):
+        return len(pcm)
+    return int(voiced[-1] + 1) * FRAME_SAMPLES * 2
+
+
+def add_trace(result: TurnResult, trace: dict):
+    """adds the server-side stages of an echoed turn trace"""
+    if trace["attributes"].get("error"):
+        raise RuntimeError(trace["attributes"]["error"])
+    for span in trace["spans"]:
+        # Repeated spans (tts.synthesize, ws.send) are summed
+        result.spans[span["name"]] = (
+            result.spans.get(span["name"], 0.0) + span["duration_ms"] / 1000
+        )
+        if span["name"] == "vad.end_of_speech":
+            result.stages["end_of_speech"] = span["duration_ms"] / 1000
+        elif span["name"] == "llm.first_sentence":
+            result.stages["first_sentence"] = (span["end_ns"] - trace["start_ns"]) / 1e9
+
+
+def record_event(result: TurnResult, message: dict, elapsed: float):
+    kind = message.get("type")
+    if kind == "user_text":
+        result.stages.setdefault("transcript", elapsed)
+    elif kind == "assistant_text_delta":
+        result.stages.setdefault("first_token", elapsed)
+    elif kind == "audio" and message.get("audio"):
+        result.stages.setdefault("first_audio", elapsed)
+        result.stages["last_audio"] = elapsed
+
+
+async def text_turn(ws, prompt: str, config: Config, args) -> TurnResult:
+    result = TurnResult(fixture=prompt)
+    start = time.perf_counter()
+    await ws.send(
+        json.dumps(
+            {
+                "data": prompt,
+                "tts": args.tts,
+                "model": args.model,
+                "segmenter": config.segmenter,
+                "trace": True,
+            }
+        )
+    )
+    while True:
+        message = json.loads(await ws.recv())
+        if message.get("type") == "trace":
+            add_trace(result, message["turn"])
+            return result
+        record_event(result, message, time.perf_counter() - start)
+
+
+async def audio_turn(ws, name: str, pcm: bytes, config: Config, args) -> TurnResult:
+    result = TurnResult(fixture=name)
+    chunk_bytes = CHUNK_SAMPLES * 2
+    chunk_seconds = CHUNK_SAMPLES / SAMPLE_RATE
+    voiced_end = speech_end_offset(pcm, args.energy_threshold)
+    # Enough trailing silence for the server to cross its threshold
+    silence = bytes(
+        int(SAMPLE_RATE * 2 * (config.silence_threshold + args.extra_silence))
+    )
+
+    speech_end = None
+
+    async def reader():
+        while True:
+            message = json.loads(await ws.recv())
+            if message.get("type") == "trace":
+                add_trace(result, message["turn"])
+                return
+            elapsed = time.perf_counter() - speech_end if speech_end else 0.0
+            record_event(result, message, elapsed)
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        stream = pcm + silence
+        for offset in range(0, len(stream), chunk_bytes):
+            await ws.send(stream[offset : offset + chunk_bytes])
+            if speech_end is None and offset + chunk_bytes >= voiced_end:
+                speech_end = time.perf_counter()
+            await asyncio.sleep(chunk_seconds)
+            if reader_task.done():
+                break
+        await asyncio.wait_for(reader_task, args.turn_timeout)
+    finally:
+        reader_task.cancel()
+    return result
+
+
+async def run_config(config: Config, fixtures: list, args) -> list[TurnResult]:
+    path = args.path or (TEXT_PATH if args.mode == "text" else AUDIO_PATH)
+    results = []
+    async with websockets.connect(
+        args.url + path, max_size=None, open_timeout=args.turn_timeout
+    ) as ws:
+        if args.mode == "audio":
+            await ws.send(
+                json.dumps(
+                    {
+                        "silence_threshold": config.silence_threshold,
+                        "segmenter": config.segmenter,
+                        "trace": True,
+                    }
+                )
+            )
+
+        for repeat in range(args.warmup + args.repeat):
+            for name, fixture in fixtures:
+                try:
+                    if args.mode == "text":
+                        result = await asyncio.wait_for(
+                            text_turn(ws, fixture, config, args), args.turn_timeout
+                        )
+                    else:
+                        result = await audio_turn(ws, name, fixture, config, args)
+                except Exception as ex:  # pylint: disable=broad-except
+                    # The session may be out of step after a failure, stop it
+                    results.append(TurnResult(fixture=name, error=type(ex).__name__))
+                    return results
+                if repeat >= args.warmup:
+                    results.append(result)
+                await asyncio.sleep(args.pause)
+    return results
+
+
+def report(runs: list[tuple[Config, list[TurnResult]]], args):
+    print(f"\nmode={args.mode} repeat={args.repeat} warmup={args.warmup}")
+    for config, results in runs:
+        ok = [r for r in results if r.error is None]
+        failed = len(results) - len(ok)
+        print(f"\n{config.label}: {len(ok)} turns ok, {failed} failed")
+        print(
+            f"{'stage (ms)':<16}{'n':>5}{'p50':>10}{'p90':>10}{'mean':>10}{'max':>10}"
+        )
+        for stage in STAGES:
+            values = [r.stages[stage] * 1000 for r in ok if stage in r.stages]
+            if not values:
+                continue
+            print(
+                f"{stage:<16}{len(values):>5}"
+                f"{percentile(values, 0.5):>10.1f}{percentile(values, 0.9):>10.1f}"
+                f"{statistics.fmean(values):>10.1f}{max(values):>10.1f}"
+            )
+
+    # Side by side medians to compare the settings at a glance
+    width = max(len(config.label) for config, _ in runs) + 2
+    print(f"\n{'p50 (ms)':<{width}}" + "".join(f"{s:>16}" for s in STAGES))
+    for config, results in runs:
+        row = f"{config.label:<{width}}"
+        for stage in STAGES:
+            values = [
+                r.stages[stage] * 1000
+                for r in results
+                if r.error is None and stage in r.stages
+            ]
+            row += f"{percentile(values, 0.5):>16.1f}"
+        print(row)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {
+                        "config": asdict(config),
+                        "turns": [asdict(r) for r in results],
+                    }
+                    for config, results in runs
+                ],
+                f,
+                indent=2,
+            )
+
+
+async def main(args):
+    if args.mode == "audio":
+        if not args.wav:
+            raise SystemExit("--wav is required in audio mode")
+        fixtures = [(path, load_wav(path)) for path in args.wav]
+        configs = [
+            Config(segmenter, threshold)
+            for segmenter in args.segmenters
+            for threshold in args.silence_thresholds
+        ]
+    else:
+        if args.prompts_file:
+            with open(args.prompts_file, encoding="utf-8") as f:
+                prompts = [line.strip() for line in f if line.strip()]
+        else:
+            prompts = DEFAULT_PROMPTS
+        fixtures = [(prompt, prompt) for prompt in prompts]
+        configs = [Config(segmenter) for segmenter in args.segmenters]
+
+    runs = []
+    for config in configs:
+        print(f"running {config.label}")
+        runs.append((config, await run_config(config, fixtures, args)))
+    report(runs, args)
+
+
+def csv_floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",") if v]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--mode", choices=["text", "audio"], default="audio")
+    parser.add_argument("--path", help="route under test, default by --mode")
+    parser.add_argument("--wav", nargs="+", help="16 kHz mono 16-bit fixtures")
+    parser.add_argument("--prompts-file", help="one prompt per line (text mode)")
+    parser.add_argument(
+        "--segmenters",
+        type=lambda v: [s for s in v.split(",") if s],
+        default=["punctuation"],
+        help="comma separated segmenter specs",
+    )
+    parser.add_argument(
+        "--silence-thresholds",
+        type=csv_floats,
+        default=[2.0],
+        help="comma separated seconds (audio mode)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="passes per config")
+    parser.add_argument("--warmup", type=int, default=1, help="discarded passes")
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds")
+    parser.add_argument("--energy-threshold", type=float, default=500)
+    parser.add_argument("--extra-silence", type=float, default=0.5, help="seconds")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--tts", default="gtts", choices=["gtts", "openai"])
+    parser.add_argument("--model", default="openai")
+    parser.add_argument("--json", help="write every turn to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
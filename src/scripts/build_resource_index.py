@@ -0,0 +1,101 @@
+"""Builds the resources index used for retrieval by the chatbot
+
+Reads every *.jsonl file in data/resources, one resource per line with
+`id`, `title`, `text` and optionally `topic`, embeds the texts in batches
+and writes the index to INDEX_DIR/index/resources. Embeddings of resources
+whose text did not change are reused from the previous index, so only new
+or edited resources cost API calls.
+
+    cd src && python -m scripts.build_resource_index
+    cd src && python -m scripts.build_resource_index --batch-size 128 --rebuild
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np  # type: ignore
+
+from app.services.embeddings import OpenAIEmbedder
+from app.services.retrieval import RETRIEVAL_INDEX
+from app.services.vector_index import VectorIndex, index_path, open_index
+from utils import get_full_path, generate_batches
+
+RESOURCES_DIR = get_full_path("../data/resources")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_resources(directory: str) -> list[dict]:
+    resources = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                resource = json.loads(line)
+                if not resource.get("text"):
+                    raise ValueError(f"{path}:{line_no} has no text")
+                resource["sha"] = text_hash(resource["text"])
+                resources.append(resource)
+    ids = [r["id"] for r in resources]
+    if len(ids) != len(set(ids)):
+        raise ValueError("resource ids are not unique")
+    return resources
+
+
+def previous_embeddings(directory: str, model: str) -> dict[str, np.ndarray]:
+    """text hash -> vector of the index currently on disk"""
+    index = open_index(directory)
+    if index is None or index.meta.get("model") != model:
+        return {}
+    return {
+        index.payload(i)["sha"]: np.array(index.vectors[i]) for i in range(len(index))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--resources", default=RESOURCES_DIR)
+    parser.add_argument("--output", default=index_path(RETRIEVAL_INDEX))
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument(
+        "--rebuild", action="store_true", help="embed every resource again"
+    )
+    args = parser.parse_args()
+
+    resources = read_resources(args.resources)
+    if not resources:
+        sys.exit(f"No resources found in {args.resources}")
+
+    embedder = OpenAIEmbedder()
+    known = {} if args.rebuild else previous_embeddings(args.output, embedder.model)
+    missing = [r for r in resources if r["sha"] not in known]
+    for start, end in generate_batches(len(missing), args.batch_size):
+        batch = missing[start:end]
+        vectors = embedder.embed([r["text"] for r in batch])
+        known.update(zip((r["sha"] for r in batch), vectors))
+    print(
+        f"{len(resources)} resources, {len(missing)} embedded, "
+        f"{len(resources) - len(missing)} reused"
+    )
+
+    vectors = np.stack([known[r["sha"]] for r in resources])
+    index = VectorIndex.build(
+        args.output,
+        vectors,
+        resources,
+        nlist=args.nlist,
+        meta={"model": embedder.model},
+    )
+    print(f"Wrote {len(index)} vectors in {index.nlist} lists to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Websocket load generator for the voice routers
+
+Opens N concurrent synthetic clients against one of the realtime endpoints
+and reports per-stage and end-to-end latency percentiles, throughput and
+error rates.
+
+text mode drives /tm-text-audio/ws_stream_response (text_2_audio_stream)
+with typed questions, audio mode streams a recorded 16 kHz mono 16-bit WAV
+file in real time to /api/v1/stt-tm-text-audio/ws (thriving_minds_chat, the
+Deepgram router app.main mounts), followed by silence so the server detects
+the end of speech. --path targets another route, e.g. /stt-tm-text-audio/ws
+when the Silero router (stt_tts_realtime) is mounted instead.
+
+Run the server against the fake providers (scripts/run-fake-providers.sh)
+to measure the service itself rather than the upstream APIs, e.g.
+
+    python src/scripts/load_test.py --mode text --clients 50 --turns 5
+    python src/scripts/load_test.py --mode audio --wav utterance.wav
+    python src/scripts/load_test.py --mode audio --wav utterance.wav \\
+        --path /stt-tm-text-audio/ws
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import wave
+from dataclasses import dataclass, field
+
+import websockets  # type: ignore
+
+
+TEXT_PATH = "/tm-text-audio/ws_stream_response"
+AUDIO_PATH = "/api/v1/stt-tm-text-audio/ws"
+
+SAMPLE_RATE = 16000
+# The browser client sends ScriptProcessor buffers of 4096 samples
+CHUNK_SAMPLES = 4096
+
+DEFAULT_PROMPTS = [
+    "How should I set my priorities for today?",
+    "I feel unmotivated this morning, any advice?",
+    "Can you help me reflect on why I felt anxious yesterday?",
+    "What is a good habit to build for personal growth?",
+    "Give me some encouragement before my exam.",
+]
+
+
+@dataclass
+class TurnResult:
+    stages: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+
+@dataclass
+class ClientStats:
+    turns: list[TurnResult] = field(default_factory=list)
+    connect_errors: int = 0
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def load_wav(path: str) -> bytes:
+    with wave.open(path, "rb") as wav:
+        if (
+            wav.getframerate() != SAMPLE_RATE
+            or wav.getnchannels() != 1
+            or wav.getsampwidth() != 2
+        ):
+            raise ValueError(f"{path} must be 16 kHz mono 16-bit PCM")
+        return wav.readframes(wav.getnframes())
+
+
+async def text_turn(ws, prompt: str, args) -> TurnResult:
+    result = TurnResult()
+    start = time.perf_counter()
+    await ws.send(json.dumps({"data": prompt, "tts": args.tts, "model": args.model}))
+
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), args.turn_timeout))
+        elapsed = time.perf_counter() - start
+        kind = message.get("type")
+        if kind == "assistant_text_delta":
+            result.stages.setdefault("first_token", elapsed)
+        elif kind == "audio":
+            if message.get("has_more") is False:
+                result.stages["end_to_end"] = elapsed
+                return result
+            result.stages.setdefault("first_audio", elapsed)
+            result.stages["last_audio"] = elapsed
+
+
+async def audio_turn(ws, pcm: bytes, args) -> TurnResult:
+    result = TurnResult()
+    chunk_bytes = CHUNK_SAMPLES * 2
+    chunk_seconds = CHUNK_SAMPLES / SAMPLE_RATE
+    silence = bytes(int(SAMPLE_RATE * 2 * (args.silence_seconds)))
+
+    speech_end = None
+
+    async def reader():
+        while True:
+            message = json.loads(await ws.recv())
+            elapsed = time.perf_counter() - speech_end if speech_end else 0.0
+            kind = message.get("type")
+            if kind == "user_text":
+                result.stages.setdefault("transcript", elapsed)
+            elif kind == "assistant_text_delta":
+                result.stages.setdefault("first_token", elapsed)
+            elif kind == "audio":
+                result.stages.setdefault("first_audio", elapsed)
+                result.stages["last_audio"] = elapsed
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        # Stream the utterance followed by trailing silence at real time pace
+        stream = pcm + silence
+        for offset in range(0, len(stream), chunk_bytes):
+            if offset >= len(pcm) and speech_end is None:
+                speech_end = time.perf_counter()
+            await ws.send(stream[offset : offset + chunk_bytes])
+            await asyncio.sleep(chunk_seconds)
+
+        # The stt router has no end-of-response marker, the turn is over once
+        # the server has been quiet for `idle_seconds` after the last audio
+        deadline = time.perf_counter() + args.turn_timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+            if reader_task.done():
+                reader_task.result()
+            if "last_audio" in result.stages:
+                quiet = time.perf_counter() - speech_end - result.stages["last_audio"]
+                if quiet >= args.idle_seconds:
+                    result.stages["end_to_end"] = result.stages["last_audio"]
+                    return result
+        raise asyncio.TimeoutError("no response audio")
+    finally:
+        reader_task.cancel()
+
+
+async def run_client(client_id: int, args, pcm: bytes | None, stats: ClientStats):
+    await asyncio.sleep(random.uniform(0, args.ramp_up))
+    path = args.path or (TEXT_PATH if args.mode == "text" else AUDIO_PATH)
+    try:
+        async with websockets.connect(
+            args.url + path, max_size=None, open_timeout=args.turn_timeout
+        ) as ws:
+            for turn in range(args.turns):
+                try:
+                    if args.mode == "text":
+                        prompt = args.prompts[(client_id + turn) % len(args.prompts)]
+                        result = await text_turn(ws, prompt, args)
+                    else:
+                        result = await audio_turn(ws, pcm, args)
+                except Exception as ex:  # pylint: disable=broad-except
+                    stats.turns.append(TurnResult(error=type(ex).__name__))
+                    return
+                stats.turns.append(result)
+                await asyncio.sleep(random.expovariate(1 / args.think_time))
+    except Exception:  # pylint: disable=broad-except
+        stats.connect_errors += 1
+
+
+def report(stats: list[ClientStats], duration: float, args):
+    turns = [t for s in stats for t in s.turns]
+    ok = [t for t in turns if t.error is None]
+    errors: dict[str, int] = {}
+    for t in turns:
+        if t.error is not None:
+            errors[t.error] = errors.get(t.error, 0) + 1
+    connect_errors = sum(s.connect_errors for s in stats)
+
+    print(f"\nmode={args.mode} clients={args.clients} turns/client={args.turns}")
+    print(
+        f"duration {duration:.1f}s, {len(ok)} turns ok, {len(turns) - len(ok)} failed"
+    )
+    print(f"throughput {len(ok) / duration:.2f} turns/s")
+    attempted = len(turns) + connect_errors
+    if attempted:
+        rate = (len(turns) - len(ok) + connect_errors) / attempted
+        print(f"error rate {rate:.2%} (connect errors: {connect_errors}, {errors})")
+
+    stages = ["transcript", "first_token", "first_audio", "last_audio", "end_to_end"]
+    print(
+        f"\n{'stage (ms)':<14}{'n':>6}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    )
+    for stage in stages:
+        values = [t.stages[stage] * 1000 for t in ok if stage in t.stages]
+        if not values:
+            continue
+        print(
+            f"{stage:<14}{len(values):>6}"
+            f"{percentile(values, 0.5):>10.1f}{percentile(values, 0.9):>10.1f}"
+            f"{percentile(values, 0.95):>10.1f}{percentile(values, 0.99):>10.1f}"
+            f"{max(values):>10.1f}"
+        )
+    if args.json:
+        summary = {
+            stage: {
+                "mean_ms": statistics.fmean(v) if v else None,
+                "p50_ms": percentile(v, 0.5),
+                "p95_ms": percentile(v, 0.95),
+                "p99_ms": percentile(v, 0.99),
+            }
+            for stage in stages
+            if (v := [t.stages[stage] * 1000 for t in ok if stage in t.stages])
+        }
+        summary["throughput_turns_per_s"] = len(ok) / duration
+        summary["errors"] = len(turns) - len(ok) + connect_errors
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+async def main(args):
+    pcm = None
+    if args.mode == "audio":
+        if args.wav is None:
+            raise SystemExit("--wav is required in audio mode")
+        pcm = load_wav(args.wav)
+
+    if args.prompts_file:
+        with open(args.prompts_file, encoding="utf-8") as f:
+            args.prompts = [line.strip() for line in f if line.strip()]
+    else:
+        args.prompts = DEFAULT_PROMPTS
+
+    stats = [ClientStats() for _ in range(args.clients)]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(run_client(i, args, pcm, stats[i]) for i in range(args.clients))
+    )
+    report(stats, time.perf_counter() - start, args)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--mode", choices=["text", "audio"], default="text")
+    parser.add_argument("--path", help="route under test, default by --mode")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3, help="turns per client")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--wav", help="16 kHz mono 16-bit utterance (audio mode)")
+    # The Deepgram router ends an utterance after 2 s without words
+    parser.add_argument("--silence-seconds", type=float, default=2.5)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    parser.add_argument("--prompts-file", help="one prompt per line (text mode)")
+    parser.add_argument("--tts", default="gtts", choices=["gtts", "openai"])
+    parser.add_argument("--model", default="openai")
+    parser.add_argument("--json", help="write a summary to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
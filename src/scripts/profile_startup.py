@@ -0,0 +1,151 @@
+"""Cold start profile of the server
+
+Imports app.main in fresh interpreters with `-X importtime` and reports the
+wall time and the most expensive imports. With --serve it also boots the
+server with uvicorn and measures the time until /ready answers, i.e. what a
+new container costs before it can take traffic.
+
+    cd src && python -m scripts.profile_startup
+    cd src && python -m scripts.profile_startup --serve --runs 3 --target-seconds 8
+
+Exits with status 1 when the median cold start is over --target-seconds
+(COLD_START_TARGET_SECONDS), so it can gate CI or an image build.
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", 5))
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def profile_import(module: str) -> tuple[float, list[tuple[str, int, int, int]]]:
+    """imports `module` in a new interpreter
+
+    Returns:
+        tuple: wall seconds, and (module, self us, cumulative us, depth) rows
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return wall, rows
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def profile_serve(timeout: float) -> float:
+    """seconds from spawning uvicorn until /ready answers 200"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                sys.exit("server exited during startup")
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/ready", timeout=1
+                ) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.05)
+        sys.exit(f"server not ready after {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def top_imports(rows, top: int, depth: int | None, key: int):
+    rows = [r for r in rows if depth is None or r[3] == depth]
+    return sorted(rows, key=lambda r: r[key], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--serve", action="store_true", help="also time uvicorn until /ready"
+    )
+    parser.add_argument("--serve-timeout", type=float, default=120)
+    parser.add_argument(
+        "--target-seconds", type=float, default=COLD_START_TARGET_SECONDS
+    )
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    walls, rows = [], []
+    for _ in range(args.runs):
+        wall, rows = profile_import(args.module)
+        walls.append(wall)
+    import_seconds = statistics.median(walls)
+
+    print(f"import {args.module}: median {import_seconds:.2f}s over {args.runs} runs\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  top level import")
+    for name, self_us, cumulative_us, _ in top_imports(rows, args.top, 0, 2):
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    print(f"\n{'self ms':>14}  slowest modules")
+    for name, self_us, _, _ in top_imports(rows, args.top, None, 1):
+        print(f"{self_us / 1000:>14.1f}  {name}")
+
+    report = {
+        "module": args.module,
+        "import_seconds": import_seconds,
+        "imports": [
+            {"module": name, "self_us": s, "cumulative_us": c, "depth": d}
+            for name, s, c, d in rows
+        ],
+    }
+    cold_start = import_seconds
+    if args.serve:
+        serve = [profile_serve(args.serve_timeout) for _ in range(args.runs)]
+        cold_start = report["ready_seconds"] = statistics.median(serve)
+        print(f"\nuvicorn until /ready: median {cold_start:.2f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    ok = cold_start <= args.target_seconds
+    print(
+        f"\ncold start {cold_start:.2f}s, target {args.target_seconds:.2f}s: "
+        f"{'PASS' if ok else 'FAIL'}"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,13 @@ from datetime import datetime, timedelta
 import pickle as pkl
 import base64
 from io import BytesIO
-import PIL
 import requests
-import traceback
-import time
 import logging
 import sys
 import string
 
+from image_batch import UnbatchableImagesError, decode_base64_batch
+
 ROOT = __file__
 user_agent = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_1)"
@@ -267,7 +266,7 @@ def image_to_base64(imagepath, image_size, image_format="PNG"):
 
     """
     img = Image.open(imagepath)
-    img = img.resize(image_size, resample=PIL.Image.ANTIALIAS)
+    img = img.resize(image_size, resample=Image.LANCZOS)
     buffered = BytesIO()
     img.save(buffered, format=image_format)
     imgstr = buffered.getvalue()
@@ -277,7 +276,8 @@ def image_to_base64(imagepath, image_size, image_format="PNG"):
 
 
 def urlimage_to_base64(url, image_size, timeout=10):
-    """fetches image from a url and converts it to base64.
+    """fetches image from a url and converts it to base64. from async code or
+    for many urls use `app.services.image_fetch.ImageFetcher` instead
     Args:
         timeout (int): time in seconds
         url(str):
@@ -309,36 +309,21 @@ def post(
     debug: bool = False,
     timeout: timedelta = timedelta(seconds=10),
 ):
-    retry = 0
-    while retry <= max_retry:
-        try:
-            response = None
-            if json is True:
-                response = requests.post(
-                    url, headers=headers_, json=data, timeout=timeout.total_seconds()
-                )
-            else:
-                response = requests.post(
-                    url, headers=headers_, data=data, timeout=timeout.total_seconds()
-                )
-
-            code = response.status_code
-            response_text = response.text
-            if code != 200:
-                raise RuntimeError(response_text)
-
-            return response_text
-        except Exception as e:  # pylint: disable=broad-except
-            msg = str(e)
-            msg = msg if len(msg) < 200 else msg[:200]
-            st = traceback.format_exc()
-            print(msg)
-            if debug is True:
-                print(st)
-
-        time.sleep(wait)
-        retry += 1
-    raise RuntimeError("failed to complete request in the given retries")
+    """blocking wrapper of `async_http.async_post`, use that one from async code"""
+    import async_http  # pylint: disable=import-outside-toplevel
+
+    return async_http.run_sync(
+        async_http.async_post(
+            url,
+            data,
+            headers_=headers_,
+            max_retry=max_retry,
+            wait=wait,
+            json=json,
+            debug=debug,
+            timeout=timeout,
+        )
+    )
 
 
 def get(
@@ -350,30 +335,22 @@ def get(
     debug: bool = False,
     timeout: timedelta = timedelta(seconds=10),
 ):
-    retry = 1
-    while retry <= max_retry:
-        try:
-            response = None
-            response = requests.get(
-                url, params=data, timeout=timeout.total_seconds(), headers=headers_
-            )
-            code = response.status_code
-            response_text = response.text
-            if code != 200:
-                raise RuntimeError(response_text)
-
-            return response_text
-        except Exception as e:  # pylint: disable=broad-except
-            msg = str(e)
-            msg = msg if len(msg) < 200 else msg[:200]
-            st = traceback.format_exc()
-            logger.error(msg)
-            if debug is True:
-                print(st)
-
-        time.sleep(wait)
-        retry += 1
-    raise RuntimeError("failed to complete request in the given retries")
+    """blocking wrapper of `async_http.async_get`, use that one from async code.
+    `max_retry` is the total number of attempts here
+    """
+    import async_http  # pylint: disable=import-outside-toplevel
+
+    return async_http.run_sync(
+        async_http.async_get(
+            url,
+            data,
+            headers_=headers_,
+            max_retry=max(max_retry - 1, 0),
+            wait=wait,
+            debug=debug,
+            timeout=timeout,
+        )
+    )
 
 
 def generate_randomstring():
@@ -409,7 +386,8 @@ def api_extract_test(json_request):
 
 def api_convert_base64_images(
     b64_images,
-    image_size: tuple[int, int] = (
+    image_size: tuple[int, int]
+    | None = (
         128,
         128,
     ),
@@ -422,18 +400,35 @@ def api_convert_base64_images(
 
     Returns:
         list: returns a list of images of dimention
-            image_width, image_height, channels
+            image_width, image_height, channels. image is not resized if
+            image_size is None. images sharing their mode are decoded into
+            one array, in parallel for large batches, see
+            `image_batch.decode_base64_batch`
 
 
     """
 
+    batch = None
     try:
-        images = [base64_to_imagearray(i, image_size) for i in b64_images]
-
+        if image_size is not None:
+            try:
+                batch = decode_base64_batch(b64_images, image_size, mode=None)
+            except UnbatchableImagesError:
+                pass  # mixed modes, decoded one by one below
+        if batch is None:
+            return [base64_to_imagearray(i, image_size) for i in b64_images]
     except Exception as ex:
         raise ValueError("base64 decode error") from ex
 
-    return images
+    logger.debug(
+        f"Decoded {len(b64_images)} images in {batch.total_seconds:.3f}s "
+        f"of decode time, slowest {batch.seconds.max(initial=0):.3f}s"
+    )
+    images = batch.images
+    if images.shape[-1] == 1:
+        # Single band images are 2D, as np.asarray returns them
+        images = images[..., 0]
+    return list(images)
 
 
 def get_full_path(*paths):